@@ -3,6 +3,48 @@ import json
 import random
 from typing import Dict, List, Tuple
 
+from run.utils.experiment_index import ExperimentIndex, INDEX_FILE
+
+RESULT_MODES = ["debug", "cap", "llm2swarm", "meta", "wo_vlm", "improve"]
+
+
+def read_experiment_success(experiment_dir: str) -> Dict[str, bool]:
+    """
+    读取实验目录下各结果文件的 success，用于没有索引的旧工作区。
+    """
+    results = {}
+    for mode in RESULT_MODES:
+        json_path = os.path.join(experiment_dir, f"{mode}.json")
+        if os.path.exists(json_path):
+            with open(json_path, "r") as f:
+                data = json.load(f)
+            try:
+                results[mode] = data.get("analysis").get("success", False)
+            except Exception as e:
+                print(json_path)
+                results[mode] = False
+    return results
+
+
+def load_indexed_success(root_dir: str) -> Dict[Tuple[str, str], Dict[str, bool]]:
+    """
+    从 workspace/experiments.db 中查询 root_dir 下所有实验的 success，索引不存在或没有记录时返回空字典。
+    """
+    workspace_root = os.path.dirname(os.path.normpath(root_dir))
+    while workspace_root and os.path.basename(workspace_root) != "workspace":
+        workspace_root = os.path.dirname(workspace_root)
+    index_path = os.path.join(workspace_root, INDEX_FILE)
+    if not workspace_root or not os.path.exists(index_path):
+        return {}
+    experiment_index = ExperimentIndex(index_path)
+    workspace = os.path.relpath(root_dir, workspace_root).replace(os.sep, "/")
+    indexed = {}
+    for row in experiment_index.query(workspace=workspace):
+        indexed.setdefault((row["task"], row["experiment"]), {})[
+            row["test_mode"]
+        ] = row["success"]
+    return indexed
+
 
 def process_experiment_data(root_dir: str):
     """
@@ -14,12 +56,13 @@ def process_experiment_data(root_dir: str):
     返回：
         Tuple[Dict[str, List[float]], Dict[str, List[float]]]: 包含每个任务的10组成功率和完全wo_vlm数据。
     """
+    # 实验结果优先从索引中读取，不再逐个打开结果文件
+    indexed = load_indexed_success(root_dir)
     task_success_rates = {}
     wo_vlm_success_rates = {}
     debug_success_rates = {}
     # 遍历任务目录
     for task_name in os.listdir(root_dir):
-
         task_path = os.path.join(root_dir, task_name)
         if not os.path.isdir(task_path):
             continue
@@ -30,50 +73,38 @@ def process_experiment_data(root_dir: str):
 
         # 遍历实验目录
         experiment_dirs = sorted(
-            [os.path.join(task_path, exp) for exp in os.listdir(task_path) if
-             os.path.isdir(os.path.join(task_path, exp)) and exp != 'pic']
+            [
+                os.path.join(task_path, exp)
+                for exp in os.listdir(task_path)
+                if os.path.isdir(os.path.join(task_path, exp)) and exp != "pic"
+            ]
         )
 
         for experiment_dir in experiment_dirs:
-
-            debug_json_path = os.path.join(experiment_dir, "debug.json")
-            cap_json_path = os.path.join(experiment_dir, "cap.json")
-            llm2swarm_json_path = os.path.join(experiment_dir, 'llm2swarm.json')
-            meta_json_path = os.path.join(experiment_dir, "meta.json")
-            wo_vlm_json_path = os.path.join(experiment_dir, "wo_vlm.json")
-            improve_json_path = os.path.join(experiment_dir, "improve.json")
+            # 索引中没有记录的实验（索引建立之前运行或未分析）仍读取结果文件
+            results = indexed.get((task_name, os.path.basename(experiment_dir)))
+            if results is None:
+                results = read_experiment_success(experiment_dir)
             # 最优先使用improve.json数据
             improve_success_rate = False
             wo_vlm_success_rate = False
             debug_success_rate = False
             mode = None
-            if os.path.exists(cap_json_path):
-                mode = 'cap'
-            elif os.path.exists(meta_json_path):
-                mode = 'meta'
-            elif os.path.exists(llm2swarm_json_path):
-                mode = 'llm2swarm'
+            if "cap" in results:
+                mode = "cap"
+            elif "meta" in results:
+                mode = "meta"
+            elif "llm2swarm" in results:
+                mode = "llm2swarm"
             if mode is not None:
-                with open(os.path.join(experiment_dir, f"{mode}.json"), "r") as f:
-                    data = json.load(f)
-                    success_rate = data.get('analysis').get('success', False)
+                success_rate = results[mode]
             else:
-                if os.path.exists(improve_json_path):
-                    with open(improve_json_path, "r") as f:
-                        data = json.load(f)
-                        improve_success_rate = data.get('analysis').get('success', False)
-                if os.path.exists(wo_vlm_json_path):
-                    with open(wo_vlm_json_path, "r") as f:
-                        data = json.load(f)
-                        try:
-                            wo_vlm_success_rate = data.get('analysis').get('success', False)
-                        except Exception as e:
-                            print(wo_vlm_json_path)
-                if os.path.exists(debug_json_path):
-                    with open(debug_json_path, "r") as f:
-                        data = json.load(f)
-                        debug_success_rate = data.get('analysis').get('success', False)
-                success_rate = improve_success_rate or wo_vlm_success_rate or debug_success_rate
+                improve_success_rate = results.get("improve", False)
+                wo_vlm_success_rate = results.get("wo_vlm", False)
+                debug_success_rate = results.get("debug", False)
+                success_rate = (
+                    improve_success_rate or wo_vlm_success_rate or debug_success_rate
+                )
             success_rates.append(success_rate)
             debug_rates.append(wo_vlm_success_rate or debug_success_rate)
             wo_vlm_rates.append(wo_vlm_success_rate)
@@ -95,9 +126,10 @@ def process_experiment_data(root_dir: str):
             print(len(rates))
             # Iterate over the rates in chunks of `group_size`
             for i in range(0, len(rates), group_size):
-                group = rates[i:i + group_size]
-                group_average = sum(group) / len(
-                    group) * 100  # Calculate average for the group and convert to percentage
+                group = rates[i : i + group_size]
+                group_average = (
+                    sum(group) / len(group) * 100
+                )  # Calculate average for the group and convert to percentage
                 grouped_averages.append(group_average)  # Append result to the list
 
             return grouped_averages
@@ -148,26 +180,23 @@ if __name__ == "__main__":
     save_success_rates_to_file(o1_mini_data, output_file_o1_mini)
     # 统计每一个任务的平均成功率
     task_averages_4o = {
-        task: sum(rates) / len(rates)
-        for task, rates in task_data_4o.items()
+        task: sum(rates) / len(rates) for task, rates in task_data_4o.items()
     }
     wo_vlm_averages = {
-        task: sum(rates) / len(rates)
-        for task, rates in wo_vlm_data.items()
+        task: sum(rates) / len(rates) for task, rates in wo_vlm_data.items()
     }
     o1_mini_wo_vlm_averages = {
-        task: sum(rates) / len(rates)
-        for task, rates in o1_mini_wo_data.items()
+        task: sum(rates) / len(rates) for task, rates in o1_mini_wo_data.items()
     }
     claude_averages = {
-        task: sum(rates) / len(rates)
-        for task, rates in claude_data.items()
+        task: sum(rates) / len(rates) for task, rates in claude_data.items()
     }
     o1_mini_averages = {
-        task: sum(rates) / len(rates)
-        for task, rates in o1_mini_data.items()
+        task: sum(rates) / len(rates) for task, rates in o1_mini_data.items()
     }
-    deepseek_averages = {task: sum(rates) / len(rates) for task, rates in deepseek_data.items()}  # ✅ 新增平均值
+    deepseek_averages = {
+        task: sum(rates) / len(rates) for task, rates in deepseek_data.items()
+    }  # ✅ 新增平均值
 
     print(
         f"4o 平均成功率: {task_averages_4o}\n"
@@ -176,12 +205,13 @@ if __name__ == "__main__":
         f"claude 平均成功率: {claude_averages}\n"
         f"o1_mini 平均成功率: {o1_mini_averages}\n"
         f"deepseek 平均成功率: {deepseek_averages}"
-
     )
     # 确保从列表中提取数值进行求和
     task_averages_4o = sum(task_averages_4o.values()) / len(task_averages_4o)
     wo_vlm_averages = sum(wo_vlm_averages.values()) / len(wo_vlm_averages)
-    o1_mini_wo_vlm_averages = sum(o1_mini_wo_vlm_averages.values()) / len(o1_mini_wo_vlm_averages)
+    o1_mini_wo_vlm_averages = sum(o1_mini_wo_vlm_averages.values()) / len(
+        o1_mini_wo_vlm_averages
+    )
     claude_averages = sum(claude_averages.values()) / len(claude_averages)
     o1_mini_averages = sum(o1_mini_averages.values()) / len(o1_mini_averages)
     deepseek_averages = sum(deepseek_averages.values()) / len(deepseek_averages)
@@ -198,10 +228,9 @@ if __name__ == "__main__":
     # 合并所有数据
     combined_data = {
         "gpt4o": wo_vlm_data,
-        "claude-3.7-sonnet":claude_data,
+        "claude-3.7-sonnet": claude_data,
         "o1-mini": o1_mini_wo_data,
-        "deepseek-v3": deepseek_data  # ✅ 合并数据
-
+        "deepseek-v3": deepseek_data,  # ✅ 合并数据
     }
 
     save_success_rates_to_file(combined_data, output_combined_file)
@@ -11,15 +11,156 @@ tort, or otherwise, arising from, out of, or in connection with the
 software or the use or other dealings in the software.
 """
 
+import time
+
 import numpy as np
 import rospy
 import threading
 
 from geometry_msgs.msg import Twist
-from code_llm.msg import Observations
+from code_llm.msg import Observations, CommandInfo
 
 robot_nodes = {}
 thread_local = threading.local()
+_wall_sleep = time.sleep
+# velocity publishers outlive robot nodes, so a warm runner stays connected between trials
+_velocity_publishers = {}
+_command_info_publisher = None
+# persistent service proxies by service name, see call_service
+_service_proxies = {}
+_service_lock = threading.Lock()
+# set by a warm runner to end the current trial
+trial_stop = threading.Event()
+
+# Robot's perception distance limit
+DISTANCE_LIMIT = 1.0
+
+
+class TrialStopped(BaseException):
+    """
+    Raised in robot threads when a warm runner stops the current trial. Derives from
+    BaseException so that `except Exception` in generated code does not swallow it.
+    """
+
+
+class ObservationSnapshot:
+    """
+    One /observation message parsed into arrays. Snapshots are immutable and shared
+    by all robots of the process; each robot copies the rows of its neighborhood, so
+    that generated code may modify the arrays it gets.
+    """
+
+    def __init__(self, msg: Observations, version: int):
+        observations = msg.observations
+        self.version = version
+        self.tick = msg.tick
+        self.stamp = msg.header.stamp.to_sec()
+        self.received_time = time.time()
+        self.ids = np.array([obj.id for obj in observations], dtype=int)
+        self.types = np.array([obj.type for obj in observations], dtype=object)
+        self.colors = np.array([obj.color for obj in observations], dtype=object)
+        self.positions = np.array(
+            [(obj.position.x, obj.position.y) for obj in observations], dtype=float
+        ).reshape(-1, 2)
+        self.velocities = np.array(
+            [(obj.velocity.linear.x, obj.velocity.linear.y) for obj in observations],
+            dtype=float,
+        ).reshape(-1, 2)
+        self.radii = np.array([obj.radius for obj in observations], dtype=float)
+        for array in (self.ids, self.positions, self.velocities, self.radii):
+            array.setflags(write=False)
+        self.robot_index = {
+            entity_id: i
+            for i, (entity_id, entity_type) in enumerate(zip(self.ids, self.types))
+            if entity_type == "Robot"
+        }
+        self._tree = None
+
+    def is_type(self, entity_type: str) -> np.ndarray:
+        return self.types == entity_type
+
+    def neighbors(self, position, radius: float) -> np.ndarray:
+        """
+        Indices of the entities within radius of position, in message order.
+        """
+        if self._tree is None:
+            from scipy.spatial import cKDTree
+
+            self._tree = cKDTree(self.positions)
+        return np.array(
+            sorted(self._tree.query_ball_point(position, radius)), dtype=int
+        )
+
+
+class ObservationCache:
+    """
+    Per-process observation cache. A single /observation subscriber parses each message
+    once; every RobotNode of the process reads from the latest snapshot.
+    """
+
+    def __init__(self):
+        self.snapshot = None
+        self.lockstep = False
+        self.condition = threading.Condition()
+        self._subscriber = None
+        self._version = 0
+
+    def subscribe(self, lockstep: bool = False):
+        with self.condition:
+            self.lockstep = lockstep
+            if self._subscriber is not None:
+                return
+            self._subscriber = rospy.Subscriber(
+                "/observation", Observations, self.observation_callback
+            )
+
+    def observation_callback(self, msg: Observations):
+        with self.condition:
+            # the environment republishes the current tick while waiting for commands
+            if (
+                self.lockstep
+                and self.snapshot is not None
+                and msg.tick <= self.snapshot.tick
+            ):
+                return
+            self._version += 1
+            self.snapshot = ObservationSnapshot(msg, self._version)
+            self.condition.notify_all()
+
+    def wait_for_snapshot(self, timeout: float = None) -> "ObservationSnapshot":
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.snapshot is not None
+                or rospy.is_shutdown()
+                or trial_stop.is_set(),
+                timeout=timeout,
+            )
+            check_trial_stop()
+            return self.snapshot
+
+    def wait_for_next_tick(self, tick: int):
+        with self.condition:
+            while (
+                self.snapshot.tick == tick
+                and not rospy.is_shutdown()
+                and not trial_stop.is_set()
+            ):
+                self.condition.wait(timeout=1.0)
+        check_trial_stop()
+
+    def reset(self):
+        """
+        Forget the last snapshot, so the next trial starts from the new environment's first observation.
+        """
+        with self.condition:
+            self.snapshot = None
+
+    def wake_up(self):
+        with self.condition:
+            self.condition.notify_all()
+
+
+observation_cache = ObservationCache()
 
 
 class RobotNode:
@@ -49,125 +190,111 @@ class RobotNode:
         self.formation_points = np.array(formation_points)
         self.target_position = np.array(target_position)
         self.prey_position = None
+        self.prey_positions = []
         self.moveable_objects = []
         self.unexplored_area = []
         self.initial_robot_positions = {}
         self.initial_prey_positions = []
         self.initial_unexplored_area = []
         self.all_robots_id = []
-
-    def process_initial_observations(self, msg: Observations):
+        # lockstep: simulated clock driven by the observation tick
+        self.lockstep = False
+        self.tick_period = 0.01
+        # version/tick/stamp of the snapshot this robot's view was built from
+        self.observation_version = 0
+        self.observation_tick = -1
+        self.observation_stamp = 0.0
+
+    def process_initial_observations(self, snapshot: ObservationSnapshot):
         self.initial_robot_positions = {}
         self.initial_prey_positions = []
         self.initial_unexplored_area = []
         self.all_robots_id = []
 
-        for obj in msg.observations:
-            if obj.type == "Robot":
-                position = np.array([obj.position.x, obj.position.y])
-                self.initial_robot_positions[obj.id] = position
-                self.all_robots_id.append(obj.id)
-                if obj.id == self.robot_id:
-                    self.robot_info["position"] = position
-                    if self.init_position is None:
-                        self.init_position = self.robot_info["position"]
-                    self.robot_info["radius"] = obj.radius
-            elif obj.type == "Prey":
-                position = np.array([obj.position.x, obj.position.y])
-                self.initial_prey_positions.append(position)
-            elif obj.type == "Landmark" and obj.color == "gray":
-                self.initial_unexplored_area.append(
-                    {
-                        "id": len(self.initial_unexplored_area),
-                        "position": np.array([obj.position.x, obj.position.y]),
-                    }
-                )
+        for i in np.flatnonzero(snapshot.is_type("Robot")):
+            position = snapshot.positions[i].copy()
+            self.initial_robot_positions[snapshot.ids[i]] = position
+            self.all_robots_id.append(snapshot.ids[i])
+        for i in np.flatnonzero(snapshot.is_type("Prey")):
+            self.initial_prey_positions.append(snapshot.positions[i].copy())
+        gray_landmarks = snapshot.is_type("Landmark") & (snapshot.colors == "gray")
+        for i in np.flatnonzero(gray_landmarks):
+            self.initial_unexplored_area.append(
+                {
+                    "id": len(self.initial_unexplored_area),
+                    "position": snapshot.positions[i].copy(),
+                }
+            )
 
-    def observation_callback(self, msg: Observations):
-        self.obstacles_info = []
-        self.other_robots_info = []
-        self.prey_positions = []
-        self.moveable_objects = []
-        self.unexplored_area = []
-        for obj in msg.observations:
-            # Robot's perception distance limit
-            DISTANCE_LIMIT = 1.0
-            if obj.type == "Robot":
-                if obj.id == self.robot_id:
-                    self.robot_info["position"] = np.array(
-                        [obj.position.x, obj.position.y]
-                    )
-                    if self.init_position is None:
-                        self.init_position = self.robot_info["position"]
-                    self.robot_info["radius"] = obj.radius
-                    continue
-
-                # Calculate distance to the current robot
-                distance = np.linalg.norm(
-                    self.robot_info["position"]
-                    - np.array([obj.position.x, obj.position.y])
-                )
-                if distance > DISTANCE_LIMIT:
-                    continue
-
-                self.other_robots_info.append(
-                    {
-                        "id": obj.id,
-                        "position": np.array([obj.position.x, obj.position.y]),
-                        "velocity": np.array(
-                            [obj.velocity.linear.x, obj.velocity.linear.y]
-                        ),
-                        "radius": obj.radius,
-                    }
-                )
-            elif obj.type == "Obstacle":
-                # Calculate distance to the current robot
-                distance = np.linalg.norm(
-                    self.robot_info["position"]
-                    - np.array([obj.position.x, obj.position.y])
-                )
-                if distance > DISTANCE_LIMIT:
-                    continue
-
-                self.obstacles_info.append(
-                    {
-                        "id": obj.id,
-                        "position": np.array([obj.position.x, obj.position.y]),
-                        "radius": obj.radius,
-                    }
-                )
-            elif obj.type == "Prey":
-                self.prey_position = np.array([obj.position.x, obj.position.y])
-            elif obj.type == "Landmark":
-                if obj.color == "gray":
-                    distance = np.linalg.norm(
-                        self.robot_info["position"]
-                        - np.array([obj.position.x, obj.position.y])
-                    )
-                    if distance > DISTANCE_LIMIT:
-                        continue
-                    self.unexplored_area.append(
-                        {
-                            "id": len(self.unexplored_area),
-                            "position": np.array([obj.position.x, obj.position.y]),
-                        }
-                    )
+    def refresh_observations(self):
+        """
+        Rebuild this robot's view if a newer snapshot is available.
+        """
+        snapshot = observation_cache.snapshot
+        if snapshot is None or snapshot.version == self.observation_version:
+            return
+        self.observation_version = snapshot.version
+        self.observation_tick = snapshot.tick
+        self.observation_stamp = snapshot.stamp
+
+        self_index = snapshot.robot_index.get(self.robot_id)
+        if self_index is not None:
+            self.robot_info["position"] = snapshot.positions[self_index].copy()
+            if self.init_position is None:
+                self.init_position = self.robot_info["position"]
+            self.robot_info["radius"] = snapshot.radii[self_index]
+
+        nearby = snapshot.neighbors(self.robot_info["position"], DISTANCE_LIMIT)
+        types = snapshot.types[nearby]
+        self.other_robots_info = [
+            {
+                "id": snapshot.ids[i],
+                "position": snapshot.positions[i].copy(),
+                "velocity": snapshot.velocities[i].copy(),
+                "radius": snapshot.radii[i],
+            }
+            for i in nearby[types == "Robot"]
+            if i != self_index
+        ]
+        self.obstacles_info = [
+            {
+                "id": snapshot.ids[i],
+                "position": snapshot.positions[i].copy(),
+                "radius": snapshot.radii[i],
+            }
+            for i in nearby[types == "Obstacle"]
+        ]
+        self.unexplored_area = [
+            {"id": count, "position": snapshot.positions[i].copy()}
+            for count, i in enumerate(
+                nearby[(types == "Landmark") & (snapshot.colors[nearby] == "gray")]
+            )
+        ]
+        prey = np.flatnonzero(snapshot.is_type("Prey"))
+        if len(prey) > 0:
+            self.prey_position = snapshot.positions[prey[-1]].copy()
 
     def initialize_ros_node(self):
         if not self.ros_initialized:
             self.ros_initialized = True
-            rospy.Subscriber(f"/observation", Observations, self.observation_callback)
-            self.velocity_publisher = rospy.Publisher(
-                f"/robot_{self.robot_id}/velocity", Twist, queue_size=10
-            )
-
-            print(
-                f"Waiting for position message from /robot_{self.robot_id}/observation..."
-            )
-            msg = rospy.wait_for_message(f"/observation", Observations)
-            self.process_initial_observations(msg)
+            self.lockstep = rospy.get_param("lockstep", False)
+            self.tick_period = rospy.get_param("lockstep_period", 0.01)
+            observation_cache.subscribe(lockstep=self.lockstep)
+            self.velocity_publisher = get_velocity_publisher(self.robot_id)
+
+            print(f"Waiting for observation message for robot {self.robot_id}...")
+            snapshot = observation_cache.wait_for_snapshot()
+            self.process_initial_observations(snapshot)
             print(f"Initial observations processed successfully")
-            self.observation_callback(msg)
+            self.refresh_observations()
+            if self.lockstep:
+                # commands published before the manager is connected would be lost and stall the tick
+                while (
+                    self.velocity_publisher.get_num_connections() == 0
+                    and not rospy.is_shutdown()
+                ):
+                    check_trial_stop()
+                    _wall_sleep(0.01)
             # self.timer = rospy.Timer(rospy.Duration(0.01), self.publish_velocities)
 
     def publish_velocities(self):
@@ -176,31 +303,57 @@ class RobotNode:
         velocity_msg.linear.y = self.robot_info["velocity"][1]
 
         self.velocity_publisher.publish(velocity_msg)
+        # tells the manager which observation the command was computed from
+        info_msg = CommandInfo()
+        info_msg.header.stamp = rospy.Time.now()
+        info_msg.robot_id = self.robot_id
+        info_msg.observation_tick = self.observation_tick
+        info_msg.observation_stamp = rospy.Time.from_sec(self.observation_stamp)
+        get_command_info_publisher().publish(info_msg)
         # print(f"Published velocity: {self.robot_info['velocity']}")
 
     def get_all_target_areas(self):
+        self.refresh_observations()
         return self.unexplored_area
 
     def get_self_position(self):
+        self.refresh_observations()
         return self.robot_info["position"]
 
     def get_self_velocity(self):
         return self.robot_info["velocity"]
 
     def get_self_radius(self):
+        self.refresh_observations()
         return self.robot_info["radius"]
 
     def set_self_velocity(self, velocity):
         self.robot_info["velocity"] = np.array(velocity)
-        self.publish_velocities()
+        # in lockstep mode the command is sent once per tick, when the controller sleeps
+        if not self.lockstep:
+            self.publish_velocities()
+
+    def sleep(self, seconds):
+        """
+        Advance the simulated clock: for each elapsed tick, send the current command
+        and wait for the observation of the next tick.
+        """
+        ticks = max(1, int(round(seconds / self.tick_period)))
+        for _ in range(ticks):
+            current_tick = observation_cache.snapshot.tick
+            self.publish_velocities()
+            observation_cache.wait_for_next_tick(current_tick)
 
     def get_surrounding_robots_info(self):
+        self.refresh_observations()
         return self.other_robots_info
 
     def get_surrounding_obstacles_info(self):
+        self.refresh_observations()
         return self.obstacles_info
 
     def get_prey_position(self):
+        self.refresh_observations()
         return self.prey_position
 
     def get_sheep_positions(self):
@@ -219,6 +372,7 @@ class RobotNode:
         return self.formation_points
 
     def get_unexplored_area(self):
+        self.refresh_observations()
         return self.unexplored_area
 
     def get_quadrant_target_position(self):
@@ -237,6 +391,114 @@ class RobotNode:
         return self.assigned_task
 
 
+def get_velocity_publisher(robot_id):
+    if robot_id not in _velocity_publishers:
+        _velocity_publishers[robot_id] = rospy.Publisher(
+            f"/robot_{robot_id}/velocity", Twist, queue_size=10
+        )
+    return _velocity_publishers[robot_id]
+
+
+def get_command_info_publisher():
+    global _command_info_publisher
+    if _command_info_publisher is None:
+        _command_info_publisher = rospy.Publisher(
+            "/command_info", CommandInfo, queue_size=100
+        )
+    return _command_info_publisher
+
+
+def prepare_robots(robot_ids, timeout: float = 10.0) -> bool:
+    """
+    Readiness handshake for all robots of the process at once: subscribe to the observations,
+    create the velocity publishers, and wait until the first observation has arrived and the
+    simulation manager is connected to every publisher. Connections are negotiated in parallel,
+    so robots do not pay the start-up latency one after another.
+
+    Returns:
+        bool: False if the handshake did not complete within timeout seconds.
+    """
+    observation_cache.subscribe(lockstep=rospy.get_param("lockstep", False))
+    publishers = [get_velocity_publisher(robot_id) for robot_id in robot_ids]
+    publishers.append(get_command_info_publisher())
+    deadline = time.time() + timeout
+    while (
+        not rospy.is_shutdown() and not trial_stop.is_set() and time.time() < deadline
+    ):
+        if observation_cache.snapshot is not None and all(
+            publisher.get_num_connections() > 0 for publisher in publishers
+        ):
+            return True
+        _wall_sleep(0.005)
+    return False
+
+
+def call_service(name: str, service_class, *args):
+    """
+    Call a ROS service through a cached persistent proxy. The first call waits for the
+    service; a broken connection is reopened once before the error is raised.
+    """
+    with _service_lock:
+        for attempt in range(2):
+            proxy = _service_proxies.get(name)
+            if proxy is None:
+                rospy.wait_for_service(name)
+                proxy = rospy.ServiceProxy(name, service_class, persistent=True)
+                _service_proxies[name] = proxy
+            try:
+                return proxy(*args)
+            except (rospy.ServiceException, rospy.exceptions.TransportTerminated):
+                proxy.close()
+                del _service_proxies[name]
+                if attempt == 1:
+                    raise
+
+
+def check_trial_stop():
+    if trial_stop.is_set():
+        raise TrialStopped()
+
+
+def stop_trial():
+    """
+    Make every robot thread of the process raise TrialStopped at its next API call or sleep.
+    """
+    trial_stop.set()
+    observation_cache.wake_up()
+
+
+def reset_trial():
+    """
+    Drop all per-robot state before the next trial of a warm runner.
+    """
+    robot_nodes.clear()
+    observation_cache.reset()
+    trial_stop.clear()
+
+
+def robot_sleep(seconds):
+    """
+    Replacement for time.sleep in robot processes. In lockstep mode robot threads sleep on
+    the simulated clock, otherwise on the wall clock but wake up when the trial is stopped.
+    Threads that drive no robot keep the plain time.sleep.
+    """
+    robot_id = getattr(thread_local, "robot_id", None)
+    node = robot_nodes.get(robot_id)
+    if node is None:
+        _wall_sleep(seconds)
+        return
+    check_trial_stop()
+    if node.lockstep:
+        node.sleep(seconds)
+    else:
+        trial_stop.wait(seconds)
+        check_trial_stop()
+
+
+def enable_robot_clock():
+    time.sleep = robot_sleep
+
+
 def set_current_robot_id(robot_id, **kwargs):
     thread_local.robot_id = robot_id
     if robot_id not in robot_nodes:
@@ -244,7 +506,16 @@ def set_current_robot_id(robot_id, **kwargs):
     robot_nodes[robot_id].initialize_ros_node()
 
 
+def switch_robot(robot_id):
+    """
+    Make robot_id the current robot of the calling thread, used when one thread drives several robots.
+    """
+    thread_local.robot_id = robot_id
+    return robot_nodes[robot_id]
+
+
 def get_current_robot_node():
+    check_trial_stop()
     robot_id = getattr(thread_local, "robot_id", None)
     if robot_id is None:
         raise ValueError("No robot_id is set for the current thread")
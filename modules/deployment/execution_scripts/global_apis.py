@@ -10,18 +10,22 @@ claim, damages, or other liability, whether in an action of contract,
 tort, or otherwise, arising from, out of, or in connection with the
 software or the use or other dealings in the software.
 """
-import time
+import threading
 
 import rospy
 from code_llm.msg import Observations
 import numpy as np
 from code_llm.srv import GetCharPoints, GetCharPointsRequest
 
+from apis import call_service
+
 initial_robot_positions = {}
 initial_prey_position = []
 initial_unexplored_areas = []
 all_robots_id = []
 init = False
+# set once the first observation has been processed
+initial_observations_ready = threading.Event()
 
 
 def process_initial_observations(msg: Observations):
@@ -43,16 +47,38 @@ def process_initial_observations(msg: Observations):
             initial_unexplored_areas.append(np.array([obj.position.x, obj.position.y]))
 
 
+def reset_initial_observations():
+    """
+    Forget the initial observations, so that the next trial of a warm runner waits for its own.
+    """
+    global init, initial_prey_position
+    init = False
+    initial_robot_positions.clear()
+    initial_prey_position = []
+    initial_unexplored_areas.clear()
+    all_robots_id.clear()
+    initial_observations_ready.clear()
+
+
 def init_node():
     global init
     if init:
+        initial_observations_ready.wait()
         return
-    time.sleep(1)
     init = True
     print("Waiting for initial observations...")
-    rospy.Subscriber("/observation", Observations, process_initial_observations)
-    msg = rospy.wait_for_message("/observation", Observations)
-    process_initial_observations(msg)
+
+    def on_first_observation(msg: Observations):
+        if initial_observations_ready.is_set():
+            return
+        process_initial_observations(msg)
+        initial_observations_ready.set()
+
+    subscriber = rospy.Subscriber("/observation", Observations, on_first_observation)
+    while not initial_observations_ready.wait(timeout=0.1):
+        if rospy.is_shutdown():
+            return
+    subscriber.unregister()
     print("Initial observations received.")
 
 
@@ -78,11 +104,9 @@ def get_environment_range():
 
 def get_contour_points(character):
     init_node()
-    rospy.wait_for_service("/get_char_points")
     try:
-        get_char_points = rospy.ServiceProxy("/get_char_points", GetCharPoints)
         request = GetCharPointsRequest(character=character)
-        response = get_char_points(request)
+        response = call_service("/get_char_points", GetCharPoints, request)
         points = [(point.x, point.y) for point in response.points]
         return points
     except rospy.ServiceException as e:
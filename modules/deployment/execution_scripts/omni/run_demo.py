@@ -14,6 +14,8 @@ software or the use or other dealings in the software.
 import numpy as np
 import rospy
 
+from modules.utils.assignment import optimal_assignment
+
 
 class Robot:
     def __init__(self, robot_id, max_speed=0.2, buffer_distance=0.3):
@@ -136,21 +138,12 @@ class MultiRobotController:
         :param target_positions: 机器人的目标位置列表。
         :return: 最佳的目标位置分配。
         """
-        from itertools import permutations
-
-        min_total_distance = float("inf")
-        best_permutation = None
-
-        for perm in permutations(range(self.num_robots)):
-            total_distance = sum(
-                np.linalg.norm(start_positions[i] - target_positions[perm[i]])
-                for i in range(self.num_robots)
-            )
-            if total_distance < min_total_distance:
-                min_total_distance = total_distance
-                best_permutation = perm
-
-        return best_permutation
+        # 匈牙利算法求总距离最小的分配，不再枚举所有排列
+        best_permutation = optimal_assignment(
+            np.asarray(start_positions, dtype=float)[: self.num_robots],
+            target_positions,
+        )
+        return tuple(int(i) for i in best_permutation)
 
     def run(self, target_positions):
         """
@@ -11,10 +11,17 @@ tort, or otherwise, arising from, out of, or in connection with the
 software or the use or other dealings in the software.
 """
 
+import ast
+import importlib
+import inspect
+import json
 import os
 import pickle
+import queue
 import sys
 import threading
+import time
+import traceback
 from xmlrpc.client import escape
 
 import rospy
@@ -22,12 +29,10 @@ from code_llm.srv import GetTargetPositions, GetCharPoints, GetCharPointsRequest
 
 
 def get_target_positions():
-    rospy.wait_for_service("/get_target_positions")
+    from apis import call_service
+
     try:
-        get_target_positions = rospy.ServiceProxy(
-            "/get_target_positions", GetTargetPositions
-        )
-        response = get_target_positions()
+        response = call_service("/get_target_positions", GetTargetPositions)
         return {
             info.id: (info.position.x, info.position.y)
             for info in response.target_positions
@@ -38,11 +43,11 @@ def get_target_positions():
 
 
 def get_contour_points(character):
-    rospy.wait_for_service("/get_char_points")
+    from apis import call_service
+
     try:
-        get_char_points = rospy.ServiceProxy("/get_char_points", GetCharPoints)
         request = GetCharPointsRequest(character=character)
-        response = get_char_points(request)
+        response = call_service("/get_char_points", GetCharPoints, request)
         points = [(point.x, point.y) for point in response.points]
         return points
     except rospy.ServiceException as e:
@@ -50,20 +55,183 @@ def get_contour_points(character):
         return []
 
 
+# prefix of the stdout lines a warm runner uses to talk to RunnerPool
+RUNNER_MARKER = "__runner__ "
+# modules generated for each trial, reloaded by a warm runner
+SKILL_MODULES = ("local_skill", "global_skill")
+# wall-clock time robot threads get to leave after a trial is stopped
+STOP_GRACE_PERIOD = 5.0
+
+
 def run_robot(robot_id, target_position, formation_points, task=None):
+    from apis import TrialStopped
     from local_skill import initialize_ros_node, run_loop
 
-    initialize_ros_node(
-        robot_id=robot_id,
-        target_position=target_position,
-        formation_points=formation_points,
-        assigned_task=task,
+    try:
+        initialize_ros_node(
+            robot_id=robot_id,
+            target_position=target_position,
+            formation_points=formation_points,
+            assigned_task=task,
+        )
+        run_loop()
+    except TrialStopped:
+        pass
+
+
+class _SleepToYield(ast.NodeTransformer):
+    """
+    Turn `time.sleep(x)` / `sleep(x)` statements into `yield x`, without entering nested functions.
+    """
+
+    def __init__(self):
+        self.converted = 0
+
+    def visit_FunctionDef(self, node):
+        return node
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+    visit_Lambda = visit_FunctionDef
+
+    def visit_Expr(self, node):
+        if _is_sleep_call(node.value):
+            self.converted += 1
+            value = node.value.args[0] if node.value.args else None
+            return ast.copy_location(ast.Expr(value=ast.Yield(value=value)), node)
+        return node
+
+
+def _is_sleep_call(node) -> bool:
+    if not isinstance(node, ast.Call):
+        return False
+    func = node.func
+    if isinstance(func, ast.Attribute):
+        return (
+            func.attr == "sleep"
+            and isinstance(func.value, ast.Name)
+            and func.value.id in ("time", "rospy")
+        )
+    return isinstance(func, ast.Name) and func.id == "sleep"
+
+
+def load_tick_controller():
+    """
+    Return run_loop of local_skill as a generator function that yields the time it would
+    sleep, so that one thread can step all robots tick by tick. Returns None when the
+    controller also sleeps outside the top level of run_loop and has to keep its own thread.
+    """
+    import local_skill
+
+    return tick_controller_of(local_skill)
+
+
+def tick_controller_of(module):
+    """
+    run_loop of an imported skill module with its sleep statements turned into yields, see
+    load_tick_controller. Only run_loop is compiled again, against the globals of the module,
+    so the module is not executed a second time and run_loop shares its state.
+    """
+    if inspect.isgeneratorfunction(module.run_loop):
+        return module.run_loop
+
+    tree = ast.parse(inspect.getsource(module))
+    total_sleeps = sum(_is_sleep_call(node) for node in ast.walk(tree))
+    run_loop = next(
+        (
+            node
+            for node in tree.body
+            if isinstance(node, ast.FunctionDef) and node.name == "run_loop"
+        ),
+        None,
     )
-    run_loop()
+    if run_loop is None:
+        return None
+    transformer = _SleepToYield()
+    run_loop.body = [transformer.visit(statement) for statement in run_loop.body]
+    if transformer.converted == 0 or transformer.converted != total_sleeps:
+        return None
 
+    code = compile(
+        ast.fix_missing_locations(ast.Module(body=[run_loop], type_ignores=[])),
+        module.__file__,
+        "exec",
+    )
+    namespace = {}
+    exec(code, module.__dict__, namespace)
+    return namespace["run_loop"]
+
+
+def run_robots_tick_scheduled(controller, robot_args: dict):
+    """
+    Step every robot of this process in a fixed order once per tick from a single thread.
+    A robot that yields `seconds` is resumed again after round(seconds / tick period) ticks.
+    """
+    from apis import initialize_ros_node, switch_robot, observation_cache
+
+    lockstep = rospy.get_param("lockstep", False)
+    period = rospy.get_param("lockstep_period", 0.01)
+
+    nodes = {}
+    for robot_id, kwargs in robot_args.items():
+        initialize_ros_node(robot_id=robot_id, **kwargs)
+        nodes[robot_id] = switch_robot(robot_id)
+    controllers = {}
+    for robot_id in nodes:
+        switch_robot(robot_id)
+        controllers[robot_id] = controller()
+    wake_tick = {robot_id: 0 for robot_id in controllers}
+
+    tick = 0
+    next_deadline = time.time()
+    while controllers and not rospy.is_shutdown():
+        for robot_id in sorted(controllers):
+            if wake_tick[robot_id] > tick:
+                continue
+            switch_robot(robot_id)
+            try:
+                seconds = next(controllers[robot_id])
+            except StopIteration:
+                del controllers[robot_id]
+                continue
+            except Exception:
+                traceback.print_exc()
+                del controllers[robot_id]
+                continue
+            ticks = 1 if seconds is None else max(1, int(round(seconds / period)))
+            wake_tick[robot_id] = tick + ticks
+
+        if lockstep:
+            # robots that finished keep reporting their last command so the tick is not held up
+            current_tick = observation_cache.snapshot.tick
+            for robot_id in sorted(nodes):
+                nodes[robot_id].publish_velocities()
+            observation_cache.wait_for_next_tick(current_tick)
+        else:
+            next_deadline += period
+            remaining = next_deadline - time.time()
+            if remaining > 0:
+                time.sleep(remaining)
+            else:
+                next_deadline = time.time()
+        tick += 1
+
+
+def init_runner_node(start_idx, end_idx):
+    from apis import enable_robot_clock
 
-def run_multiple_robot(start_idx, end_idx):
     rospy.init_node(f"multi_robot_publisher_node{start_idx}_{end_idx}", anonymous=True)
+    # time.sleep in robot threads follows the simulation clock and wakes up on stop
+    enable_robot_clock()
+
+
+def run_multiple_robot(start_idx, end_idx):
+    from apis import prepare_robots
+
+    start_time = time.time()
+    robot_ids = list(range(start_idx, end_idx + 1))
+    # connect to the observations while the target positions are fetched
+    ready = threading.Thread(target=prepare_robots, args=(robot_ids,), daemon=True)
+    ready.start()
     target_positions = get_target_positions()
     # char_points = get_contour_points('R')
     char_points = [(1, -1), (1, 1), (0, 0), (1, 0), (2, 0)]
@@ -76,6 +244,30 @@ def run_multiple_robot(start_idx, end_idx):
     except (FileNotFoundError, EOFError, pickle.UnpicklingError) as e:
         print(f"Error loading file: {e}. Initializing a default task.")
 
+    from apis import TrialStopped
+
+    ready.join()
+    print(f"Robots {start_idx}-{end_idx} ready in {time.time() - start_time:.3f}s")
+    if rospy.get_param("robot_scheduler", "thread") == "tick":
+        controller = load_tick_controller()
+        if controller is not None:
+            robot_args = {
+                i: dict(
+                    target_position=target_positions[i],
+                    formation_points=char_points,
+                    assigned_task=task[i] if assigned else None,
+                )
+                for i in range(start_idx, end_idx + 1)
+            }
+            try:
+                run_robots_tick_scheduled(controller, robot_args)
+            except TrialStopped:
+                pass
+            return
+        print(
+            "run_loop sleeps outside its main loop, falling back to one thread per robot."
+        )
+
     for i in range(start_idx, end_idx + 1):
         assigned_task = task[i] if assigned else None
         thread = threading.Thread(
@@ -88,6 +280,123 @@ def run_multiple_robot(start_idx, end_idx):
         thread.join()
 
 
+class _TrialStderr:
+    """
+    Stand-in for sys.stderr during a trial: keeps what the robot threads write, so the
+    trial result matches the stderr a cold-started run.py would return.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.chunks = []
+        self.lock = threading.Lock()
+
+    def write(self, text):
+        with self.lock:
+            self.chunks.append(text)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def getvalue(self) -> str:
+        with self.lock:
+            return "".join(self.chunks)
+
+
+def reload_skills():
+    for name in SKILL_MODULES:
+        sys.modules.pop(name, None)
+    importlib.invalidate_caches()
+
+
+def reset_trial_state():
+    """
+    Drop the state the previous trial left in the API modules, before its skills are reloaded.
+    """
+    from apis import reset_trial
+
+    reset_trial()
+    # imported only by the global skills
+    global_apis = sys.modules.get("global_apis")
+    if global_apis is not None:
+        global_apis.reset_initial_observations()
+
+
+def report(message: dict):
+    sys.stdout.write(RUNNER_MARKER + json.dumps(message) + "\n")
+    sys.stdout.flush()
+
+
+def run_trial(start_idx, end_idx, commands: queue.Queue) -> dict:
+    """
+    Run one trial with freshly imported skills until the robots finish or a stop command arrives.
+    """
+    from apis import stop_trial
+
+    reset_trial_state()
+    reload_skills()
+    stderr = _TrialStderr(sys.stderr)
+    sys.stderr = stderr
+
+    def target():
+        try:
+            run_multiple_robot(start_idx, end_idx)
+        except Exception:
+            traceback.print_exc()
+
+    trial = threading.Thread(target=target, daemon=True)
+    trial.start()
+    status = "finished"
+    try:
+        while trial.is_alive():
+            trial.join(timeout=0.05)
+            try:
+                command = commands.get_nowait()
+            except queue.Empty:
+                continue
+            if command in ("stop", "exit"):
+                if command == "exit":
+                    commands.put(command)
+                status = "stopped"
+                stop_trial()
+                trial.join(timeout=STOP_GRACE_PERIOD)
+                break
+    finally:
+        sys.stderr = stderr.stream
+    # the trial thread joins the robot threads, so it is alive only if one of them ignores stop
+    if trial.is_alive():
+        status = "stuck"
+    return {"status": status, "stderr": stderr.getvalue()}
+
+
+def serve(start_idx, end_idx):
+    """
+    Warm runner: stay connected to ROS and run one trial per "run" command read from stdin,
+    reloading the generated skills every time. Answers each trial with a marker line on stdout.
+    """
+    commands = queue.Queue()
+
+    def read_commands():
+        for line in sys.stdin:
+            commands.put(line.strip())
+        commands.put("exit")
+
+    threading.Thread(target=read_commands, daemon=True).start()
+    report({"status": "ready"})
+    while not rospy.is_shutdown():
+        command = commands.get()
+        if command == "exit":
+            break
+        if command != "run":
+            continue
+        result = run_trial(start_idx, end_idx, commands)
+        report(result)
+        if result["status"] == "stuck":
+            # a robot thread cannot be killed, start over in a fresh process
+            os._exit(1)
+
+
 if __name__ == "__main__":
     a = sys.argv
     # start_id = 1
@@ -95,4 +404,8 @@ if __name__ == "__main__":
     start_id = int(sys.argv[1])
     end_id = int(sys.argv[2])
 
-    run_multiple_robot(start_id, end_id)
+    init_runner_node(start_id, end_id)
+    if "--serve" in sys.argv[3:]:
+        serve(start_id, end_id)
+    else:
+        run_multiple_robot(start_id, end_id)
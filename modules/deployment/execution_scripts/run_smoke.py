@@ -0,0 +1,492 @@
+"""
+Copyright (c) 2024 WindyLab of Westlake University, China
+All rights reserved.
+
+This software is provided "as is" without warranty of any kind, either
+express or implied, including but not limited to the warranties of
+merchantability, fitness for a particular purpose, or non-infringement.
+In no event shall the authors or copyright holders be liable for any
+claim, damages, or other liability, whether in an action of contract,
+tort, or otherwise, arising from, out of, or in connection with the
+software or the use or other dealings in the software.
+"""
+
+# Headless smoke test of the generated skills, run in the experiment directory:
+#
+#     python run_smoke.py smoke_test_world.json --ticks 300 [--global]
+#
+# global_skill.py and local_skill.py are imported against an in-process fake of apis.py and
+# global_apis.py instead of ROS. allocate_run() runs first (with --global), then one thread per
+# robot runs run_loop() for a few hundred lockstep ticks of a kinematic world, where time.sleep
+# advances the simulated clock. The first traceback stops the test. Tracebacks are written to
+# stderr like run.py does and the outcome to smoke_test.json.
+
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+import traceback
+import types
+
+import numpy as np
+
+RESULT_FILE = "smoke_test.json"
+# must match apis.py and global_apis.py
+DISTANCE_LIMIT = 1.0
+ENVIRONMENT_RANGE = {"x_min": -2.5, "x_max": 2.5, "y_min": -2.5, "y_max": 2.5}
+QUADRANT_TARGET_POSITION = {
+    3: np.array([-1.25, -1.25]),
+    2: np.array([-1.25, 1.25]),
+    1: np.array([1.25, 1.25]),
+    4: np.array([1.25, -1.25]),
+}
+# the formation points run.py passes to every robot
+CHAR_POINTS = [(1, -1), (1, 1), (0, 0), (1, 0), (2, 0)]
+
+
+class SmokeTestFinished(BaseException):
+    """
+    Raised in robot threads once the last tick is reached or another robot failed. Derives from
+    BaseException so that `except Exception` in generated code does not swallow it.
+    """
+
+
+class FakeWorld:
+    """
+    Kinematic world stepped in lockstep like the tick scheduler of run.py: every tick, the robots
+    that are due run one at a time in id order until they sleep, then they move by their commanded
+    velocity. Other entities stay in place. Only one robot thread runs at a time, so the threads
+    do not contend for the GIL and the order of the robots is deterministic.
+    """
+
+    def __init__(self, entities: list[dict], dt: float, max_speed: float, ticks: int):
+        self.ids = np.array([entity["id"] for entity in entities], dtype=int)
+        self.types = np.array([entity["type"] for entity in entities], dtype=object)
+        self.colors = np.array(
+            [str(entity.get("color")) for entity in entities], dtype=object
+        )
+        self.positions = np.array(
+            [entity["position"] for entity in entities], dtype=float
+        ).reshape(-1, 2)
+        self.radii = np.array(
+            [np.max(entity.get("size") or 0.0) for entity in entities], dtype=float
+        )
+        self.target_positions = {
+            entity["id"]: entity.get("target_position") for entity in entities
+        }
+        self.index = {entity_id: i for i, entity_id in enumerate(self.ids)}
+        # the types do not change, so the lookups by type are computed once
+        self.indices_by_type = {
+            entity_type: np.flatnonzero(self.types == entity_type)
+            for entity_type in set(self.types)
+        }
+        self.initial_positions = self.positions.copy()
+        self.velocities = np.zeros_like(self.positions)
+        self.dt = dt
+        self.max_speed = max_speed
+        self.ticks = ticks
+        self.tick = 0
+        self.stopped = False
+        self.running = set()
+        self.wake_ticks = {}
+        self.resume = {}
+        self.yielded = threading.Event()
+
+    @property
+    def robot_ids(self) -> list[int]:
+        # the range of ids run.py is started with, see Manager
+        controlled = self.ids[(self.types == "Robot") | (self.types == "Leader")]
+        return (
+            list(range(int(controlled.min()), int(controlled.max()) + 1))
+            if len(controlled)
+            else []
+        )
+
+    def ids_of(self, entity_type: str) -> np.ndarray:
+        return self.indices_by_type.get(entity_type, np.empty(0, dtype=int))
+
+    def neighbors(self, position, entity_type: str) -> np.ndarray:
+        candidates = self.ids_of(entity_type)
+        offsets = self.positions[candidates] - position
+        squared_distances = np.einsum("ij,ij->i", offsets, offsets)
+        return candidates[squared_distances <= DISTANCE_LIMIT**2]
+
+    def set_velocity(self, robot_id: int, velocity):
+        index = self.index.get(robot_id)
+        if index is None:
+            return
+        velocity = np.asarray(velocity, dtype=float).reshape(2)
+        # like Manager.velocity_callback, every command moves at max_speed in its direction
+        speed = math.hypot(velocity[0], velocity[1])
+        self.velocities[index] = velocity / (speed + 0.001) * self.max_speed
+
+    def start(self, robot_ids):
+        self.running = set(robot_ids)
+        self.wake_ticks = {robot_id: 0 for robot_id in robot_ids}
+        self.resume = {robot_id: threading.Event() for robot_id in robot_ids}
+
+    def stop(self):
+        self.stopped = True
+        for event in self.resume.values():
+            event.set()
+        self.yielded.set()
+
+    def wait_turn(self, robot_id: int):
+        event = self.resume[robot_id]
+        event.wait()
+        event.clear()
+        if self.stopped:
+            raise SmokeTestFinished()
+
+    def sleep(self, robot_id: int, seconds):
+        ticks = max(1, int(round((seconds or 0.0) / self.dt)))
+        self.wake_ticks[robot_id] = self.tick + ticks
+        self.yielded.set()
+        self.wait_turn(robot_id)
+
+    def leave(self, robot_id: int):
+        self.running.discard(robot_id)
+        self.yielded.set()
+
+    def step(self, deadline: float) -> bool:
+        """
+        Run the robots that are due until they sleep, then advance the world by one tick.
+
+        Returns:
+            bool: False if a robot did not sleep or return before the deadline.
+        """
+        for robot_id in sorted(self.running):
+            if self.stopped:
+                return True
+            if self.wake_ticks[robot_id] > self.tick:
+                continue
+            self.yielded.clear()
+            self.resume[robot_id].set()
+            if not self.yielded.wait(timeout=max(0.0, deadline - time.time())):
+                return False
+        self.positions += self.velocities * self.dt
+        self.tick += 1
+        return True
+
+
+class FakeRobot:
+    def __init__(
+        self,
+        world: FakeWorld,
+        robot_id,
+        target_position=None,
+        formation_points=None,
+        assigned_task=None,
+        **kwargs
+    ):
+        self.world = world
+        self.robot_id = robot_id
+        self.target_position = np.array(target_position)
+        self.formation_points = np.array(formation_points)
+        self.assigned_task = assigned_task
+        self.velocity = np.array([0.0, 0.0])
+
+    @property
+    def position(self) -> np.ndarray:
+        index = self.world.index.get(self.robot_id)
+        return (
+            self.world.positions[index].copy()
+            if index is not None
+            else np.array([0.0, 0.0])
+        )
+
+    def entities_info(self, entity_type: str, velocity: bool = False) -> list[dict]:
+        world = self.world
+        infos = []
+        for i in world.neighbors(self.position, entity_type):
+            if world.ids[i] == self.robot_id:
+                continue
+            info = {
+                "id": int(world.ids[i]),
+                "position": world.positions[i].copy(),
+                "radius": world.radii[i],
+            }
+            if velocity:
+                info["velocity"] = world.velocities[i].copy()
+            infos.append(info)
+        return infos
+
+
+def make_local_apis(world: FakeWorld) -> types.ModuleType:
+    """
+    Fake of apis.py with the functions the generated local skills import.
+    """
+    thread_local = threading.local()
+    robots = {}
+
+    def current() -> FakeRobot:
+        if world.stopped:
+            raise SmokeTestFinished()
+        robot_id = getattr(thread_local, "robot_id", None)
+        if robot_id is None:
+            raise ValueError("No robot_id is set for the current thread")
+        return robots[robot_id]
+
+    def initialize_ros_node(robot_id, **kwargs):
+        thread_local.robot_id = robot_id
+        if robot_id not in robots:
+            robots[robot_id] = FakeRobot(world, robot_id, **kwargs)
+
+    def set_self_velocity(velocity):
+        robot = current()
+        robot.velocity = np.array(velocity)
+        world.set_velocity(robot.robot_id, robot.velocity)
+
+    def get_surrounding_unexplored_area():
+        robot = current()
+        nearby = world.neighbors(robot.position, "Landmark")
+        return [
+            {"id": count, "position": world.positions[i].copy()}
+            for count, i in enumerate(i for i in nearby if world.colors[i] == "gray")
+        ]
+
+    def get_prey_position():
+        current()
+        prey = world.ids_of("Prey")
+        return world.positions[prey[-1]].copy() if len(prey) else None
+
+    def get_surrounding_environment_info():
+        robot = current()
+        return [
+            {
+                "Type": "robot",
+                "position": info["position"],
+                "velocity": info["velocity"],
+                "radius": info["radius"],
+            }
+            for info in robot.entities_info("Robot", velocity=True)
+        ] + [
+            {
+                "Type": "obstacle",
+                "position": info["position"],
+                "velocity": np.array([0, 0]),
+                "radius": info["radius"],
+            }
+            for info in robot.entities_info("Obstacle")
+        ]
+
+    def get_self_radius():
+        index = world.index.get(current().robot_id)
+        return world.radii[index] if index is not None else 0.0
+
+    def sleep(seconds):
+        robot_id = getattr(thread_local, "robot_id", None)
+        if robot_id is not None:
+            world.sleep(robot_id, seconds)
+
+    functions = {
+        "initialize_ros_node": initialize_ros_node,
+        "get_self_id": lambda: current().robot_id,
+        "get_self_position": lambda: current().position,
+        "get_self_velocity": lambda: current().velocity,
+        "get_self_radius": get_self_radius,
+        "set_self_velocity": set_self_velocity,
+        "stop_self": lambda: set_self_velocity([0, 0]),
+        "get_surrounding_robots_info": lambda: current().entities_info(
+            "Robot", velocity=True
+        ),
+        "get_surrounding_obstacles_info": lambda: current().entities_info("Obstacle"),
+        "get_surrounding_environment_info": get_surrounding_environment_info,
+        "get_surrounding_unexplored_area": get_surrounding_unexplored_area,
+        "get_prey_position": get_prey_position,
+        "get_lead_position": get_prey_position,
+        "get_sheep_positions": lambda: [],
+        "get_environment_range": lambda: dict(ENVIRONMENT_RANGE),
+        "get_target_position": lambda: current().target_position,
+        "get_target_formation_points": lambda: current().formation_points,
+        "get_quadrant_target_position": lambda: dict(QUADRANT_TARGET_POSITION),
+        "get_assigned_task": lambda: current().assigned_task,
+        "robot_sleep": sleep,
+    }
+    module = types.ModuleType("apis")
+    module.__dict__.update(functions)
+    return module
+
+
+def make_global_apis(world: FakeWorld) -> types.ModuleType:
+    """
+    Fake of global_apis.py with the functions the generated global skills import.
+    """
+
+    def positions_of(entity_type: str) -> list:
+        return [world.initial_positions[i].copy() for i in world.ids_of(entity_type)]
+
+    def get_prey_initial_position():
+        prey = positions_of("Prey")
+        return prey[-1] if prey else []
+
+    functions = {
+        "init_node": lambda: None,
+        "get_all_robots_id": lambda: [int(world.ids[i]) for i in world.ids_of("Robot")],
+        "get_all_robots_initial_position": lambda: {
+            int(world.ids[i]): world.initial_positions[i].copy()
+            for i in world.ids_of("Robot")
+        },
+        "get_prey_initial_position": get_prey_initial_position,
+        "get_initial_unexplored_areas": lambda: [
+            world.initial_positions[i].copy()
+            for i in world.ids_of("Landmark")
+            if world.colors[i] == "gray"
+        ],
+        "get_environment_range": lambda: dict(ENVIRONMENT_RANGE),
+        "get_contour_points": lambda character: list(CHAR_POINTS),
+        "get_target_formation_points": lambda: [
+            np.array(point) for point in CHAR_POINTS
+        ],
+        "get_quadrant_target_position": lambda: dict(QUADRANT_TARGET_POSITION),
+    }
+    module = types.ModuleType("global_apis")
+    module.__dict__.update(functions)
+    return module
+
+
+class SmokeTest:
+    def __init__(self, world: FakeWorld, run_global: bool):
+        self.world = world
+        self.run_global = run_global
+        self.scope = None
+        self.error = None
+        self.lock = threading.Lock()
+
+    def fail(self, scope: str):
+        error = traceback.format_exc()
+        with self.lock:
+            if self.error is not None:
+                return
+            self.scope = scope
+            self.error = error
+        sys.stderr.write(error)
+        self.world.stop()
+
+    def allocate(self):
+        """
+        Returns:
+            The result of allocate_run, None if there is no global skill or it failed.
+        """
+        if not self.run_global:
+            return None
+        try:
+            from global_skill import allocate_run
+
+            return allocate_run()
+        except Exception:
+            self.fail("global")
+            return None
+
+    def run_robot(self, local_apis, robot_id, kwargs):
+        try:
+            self.world.wait_turn(robot_id)
+            from local_skill import run_loop
+
+            local_apis.initialize_ros_node(robot_id=robot_id, **kwargs)
+            run_loop()
+        except SmokeTestFinished:
+            pass
+        except Exception:
+            self.fail("local")
+        finally:
+            self.world.leave(robot_id)
+
+    def run(self, local_apis, wall_timeout: float) -> str:
+        task = self.allocate()
+        if self.error is not None:
+            return "failed"
+        robot_ids = self.world.robot_ids
+        try:
+            robot_args = {
+                robot_id: dict(
+                    target_position=self.world.target_positions.get(robot_id),
+                    formation_points=CHAR_POINTS,
+                    assigned_task=task[robot_id] if task is not None else None,
+                )
+                for robot_id in robot_ids
+            }
+        except Exception:
+            # run.py looks up the task of every robot in the result of allocate_run
+            self.fail("global")
+            return "failed"
+        try:
+            import local_skill  # noqa: F401
+        except Exception:
+            self.fail("local")
+            return "failed"
+
+        world = self.world
+        world.start(robot_ids)
+        for robot_id in robot_ids:
+            threading.Thread(
+                target=self.run_robot,
+                args=(local_apis, robot_id, robot_args[robot_id]),
+                daemon=True,
+            ).start()
+        deadline = time.time() + wall_timeout
+        timed_out = False
+        while world.tick < world.ticks and world.running and not world.stopped:
+            if not world.step(deadline):
+                timed_out = True
+                break
+        world.stop()
+        if self.error is not None:
+            return "failed"
+        # e.g. a run_loop that never sleeps holds up the lockstep, which is not an error by itself
+        return "timeout" if timed_out else "passed"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Smoke test the generated skills without ROS."
+    )
+    parser.add_argument("world", help="JSON file with the entities, dt and max_speed")
+    parser.add_argument("--ticks", type=int, default=300)
+    parser.add_argument("--wall_timeout", type=float, default=5.0)
+    parser.add_argument(
+        "--global",
+        dest="run_global",
+        action="store_true",
+        help="Run allocate_run of global_skill.py first",
+    )
+    args = parser.parse_args()
+
+    with open(args.world, "r") as f:
+        data = json.load(f)
+    world = FakeWorld(
+        data["entities"], dt=data["dt"], max_speed=data["max_speed"], ticks=args.ticks
+    )
+    local_apis = make_local_apis(world)
+    sys.modules["apis"] = local_apis
+    sys.modules["global_apis"] = make_global_apis(world)
+    # the skills sleep on the simulated clock, like with enable_robot_clock in run.py
+    time.sleep = local_apis.robot_sleep
+    sys.path.insert(0, os.getcwd())
+
+    start_time = time.time()
+    smoke_test = SmokeTest(world, args.run_global)
+    status = smoke_test.run(local_apis, args.wall_timeout)
+    with open(RESULT_FILE, "w") as f:
+        json.dump(
+            {
+                "status": status,
+                "scope": smoke_test.scope,
+                "error": smoke_test.error,
+                "ticks": world.tick,
+                "wall_time": time.time() - start_time,
+            },
+            f,
+            indent=4,
+        )
+    sys.stdout.flush()
+    sys.stderr.flush()
+    # robot threads stuck in generated code must not keep the process alive
+    os._exit(1 if status == "failed" else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,7 @@ software or the use or other dealings in the software.
 """
 
 import json
+import time
 from typing import Any, Optional, SupportsFloat, TypeVar
 from math import isnan
 
@@ -71,6 +72,8 @@ class GymnasiumEnvironmentBase(gymnasium.Env, ABC):
 
         self.dt = self.data.get("dt", 0.01)
         self.FPS = 100
+        # optional StepProfiler, step() reports the time spent building observations to it
+        self.profiler = None
         self.screen: pygame.Surface
         self.simulation_data = {}
         self.scale_factor = self.data["display"]["scale_factor"]
@@ -288,6 +291,7 @@ class GymnasiumEnvironmentBase(gymnasium.Env, ABC):
                     entity.move(self.time_step)
 
         self.engine.step(self.dt)
+        observation_start = time.perf_counter()
         obs = self.get_observation("array")
         reward = self.reward()
         self.time_step += 1
@@ -295,6 +299,8 @@ class GymnasiumEnvironmentBase(gymnasium.Env, ABC):
         termination = False
         truncation = False
         infos = self.get_observation("dict")
+        if self.profiler is not None:
+            self.profiler.record("observation", time.perf_counter() - observation_start)
         return obs, reward, termination, truncation, infos
 
     def reward(self):
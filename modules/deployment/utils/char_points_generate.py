@@ -13,10 +13,19 @@ software or the use or other dealings in the software.
 
 # -*- coding: utf-8 -*-
 
+import hashlib
+import os
+import string
+import threading
+from collections import OrderedDict
+
 import cv2
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 
+# shapes requested by most shaping tasks, loaded when the simulation manager starts
+COMMON_SHAPES = string.ascii_uppercase + string.digits
+
 
 def create_char_image(char, font_path, font_size=200, image_size=(300, 300)):
     img = np.zeros((image_size[0], image_size[1], 3), dtype=np.uint8)
@@ -55,8 +64,6 @@ def create_star_image(
 
     # 绘制海星形状
     cv2.fillPoly(img, [np.array(points)], (255, 255, 255))
-    cv2.imshow("Star Shape", img)
-    cv2.waitKey(0)
 
     return img
 
@@ -69,42 +76,42 @@ def draw_contours(img):
 
 
 def sample_contour_points(contours, num_points):
-    all_points = []
-    total_length = 0
-
+    """
+    Sample num_points points evenly spaced by arc length along the contours, walked one
+    after another. The k-th point lies at arc length k * total_length / num_points.
+    """
+    starts, ends = [], []
     for contour in contours:
-        contour = contour[:, 0, :]
-        distances = np.sqrt(np.sum(np.diff(contour, axis=0) ** 2, axis=1))
-        total_length += np.sum(distances)
-        all_points.append((contour, distances))
-
-    if total_length == 0:
+        contour = contour[:, 0, :].astype(float)
+        starts.append(contour[:-1])
+        ends.append(contour[1:])
+    if not starts:
+        return []
+    starts = np.concatenate(starts)
+    ends = np.concatenate(ends)
+    lengths = np.linalg.norm(ends - starts, axis=1)
+    arc_length = np.cumsum(lengths)
+    if len(arc_length) == 0 or arc_length[-1] == 0:
         return []
 
-    sample_distance = total_length / num_points
-    sampled_points = []
-    accumulated_distance = 0
-
-    for contour, distances in all_points:
-        for i in range(1, len(contour)):
-            segment_distance = distances[i - 1]
-            accumulated_distance += segment_distance
+    total_length = arc_length[-1]
+    targets = total_length / num_points * np.arange(1, num_points + 1)
+    # the segment each sample falls on, the first one reaching its arc length
+    index = np.minimum(np.searchsorted(arc_length, targets), len(arc_length) - 1)
+    ratio = (arc_length[index] - targets) / lengths[index]
+    sampled_points = ends[index] - ratio[:, None] * (ends[index] - starts[index])
+    return [tuple(point) for point in sampled_points]
 
-            while accumulated_distance >= sample_distance:
-                ratio = (accumulated_distance - sample_distance) / segment_distance
-                new_point = contour[i] - ratio * (contour[i] - contour[i - 1])
-                sampled_points.append(tuple(new_point))
-                accumulated_distance -= sample_distance
 
-    return sampled_points
+def _default_font_path():
+    from modules.utils.root import get_project_root
 
+    return f"{get_project_root()}/assets/fonts/HanYiCuYuanJian-1.ttf"
 
-def validate_contour_points(char, num_points=150, star=False):
-    from modules.utils.root import get_project_root
 
-    font_path = f"{get_project_root()}/assets/fonts/HanYiCuYuanJian-1.ttf"
+def validate_contour_points(char, num_points=150, star=False, font_path=None):
     if not star:
-        image = create_char_image(char, font_path)
+        image = create_char_image(char, font_path or _default_font_path())
     else:
         image = create_star_image()
 
@@ -124,6 +131,83 @@ def validate_contour_points(char, num_points=150, star=False):
     return sampled_points
 
 
+class ContourCache:
+    """
+    Contour points by (char, num_points, star, font): an in-memory LRU in front of .npy
+    files on disk, so a shape is rendered and sampled once per machine. The font file's
+    size and mtime are part of the key, so replacing the font invalidates its entries.
+    """
+
+    def __init__(self, cache_dir: str = None, max_size: int = 128):
+        if cache_dir is None:
+            from modules.utils.root import get_project_root
+
+            cache_dir = os.path.join(get_project_root(), ".cache", "contours")
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _file_path(self, key: tuple) -> str:
+        char, num_points, star, font_path = key
+        font_stat = os.stat(font_path) if not star else None
+        font_id = (
+            f"{font_path}:{font_stat.st_size}:{font_stat.st_mtime_ns}"
+            if font_stat
+            else ""
+        )
+        digest = hashlib.sha1(f"{char}|{num_points}|{star}|{font_id}".encode("utf-8"))
+        return os.path.join(self.cache_dir, f"{digest.hexdigest()}.npy")
+
+    def get(self, char, num_points=150, star=False, font_path=None) -> np.ndarray:
+        """
+        Same points as validate_contour_points(char, num_points, star, font_path). The
+        returned array is shared with the cache and read-only.
+        """
+        font_path = font_path or _default_font_path()
+        key = (char, num_points, star, font_path)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        file_path = self._file_path(key)
+        try:
+            points = np.load(file_path)
+        except (OSError, ValueError):
+            points = validate_contour_points(
+                char, num_points, star, font_path=font_path
+            )
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # write to a temporary file first, other processes may read the cache at the same time
+            temporary_path = f"{file_path}.{os.getpid()}.tmp"
+            with open(temporary_path, "wb") as f:
+                np.save(f, points)
+            os.replace(temporary_path, file_path)
+        points.setflags(write=False)
+
+        with self._lock:
+            self._entries[key] = points
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return points
+
+    def warm_up(self, chars=COMMON_SHAPES, num_points=150):
+        for char in chars:
+            self.get(char, num_points)
+
+
+contour_cache = None
+
+
+def get_contour_cache() -> ContourCache:
+    global contour_cache
+    if contour_cache is None:
+        contour_cache = ContourCache()
+    return contour_cache
+
+
 # # Example usage:
 # font_path = "HanYiCuYuanJian-1.ttf"
 # character = '国'
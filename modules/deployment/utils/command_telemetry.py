@@ -0,0 +1,184 @@
+"""
+Copyright (c) 2024 WindyLab of Westlake University, China
+All rights reserved.
+
+This software is provided "as is" without warranty of any kind, either
+express or implied, including but not limited to the warranties of
+merchantability, fitness for a particular purpose, or non-infringement.
+In no event shall the authors or copyright holders be liable for any
+claim, damages, or other liability, whether in an action of contract,
+tort, or otherwise, arising from, out of, or in connection with the
+software or the use or other dealings in the software.
+"""
+
+import json
+import threading
+import time
+
+import numpy as np
+
+# bin edges of the message interval histograms, in milliseconds
+INTERVAL_BINS_MS = [0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, np.inf]
+
+# columns of the per-step time series, one row per robot per environment step
+SERIES_COLUMNS = [
+    "time",  # wall-clock time the step applied the command
+    "tick",
+    "robot_id",
+    "observation_tick",  # tick of the observation the command was computed from
+    "obs_to_cmd",  # observation published -> command sent
+    "transport",  # command sent -> command received by the manager
+    "cmd_to_apply",  # command received -> applied by the environment step
+    "obs_to_apply",  # observation published -> applied, the end-to-end latency
+    "fresh",  # 1 if a new command arrived since the previous step, 0 if the last one was reused
+    "superseded",  # commands received since the previous step but overwritten before being applied
+    "stale",  # 1 if the applied command is based on an observation older than stale_after
+]
+
+
+def _latency_stats(values: np.ndarray) -> dict:
+    if len(values) == 0:
+        return {}
+    return {
+        "mean": float(np.mean(values)),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "max": float(np.max(values)),
+    }
+
+
+def _interval_stats(times: list, duration: float) -> dict:
+    times = np.asarray(times, dtype=float)
+    intervals = np.diff(times) * 1000.0
+    stats = {
+        "messages": int(len(times)),
+        "rate": len(times) / duration if duration > 0 else 0.0,
+    }
+    if len(intervals):
+        stats["interval_mean_ms"] = float(np.mean(intervals))
+        stats["interval_std_ms"] = float(np.std(intervals))
+        stats["interval_histogram"] = np.histogram(intervals, bins=INTERVAL_BINS_MS)[
+            0
+        ].tolist()
+    return stats
+
+
+class CommandTelemetry:
+    """
+    Latency and rate of the observation -> velocity command -> environment step loop.
+
+    The manager feeds it the publish time of every observation, the arrival of every
+    velocity command and of the CommandInfo that robots send with each command, and
+    calls record_step after each environment step. All times are wall-clock seconds.
+    """
+
+    def __init__(self, stale_after: float = 0.1):
+        self.stale_after = stale_after
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.start_time = time.time()
+            self.observation_times = []
+            self.velocity_times = {}
+            self.rows = []
+            # latest command info per robot: (sent, received, observation_tick, observation_stamp)
+            self._latest = {}
+            self._pending = {}
+            self._superseded = {}
+
+    def on_observation(self, published: float):
+        with self._lock:
+            self.observation_times.append(published)
+
+    def on_velocity(self, robot_id: int, received: float):
+        with self._lock:
+            self.velocity_times.setdefault(robot_id, []).append(received)
+
+    def on_command_info(
+        self,
+        robot_id: int,
+        sent: float,
+        observation_tick: int,
+        observation_stamp: float,
+        received: float,
+    ):
+        with self._lock:
+            if robot_id in self._pending:
+                self._superseded[robot_id] = self._superseded.get(robot_id, 0) + 1
+            info = (sent, received, observation_tick, observation_stamp)
+            self._pending[robot_id] = info
+            self._latest[robot_id] = info
+
+    def record_step(self, applied: float, tick: int):
+        """
+        Record the command each robot had applied in the step that just ran.
+        """
+        with self._lock:
+            for robot_id, info in self._latest.items():
+                sent, received, observation_tick, observation_stamp = info
+                fresh = robot_id in self._pending
+                obs_to_apply = applied - observation_stamp
+                self.rows.append(
+                    (
+                        applied,
+                        tick,
+                        robot_id,
+                        observation_tick,
+                        sent - observation_stamp,
+                        received - sent,
+                        applied - received,
+                        obs_to_apply,
+                        int(fresh),
+                        self._superseded.pop(robot_id, 0),
+                        int(obs_to_apply > self.stale_after),
+                    )
+                )
+            self._pending.clear()
+
+    def series(self) -> dict[str, np.ndarray]:
+        with self._lock:
+            rows = np.array(self.rows, dtype=float).reshape(-1, len(SERIES_COLUMNS))
+        return {column: rows[:, i] for i, column in enumerate(SERIES_COLUMNS)}
+
+    def summary(self) -> dict:
+        series = self.series()
+        with self._lock:
+            duration = time.time() - self.start_time
+            topics = {"/observation": _interval_stats(self.observation_times, duration)}
+            for robot_id, times in sorted(self.velocity_times.items()):
+                topics[f"/robot_{robot_id}/velocity"] = _interval_stats(times, duration)
+
+        fresh = series["fresh"] == 1
+        robots = {}
+        for robot_id in np.unique(series["robot_id"]).astype(int):
+            mask = series["robot_id"] == robot_id
+            robots[int(robot_id)] = {
+                "commands_applied": int(np.sum(fresh & mask)),
+                "superseded": int(np.sum(series["superseded"][mask])),
+                "reused_steps": int(np.sum(~fresh & mask)),
+                "stale_steps": int(np.sum(series["stale"][mask])),
+                "obs_to_apply": _latency_stats(series["obs_to_apply"][mask]),
+            }
+        return {
+            "duration": duration,
+            "stale_after": self.stale_after,
+            "interval_bins_ms": [float(edge) for edge in INTERVAL_BINS_MS],
+            "topics": topics,
+            "latency": {
+                name: _latency_stats(series[name][fresh])
+                for name in ("obs_to_cmd", "transport", "cmd_to_apply", "obs_to_apply")
+            },
+            "robots": robots,
+        }
+
+    def save(self, path_prefix: str) -> dict:
+        """
+        Save the time series as {path_prefix}_telemetry.npz and the summary as {path_prefix}_telemetry.json.
+        """
+        np.savez(f"{path_prefix}_telemetry.npz", **self.series())
+        summary = self.summary()
+        with open(f"{path_prefix}_telemetry.json", "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=4)
+        return summary
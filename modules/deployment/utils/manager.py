@@ -11,6 +11,7 @@ tort, or otherwise, arising from, out of, or in connection with the
 software or the use or other dealings in the software.
 """
 
+import threading
 import time
 import traceback
 from traceback import TracebackException
@@ -20,7 +21,7 @@ import geometry_msgs
 import numpy as np
 
 import rospy
-from code_llm.msg import Observations, ObjInfo
+from code_llm.msg import Observations, ObjInfo, CommandInfo
 from code_llm.srv import (
     GetTargetPositions,
     GetTargetPositionsResponse,
@@ -31,7 +32,8 @@ from code_llm.srv import (
     ConnectEntitiesRequest,
 )
 from geometry_msgs.msg import Twist, Vector3, Point
-from modules.deployment.utils.char_points_generate import validate_contour_points
+from modules.deployment.utils.char_points_generate import get_contour_cache
+from modules.deployment.utils.command_telemetry import CommandTelemetry
 
 
 class Manager:
@@ -59,6 +61,10 @@ class Manager:
                 queue_size=1,
             )
         rospy.Subscriber("/leader/velocity", Twist, self.leader_velocity_callback)
+        self.telemetry = CommandTelemetry()
+        rospy.Subscriber(
+            "/command_info", CommandInfo, self.command_info_callback, queue_size=100
+        )
 
         self._target_positions_service = rospy.Service(
             "/get_target_positions",
@@ -77,6 +83,23 @@ class Manager:
             robot.id: np.array([0, 0], dtype=float) for robot in self._robots
         }
 
+        # lockstep bookkeeping: robots that reported a command for the current tick
+        self._tick_condition = threading.Condition()
+        self._reported_robots = set()
+        self._dropped_robots = set()
+        # wall-clock time of the first command of each robot since the last reset
+        self._first_command_time = {}
+
+        # render the common shapes in the background, /get_char_points then answers from the cache
+        threading.Thread(target=self._warm_up_contours, daemon=True).start()
+
+    @staticmethod
+    def _warm_up_contours():
+        try:
+            get_contour_cache().warm_up()
+        except Exception as e:
+            print(f"Contour warm-up failed: {e}")
+
     def velocity_callback(self, data: geometry_msgs.msg.Twist, i):
         """
         velocity_callback is a callback function for the velocity topic.
@@ -96,9 +119,86 @@ class Manager:
             * self._max_speed
         )
         # print(f"Received velocity for robot {i}: {desired_velocity}")
-        self.robotID_velocity[i] = desired_velocity
+        self.telemetry.on_velocity(i, time.time())
+        with self._tick_condition:
+            self.robotID_velocity[i] = desired_velocity
+            self._reported_robots.add(i)
+            self._first_command_time.setdefault(i, time.time())
+            self._tick_condition.notify_all()
         # self.env.set_entity_velocity(i, desired_velocity)
 
+    def command_info_callback(self, msg: CommandInfo):
+        self.telemetry.on_command_info(
+            robot_id=msg.robot_id,
+            sent=msg.header.stamp.to_sec(),
+            observation_tick=msg.observation_tick,
+            observation_stamp=msg.observation_stamp.to_sec(),
+            received=time.time(),
+        )
+
+    def _all_reported(self) -> bool:
+        expected = set(self.robotID_velocity) - self._dropped_robots
+        return expected <= self._reported_robots
+
+    def has_reports(self) -> bool:
+        with self._tick_condition:
+            return len(self._reported_robots) > 0
+
+    def wait_for_commands(self, timeout: float) -> bool:
+        """
+        Block until every robot still taking part in lockstep has sent its command for the current tick.
+
+        Args:
+            timeout (float): Maximum wall-clock time to wait, in seconds.
+
+        Returns:
+            bool: True if all commands arrived, False on timeout.
+        """
+        with self._tick_condition:
+            return self._tick_condition.wait_for(self._all_reported, timeout=timeout)
+
+    def drop_unreported_robots(self) -> list:
+        """
+        Exclude robots that missed the current tick from lockstep, so a crashed or finished
+        controller does not stall the simulation. Their later commands are still applied.
+        """
+        with self._tick_condition:
+            missing = (
+                set(self.robotID_velocity)
+                - self._dropped_robots
+                - self._reported_robots
+            )
+            self._dropped_robots |= missing
+        return sorted(missing)
+
+    def next_tick(self):
+        """
+        Start collecting commands for the next tick. Must be called before the next observation is published.
+        """
+        with self._tick_condition:
+            self._reported_robots.clear()
+
+    def reset_lockstep(self):
+        with self._tick_condition:
+            self._reported_robots.clear()
+            self._dropped_robots.clear()
+            self._first_command_time.clear()
+
+    def first_command_times(self) -> dict:
+        """
+        Wall-clock time at which each robot sent its first command since the last reset.
+        """
+        with self._tick_condition:
+            return dict(self._first_command_time)
+
+    def all_robots_commanded(self) -> bool:
+        """
+        Whether every robot, apart from those dropped from lockstep, sent a command since the last reset.
+        """
+        with self._tick_condition:
+            expected = set(self.robotID_velocity) - self._dropped_robots
+            return expected <= set(self._first_command_time)
+
     def leader_velocity_callback(self, data: Twist):
         leader = self.env.get_entities_by_type("Leader")
         if len(leader) == 0:
@@ -111,12 +211,15 @@ class Manager:
         desired_velocity = np.array([data.linear.x, data.linear.y])
         self.env.set_entity_velocity(entity_id=leader.id, velocity=desired_velocity)
 
-    def publish_observations(self, obs=None):
+    def publish_observations(self, obs=None, tick: int = None):
         if obs:
             observation = obs
         else:
             observation = self.env.get_observation()
         observations_msg = Observations()
+        observations_msg.header.stamp = rospy.Time.now()
+        self.telemetry.on_observation(observations_msg.header.stamp.to_sec())
+        observations_msg.tick = self.env.time_step if tick is None else tick
         observations_msg.observations = []
         for entity_id, entity in observation.items():
             obj_info = ObjInfo()
@@ -155,8 +258,9 @@ class Manager:
 
     def get_char_points_callback(self, request):
         char = request.character
+        sampled_points = []
         try:
-            sampled_points = validate_contour_points(char)
+            sampled_points = get_contour_cache().get(char)
         except Exception as e:
             print(f"Error occurred: {e}")
             traceback.print_exc()
@@ -168,6 +272,7 @@ class Manager:
         return response
 
     def clear_velocity(self):
-        self.robotID_velocity = {
-            robot.id: np.array([0, 0], dtype=float) for robot in self._robots
-        }
+        with self._tick_condition:
+            self.robotID_velocity = {
+                robot.id: np.array([0, 0], dtype=float) for robot in self._robots
+            }
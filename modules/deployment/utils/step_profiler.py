@@ -0,0 +1,120 @@
+"""
+Copyright (c) 2024 WindyLab of Westlake University, China
+All rights reserved.
+
+This software is provided "as is" without warranty of any kind, either
+express or implied, including but not limited to the warranties of
+merchantability, fitness for a particular purpose, or non-infringement.
+In no event shall the authors or copyright holders be liable for any
+claim, damages, or other liability, whether in an action of contract,
+tort, or otherwise, arising from, out of, or in connection with the
+software or the use or other dealings in the software.
+"""
+
+import json
+import os
+import time
+from collections import deque
+
+import numpy as np
+
+STEP_PHASES = ["physics", "observation", "recording", "render", "publish", "total"]
+
+
+def _stats(durations) -> dict:
+    if len(durations) == 0:
+        return {}
+    durations = np.asarray(durations) * 1000.0
+    return {
+        "mean_ms": float(np.mean(durations)),
+        "p50_ms": float(np.percentile(durations, 50)),
+        "p95_ms": float(np.percentile(durations, 95)),
+        "max_ms": float(np.max(durations)),
+        "total_s": float(np.sum(durations) / 1000.0),
+    }
+
+
+class StepProfiler:
+    """
+    Wall-clock time of each phase of an environment step.
+
+    Callers time a phase with time.perf_counter() and pass the duration to record();
+    end_step() closes the step and counts it as an overrun if it took longer than the
+    step budget (1 / fps). Rolling statistics cover the last `window` steps and can be
+    written to a file while the experiment runs.
+    """
+
+    def __init__(self, budget: float, window: int = 500):
+        self.budget = budget
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self.durations = {phase: [] for phase in STEP_PHASES}
+        self.recent = {phase: deque(maxlen=self.window) for phase in STEP_PHASES}
+        # durations of the step in progress
+        self.current = {}
+        self.steps = 0
+        self.overruns = 0
+        self.late_starts = 0
+        self._last_flush = time.time()
+
+    def record(self, phase: str, duration: float):
+        self.current[phase] = duration
+        self.durations[phase].append(duration)
+        self.recent[phase].append(duration)
+
+    def end_step(self, total: float, lateness: float = 0.0):
+        """
+        Args:
+            total (float): Duration of the whole step in seconds.
+            lateness (float): How much later than scheduled the step started, in seconds.
+        """
+        self.record("total", total)
+        self.current = {}
+        self.steps += 1
+        if total > self.budget:
+            self.overruns += 1
+        if lateness > self.budget:
+            self.late_starts += 1
+
+    def rolling_stats(self) -> dict:
+        return {
+            "steps": self.steps,
+            "overruns": self.overruns,
+            "late_starts": self.late_starts,
+            "budget_ms": self.budget * 1000.0,
+            "phases": {phase: _stats(self.recent[phase]) for phase in STEP_PHASES},
+        }
+
+    def summary(self) -> dict:
+        return {
+            "steps": self.steps,
+            "overruns": self.overruns,
+            "overrun_ratio": self.overruns / self.steps if self.steps else 0.0,
+            "late_starts": self.late_starts,
+            "budget_ms": self.budget * 1000.0,
+            "phases": {phase: _stats(self.durations[phase]) for phase in STEP_PHASES},
+        }
+
+    def flush_rolling_stats(self, path: str, period: float = 1.0):
+        """
+        Overwrite path with the rolling statistics, at most once per period seconds.
+        """
+        now = time.time()
+        if now - self._last_flush < period:
+            return
+        self._last_flush = now
+        temporary_path = f"{path}.tmp"
+        try:
+            with open(temporary_path, "w", encoding="utf-8") as f:
+                json.dump(self.rolling_stats(), f, indent=4)
+            os.replace(temporary_path, path)
+        except OSError as e:
+            print(f"Failed to write step profile: {e}")
+
+    def save(self, path: str) -> dict:
+        summary = self.summary()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=4)
+        return summary
@@ -11,101 +11,80 @@ tort, or otherwise, arising from, out of, or in connection with the
 software or the use or other dealings in the software.
 """
 
+import sys
+import time
+
 import rospy
+from code_llm.msg import Observations, CommandInfo
 from geometry_msgs.msg import Twist
-import time
+
+from modules.deployment.utils.command_telemetry import CommandTelemetry
 
 
 class VelocityListener:
-    def __init__(self):
-        self.subscribers = []
-        self.start_time = None
-        self.total_time = 0.0
-        self.message_count = 0
-        self.topic_update_count = {}
-        self.all_topics_updated = False
+    """
+    Standalone monitor of a running experiment: prints the rate and jitter of the
+    observation and velocity topics and the command latencies every report_period
+    seconds. The simulation manager records the same statistics per experiment.
+    """
 
-        self.test_results = []
-        self.test_count = 10
+    def __init__(self, report_period: float = 5.0):
+        self.report_period = report_period
+        self.telemetry = CommandTelemetry()
 
         robot_start_index = rospy.get_param("robot_start_index")
         robot_end_index = rospy.get_param("robot_end_index")
         for i in range(robot_start_index, robot_end_index + 1):
-            topic_name = f"/robot_{i}/velocity"
-            self.topic_update_count[topic_name] = 0
             rospy.Subscriber(
-                topic_name, Twist, self.velocity_callback, callback_args=topic_name
+                f"/robot_{i}/velocity", Twist, self.velocity_callback, callback_args=i
             )
-
-    def velocity_callback(self, data: Twist, topic_name):
-        if self.start_time is None:
-            self.start_time = time.time()
-
-        self.message_count += 1
-        self.topic_update_count[topic_name] += 1
-
-        elapsed_time = time.time() - self.start_time
-        self.total_time += elapsed_time
-        self.start_time = time.time()
-
-        if (
-            all(count > 0 for count in self.topic_update_count.values())
-            and not self.all_topics_updated
-        ):
-            self.all_topics_updated = True
-            self.print_statistics_and_prepare_for_next_test()
-
-    def print_statistics_and_prepare_for_next_test(self):
-        sorted_topics = sorted(
-            self.topic_update_count.items(), key=lambda item: item[1], reverse=True
-        )
-        print(
-            f"Message count: {self.message_count}, Total time: {self.total_time:.4f} seconds"
+        rospy.Subscriber("/observation", Observations, self.observation_callback)
+        rospy.Subscriber(
+            "/command_info", CommandInfo, self.command_info_callback, queue_size=100
         )
-        for topic, count in sorted_topics:
-            print(f"{topic}: {count} messages")
 
-        self.test_results.append(self.total_time)
-        self.prepare_for_next_test()
-
-    def prepare_for_next_test(self):
-        # Reset the state for the next test
-        self.start_time = None
-        self.total_time = 0.0
-        self.message_count = 0
-        self.topic_update_count = {topic: 0 for topic in self.topic_update_count}
-        self.all_topics_updated = False
+    def velocity_callback(self, data: Twist, robot_id):
+        self.telemetry.on_velocity(robot_id, time.time())
+
+    def observation_callback(self, msg: Observations):
+        self.telemetry.on_observation(msg.header.stamp.to_sec())
+        # every observation marks a step of the environment
+        self.telemetry.record_step(time.time(), msg.tick)
+
+    def command_info_callback(self, msg: CommandInfo):
+        self.telemetry.on_command_info(
+            robot_id=msg.robot_id,
+            sent=msg.header.stamp.to_sec(),
+            observation_tick=msg.observation_tick,
+            observation_stamp=msg.observation_stamp.to_sec(),
+            received=time.time(),
+        )
 
-        if len(self.test_results) < self.test_count:
+    def print_statistics(self):
+        summary = self.telemetry.summary()
+        print(f"\nLast {summary['duration']:.1f}s:")
+        for topic, stats in summary["topics"].items():
             print(
-                f"Preparing for next test..., {len(self.test_results) + 1}/{self.test_count}"
+                f"{topic}: {stats['messages']} messages, {stats['rate']:.1f} Hz, "
+                f"interval {stats.get('interval_mean_ms', 0):.1f} "
+                f"+- {stats.get('interval_std_ms', 0):.1f} ms"
             )
-        else:
-            self.print_final_results()
-            rospy.signal_shutdown("All tests completed.")
+        for name, stats in summary["latency"].items():
+            if stats:
+                print(
+                    f"{name}: p50 {stats['p50'] * 1000:.1f} ms, "
+                    f"p95 {stats['p95'] * 1000:.1f} ms, max {stats['max'] * 1000:.1f} ms"
+                )
+        self.telemetry.reset()
 
     def start_tests(self):
-        while not rospy.is_shutdown() and len(self.test_results) < self.test_count:
-            self.start_time = None
-            self.total_time = 0.0
-            self.message_count = 0
-            self.all_topics_updated = False
-            rospy.sleep(1)  # Add a small delay between tests to avoid conflicts
-
-            rate = rospy.Rate(100)  # 10 Hz
-            while not rospy.is_shutdown() and not self.all_topics_updated:
-                rate.sleep()
-
-    def print_final_results(self):
-        print("\nTest results:")
-        for i, result in enumerate(self.test_results):
-            print(f"Test {i + 1}: {result:.4f} seconds")
-
-        average_time = sum(self.test_results) / len(self.test_results)
-        print(f"\nAverage time: {average_time:.4f} seconds")
+        while not rospy.is_shutdown():
+            rospy.sleep(self.report_period)
+            self.print_statistics()
 
 
 if __name__ == "__main__":
     rospy.init_node("velocity_listener", anonymous=True)
-    listener = VelocityListener()
+    period = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    listener = VelocityListener(report_period=period)
     listener.start_tests()
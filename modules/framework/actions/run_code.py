@@ -13,6 +13,7 @@ software or the use or other dealings in the software.
 
 import argparse
 import asyncio
+import json
 import os
 import subprocess
 import time
@@ -24,10 +25,41 @@ from modules.file import logger
 from modules.framework.action import ActionNode
 from modules.framework.code_error import Bug
 from modules.framework.context import WorkflowContext
-from modules.utils import root_manager, get_project_root, run_script, save_dict_to_json
+from modules.utils import (
+    root_manager,
+    get_project_root,
+    run_script,
+    save_dict_to_json,
+    task_scheduler,
+    RunnerPool,
+    close_runner_pools,
+)
 
 global run_args
 
+# wall-clock timeout of robot processes in lockstep mode, in units of the simulated duration
+LOCKSTEP_TIMEOUT_FACTOR = 10
+# robot scripts that can stay alive between runs, see serve() in execution_scripts/run.py
+WARM_RUNNER_SCRIPTS = ["run.py"]
+# the comparative modes copy run_cap.py, run_meta.py or run_llm2swarm.py to run.py in the
+# workspace, those scripts cannot serve
+COLD_RUNNER_TEST_MODES = ["cap", "meta", "llm2swarm"]
+# simulated ticks and wall-clock seconds of the headless smoke test before the full run
+SMOKE_TEST_TICKS = 300
+SMOKE_TEST_TIMEOUT = 10
+
+
+def process_limits(env) -> dict:
+    """
+    The resource limits of the generated-code processes, from "process_limits" of the env config,
+    as keyword arguments of run_script and RunnerPool.
+    """
+    limits = getattr(env, "process_limits", None) or {}
+    return {
+        "cpu_time_limit": limits.get("cpu_time"),
+        "rss_limit_mb": limits.get("rss_mb"),
+    }
+
 
 class RunAllocateRun(ActionNode):
     def __init__(self, next_text: str = "", node_name: str = "", env=None):
@@ -39,7 +71,6 @@ class RunAllocateRun(ActionNode):
         global run_args
 
         try:
-
             self.context.scoop = "global"
             self.call_times += 1
             if len(self.context.global_skill_tree.layers) == 0:
@@ -47,16 +78,15 @@ class RunAllocateRun(ActionNode):
                 result = "No task to run"
             else:
                 command = ["python", "allocate_run.py"]
-                self.env.start_environment(
-                    experiment_path=run_args.experiment_path
-                )
+                self.env.start_environment(experiment_path=run_args.experiment_path)
                 result = await run_script(
                     working_directory=root_manager.workspace_root,
                     command=command,
                     timeout=10,
+                    **process_limits(self.env),
                 )
         finally:
-            os.system("pgrep -f allocate_run.py | xargs kill -9")
+            # run_script kills the process group of allocate_run.py, not the other experiments'
             return self._process_response(result)
 
     def _process_response(self, result: str):
@@ -65,10 +95,9 @@ class RunAllocateRun(ActionNode):
         dict_result = {
             "run_times": self.call_times,
             "result": result,
-            'test_mode': run_args.test_mode,
+            "test_mode": run_args.test_mode,
         }
         try:
-
             self.env.stop_environment(save_result=False)
             if result == "NONE":
                 logger.log(content="Run allocate success", level="success")
@@ -76,7 +105,9 @@ class RunAllocateRun(ActionNode):
             if result == "No task to run":
                 return result
             else:
-                logger.log(content=f"Run allocate failed, result: {result}", level="error")
+                logger.log(
+                    content=f"Run allocate failed, result: {result}", level="error"
+                )
 
                 if self.call_times >= 3:
                     logger.log(
@@ -89,7 +120,9 @@ class RunAllocateRun(ActionNode):
                 if run_args.test_mode in ["debug", "full_version"]:
                     return Bug(
                         error_msg=result,
-                        error_code="\n\n".join(self.context.global_skill_tree.functions_body),
+                        error_code="\n\n".join(
+                            self.context.global_skill_tree.functions_body
+                        ),
                         error_function="",
                     )
 
@@ -98,8 +131,93 @@ class RunAllocateRun(ActionNode):
             logger.log(content=f"Exception occurred: {e}", level="error")
         finally:
             save_dict_to_json(
-                dict_result, root_manager.workspace_root / f"{run_args.test_mode}_global_run.json"
+                dict_result,
+                root_manager.workspace_root / f"{run_args.test_mode}_global_run.json",
+            )
+
+
+class SmokeTestCode(ActionNode):
+    """
+    Run the generated skills headless for a few hundred ticks against an in-process fake of
+    apis.py and global_apis.py, see execution_scripts/run_smoke.py. Crashes are found in about a
+    second, before the simulation and the robot processes are started. In the debug modes the
+    traceback goes to DebugError; in the other modes it is only logged and the full run decides.
+    """
+
+    def __init__(self, next_text: str = "", node_name: str = "", env=None):
+        self.call_times = 0
+        self.env = env
+        super().__init__(next_text, node_name)
+
+    async def _run(self):
+        global run_args
+
+        self.call_times += 1
+        workspace_root = root_manager.workspace_root
+        world_file = os.path.join(workspace_root, "smoke_test_world.json")
+        report_file = os.path.join(workspace_root, "smoke_test.json")
+        save_dict_to_json(self.env.smoke_test_world(), world_file)
+        if os.path.exists(report_file):
+            os.remove(report_file)
+        command = [
+            "python",
+            os.path.join(
+                root_manager.project_root,
+                "modules/deployment/execution_scripts/run_smoke.py",
+            ),
+            world_file,
+            "--ticks",
+            str(SMOKE_TEST_TICKS),
+        ]
+        if len(self.context.global_skill_tree.layers) > 0:
+            command.append("--global")
+        result = await run_script(
+            working_directory=workspace_root,
+            command=command,
+            print_output=False,
+            timeout=SMOKE_TEST_TIMEOUT,
+            **process_limits(self.env),
+        )
+        report = {"status": "timeout", "scope": None, "error": None}
+        if os.path.exists(report_file):
+            with open(report_file, "r") as f:
+                report = json.load(f)
+        elif result != "Timeout":
+            # the harness itself failed, e.g. on a world it does not handle
+            report["status"] = "error"
+            report["error"] = result
+        return self._process_response(report)
+
+    def _process_response(self, report: dict):
+        global run_args
+
+        save_dict_to_json(
+            {"run_times": self.call_times, "test_mode": run_args.test_mode, **report},
+            root_manager.workspace_root / f"{run_args.test_mode}_smoke_test.json",
+        )
+        if report["status"] != "failed":
+            logger.log(
+                content=f"Smoke test {report['status']}",
+                level="success" if report["status"] == "passed" else "warning",
             )
+            return "NONE"
+        logger.log(
+            content=f"Smoke test failed in the {report['scope']} skill:\n{report['error']}",
+            level="error",
+        )
+        if run_args.test_mode not in ["debug", "full_version"] or self.call_times >= 3:
+            return "NONE"
+        self.context.scoop = report["scope"]
+        skill_tree = (
+            self.context.global_skill_tree
+            if report["scope"] == "global"
+            else self.context.local_skill_tree
+        )
+        return Bug(
+            error_msg=report["error"],
+            error_code="\n\n".join(skill_tree.functions_body),
+            error_function="",
+        )
 
 
 class RunCodeReal(ActionNode):
@@ -114,10 +232,10 @@ class RunCodeReal(ActionNode):
 
     def setup(self, stage: int, path: str):
         self.stage = f"{stage}"
-        colon_index = path.find('workspace/')
+        colon_index = path.find("workspace/")
 
         if colon_index != -1:
-            substring = path[colon_index + len('workspace/'):]
+            substring = path[colon_index + len("workspace/") :]
             print(substring)
             self.path = substring
 
@@ -125,14 +243,14 @@ class RunCodeReal(ActionNode):
         global run_args
 
         # 构造 docker-compose.yml 的路径
-        compose_file_path = os.path.join(root_manager.project_root, "docker/docker-compose.yml")
+        compose_file_path = os.path.join(
+            root_manager.project_root, "docker/docker-compose.yml"
+        )
 
         os.environ["DATA_PATH"] = self.path
         os.environ["STAGE"] = self.stage
         if self.stage == "1":
-            self.env.start_environment(
-                experiment_path=run_args.experiment_path
-            )
+            self.env.start_environment(experiment_path=run_args.experiment_path)
         working_directory = os.path.join(root_manager.project_root, "docker")
         command = ["docker-compose", "up", "deploy"]
         env = os.environ.copy()
@@ -145,9 +263,7 @@ class RunCodeReal(ActionNode):
         )
         if self.stage == "1":
             time.sleep(run_args.timeout)
-            self.env.stop_environment(
-                file_name='real', save_result=True
-            )
+            self.env.stop_environment(file_name="real", save_result=True)
         logger.log(content=result, level="info")
         return result
 
@@ -161,14 +277,21 @@ class RunCode(ActionNode):
 
         self.start_id = None
         self.end_id = None
+        self.timeout = None
         self.task = None
+        self.limits = {}
+        # pid, cpu_time, max_rss_mb, wall_time and returncode of the robot process, filled by run_script
+        self.process_stats = {}
 
     def _build_prompt(self):
         pass
 
-    def setup(self, start: int, end: int):
+    def setup(self, start: int, end: int, timeout: float = None, limits: dict = None):
         self.start_id = start
         self.end_id = end
+        self.timeout = timeout
+        self.limits = limits or {}
+        self.process_stats = {"robots": list(range(start, end + 1))}
 
     async def run(self, auto_next: bool = True) -> str:
         global run_args
@@ -178,7 +301,9 @@ class RunCode(ActionNode):
         result = await run_script(
             working_directory=root_manager.workspace_root,
             command=command,
-            timeout=run_args.timeout,
+            timeout=self.timeout or run_args.timeout,
+            process_stats=self.process_stats,
+            **self.limits,
         )
         return result
 
@@ -190,10 +315,17 @@ class RunCodeAsync(ActionNode):
     from run.auto_runner.core import EnvironmentManager
 
     def __init__(
-            self, next_text: str = "", node_name: str = "", env: EnvironmentManager = None
+        self, next_text: str = "", node_name: str = "", env: EnvironmentManager = None
     ):
         self.call_times = 0
         self.env = env
+        # shared by the experiments of the task, so later runs are sized from the measured
+        # CPU cost
+        self.scheduler = task_scheduler(
+            os.path.dirname(os.path.normpath(str(run_args.experiment_path)))
+        )
+        self.worker_report = []
+        self.runner_pool = RunnerPool(**process_limits(env))
         super().__init__(next_text, node_name)
 
     async def _run(self):
@@ -201,19 +333,17 @@ class RunCodeAsync(ActionNode):
         self.context.scoop = "local"
         start_idx = rospy.get_param("robot_start_index")
         end_idx = rospy.get_param("robot_end_index")
-        total_robots = end_idx - start_idx + 1
-        num_processes = min(10, total_robots)  # 并行进程数
-        robots_per_process = total_robots // num_processes
-
         robot_ids = list(range(start_idx, end_idx + 1))
-        robot_id_chunks = [
-            robot_ids[i: i + robots_per_process]
-            for i in range(0, total_robots, robots_per_process)
-        ]
+        robot_id_chunks = self.scheduler.allocate(robot_ids)
+        workers = []
         tasks = []
         result_list = []
+        warm = (
+            run_args.script in WARM_RUNNER_SCRIPTS
+            and run_args.test_mode not in COLD_RUNNER_TEST_MODES
+        )
         try:
-            if run_args.test_mode in ["cap", 'llm2swarm', 'meta']:
+            if run_args.test_mode in ["cap", "llm2swarm", "meta"]:
                 keep_entities = False
             else:
                 if len(self.context.global_skill_tree.layers) == 0:
@@ -221,32 +351,88 @@ class RunCodeAsync(ActionNode):
                 else:
                     keep_entities = True
             self.env.start_environment(
-                experiment_path=root_manager.workspace_root, keep_entities=keep_entities
+                experiment_path=root_manager.workspace_root,
+                keep_entities=keep_entities,
+                duration=run_args.timeout,
+            )
+            # on the simulated clock the wall time is only a safety net for hanging code
+            timeout = (
+                run_args.timeout * LOCKSTEP_TIMEOUT_FACTOR
+                if self.env.lockstep
+                else run_args.timeout
             )
-            for chunk in robot_id_chunks:
-                action = RunCode()
-                action.setup(chunk[0], chunk[-1])
-                task = asyncio.create_task(action.run())
-                tasks.append(task)
-            result_list = list(set(await asyncio.gather(*tasks)))
+            if warm:
+                self.runner_pool.start(root_manager.workspace_root, robot_id_chunks)
+                workers = self.runner_pool.workers
+                tasks = [
+                    asyncio.create_task(worker.run_trial(timeout)) for worker in workers
+                ]
+            else:
+                for chunk in robot_id_chunks:
+                    action = RunCode()
+                    action.setup(
+                        chunk[0],
+                        chunk[-1],
+                        timeout=timeout,
+                        limits=process_limits(self.env),
+                    )
+                    workers.append(action)
+                    tasks.append(asyncio.create_task(action.run()))
+            if self.env.lockstep or self.env.oracle is not None:
+                result_list = list(set(await self._gather_lockstep(tasks)))
+            else:
+                result_list = list(set(await asyncio.gather(*tasks)))
         except Exception as e:
             print("Error in RunCodeAsync: ", e)
         finally:
-            os.system(f"pgrep -f run.py | xargs kill -9")
+            # the process group of each RunCode is killed by run_script when it ends or is cancelled
+            self._record_workers(workers)
             return self._process_response(result_list)
 
+    def _record_workers(self, workers: list):
+        self.worker_report = self.scheduler.record(
+            [worker.process_stats for worker in workers]
+        )
+        for worker in self.worker_report:
+            if worker["utilization"] is None:
+                continue
+            logger.log(
+                content=f"Robots {worker['robots'][0]}-{worker['robots'][-1]}: "
+                f"cpu {worker['cpu_time']:.2f}s / wall {worker['wall_time']:.2f}s "
+                f"({worker['utilization']:.0%}), rss {worker['max_rss_mb'] or 0:.0f} MB",
+                level="info",
+            )
+
+    async def _gather_lockstep(self, tasks: list) -> list:
+        """
+        Wait for the robot processes until the lockstep simulation reaches the end of the
+        experiment, or the early termination oracle stops it, then stop the ones still running.
+        Those count as "Timeout", the same result a full-length run gets in real-time mode.
+        """
+        pending = set(tasks)
+        while pending and not self.env.finished():
+            _, pending = await asyncio.wait(pending, timeout=0.05)
+        for task in pending:
+            task.cancel()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        return [result if isinstance(result, str) else "Timeout" for result in results]
+
     def _process_response(self, result: list):
         global run_args
         dict_result = {
             "run_times": self.call_times,
             "result": result,
-            'test_mode': run_args.test_mode,
+            "test_mode": run_args.test_mode,
+            "workers": self.worker_report,
         }
         try:
             if run_args.test_mode not in ["full_version"]:
                 self._next = None
-            self.context.save_to_file(root_manager.workspace_root / f"{run_args.test_mode}.pkl")
+            self.context.save_to_file(
+                root_manager.workspace_root / f"{run_args.test_mode}.pkl"
+            )
             self.env.stop_environment(file_name=run_args.test_mode)
+            dict_result["time_to_first_command"] = self.env.startup_report
 
             if all(item in ["NONE", "Timeout"] for item in result):
                 logger.log(content="Run code success", level="success")
@@ -268,7 +454,9 @@ class RunCodeAsync(ActionNode):
             if run_args.test_mode in ["debug", "full_version"]:
                 return Bug(
                     error_msg=result_content,
-                    error_code="\n\n".join(self.context.local_skill_tree.functions_body),
+                    error_code="\n\n".join(
+                        self.context.local_skill_tree.functions_body
+                    ),
                     error_function="",
                 )
 
@@ -276,8 +464,10 @@ class RunCodeAsync(ActionNode):
             logger.log(content=f"Exception occurred: {e}", level="error")
 
         finally:
-            save_dict_to_json(dict_result,
-                              root_manager.workspace_root / f"{run_args.test_mode}_local_run.json")
+            save_dict_to_json(
+                dict_result,
+                root_manager.workspace_root / f"{run_args.test_mode}_local_run.json",
+            )
 
         # else:
         #     logger.log(content=f"Run code failed 3 times or VLM is enabled_{self.context.vlm},", level="error")
@@ -288,17 +478,19 @@ def init_workflow(run_args, env=None) -> ActionNode:
     from modules.framework.handler import BugLevelHandler
     from modules.framework.handler import FeedbackHandler
     from modules.framework.actions import DebugError, CodeImprove, VideoCriticize
+
     init_result = {
         "target_pkl": None,
         "feedback": None,
-        'test_mode': None,
-        'first_action': None,
-        'error': None,
+        "test_mode": None,
+        "first_action": None,
+        "error": None,
     }
     try:
         # context = WorkflowContext()
         debug_code = DebugError()
         code_improver = CodeImprove("feedback")
+        smoke_test = SmokeTestCode("smoke test", env=env)
         run_allocate = RunAllocateRun("run allocate", env=env)
         run_code = RunCodeAsync("run code", env=env)
         copy_file = RunCodeReal(env=env)
@@ -308,7 +500,7 @@ def init_workflow(run_args, env=None) -> ActionNode:
         stop_docker = RunCodeReal(env=env)
         stop_docker.setup(stage=2, path=run_args.experiment_path)
         video_critic = VideoCriticize("")
-        if run_args.test_mode == 'real':
+        if run_args.test_mode == "real":
             run_allocate._next = copy_file
             # copy_file._next = run_code
             # stop_docker._next = run_real
@@ -316,74 +508,82 @@ def init_workflow(run_args, env=None) -> ActionNode:
             # run_real._next = stop_docker
         else:
             run_allocate._next = run_code
+        # the real robots run the code as it is, the simulated runs are smoke tested first
+        first_run = run_allocate if run_args.test_mode == "real" else smoke_test
+        smoke_test._next = run_allocate
 
         bug_handler = BugLevelHandler()
         bug_handler.next_action = debug_code
-        debug_code._next = run_allocate
+        debug_code._next = first_run
 
         hf_handler = FeedbackHandler()
         hf_handler.next_action = code_improver
-        code_improver._next = run_allocate
+        code_improver._next = first_run
 
         # link error handlers
         chain_of_handler = bug_handler
         bug_handler.successor = hf_handler
+        smoke_test.error_handler = chain_of_handler
         run_allocate.error_handler = chain_of_handler
         run_code.error_handler = chain_of_handler
         if run_args.feedback != "None":
             run_code._next = video_critic
             video_critic.error_handler = chain_of_handler
         target_pkl = None
-        if run_args.test_mode == 'improve':
-            if os.path.exists(run_args.experiment_path + "/" + 'debug.pkl'):
-                target_pkl = 'RunCodeAsync.pkl'
+        if run_args.test_mode == "improve":
+            if os.path.exists(run_args.experiment_path + "/" + "debug.pkl"):
+                target_pkl = "RunCodeAsync.pkl"
             else:
-                target_pkl = 'WriteRun.pkl'
+                target_pkl = "WriteRun.pkl"
 
-
-        elif run_args.test_mode in ['wo_vlm', 'full_version', 'debug', 'real']:
-            target_pkl = 'WriteRun.pkl'
-        elif run_args.test_mode in ['cap', 'meta', "llm2swarm"]:
+        elif run_args.test_mode in ["wo_vlm", "full_version", "debug", "real"]:
+            target_pkl = "WriteRun.pkl"
+        elif run_args.test_mode in ["cap", "meta", "llm2swarm"]:
             target_pkl = None
         if target_pkl:
-            context = WorkflowContext.load_from_file(run_args.experiment_path + "/" + target_pkl)
-            if run_args.test_mode != 'real':
+            context = WorkflowContext.load_from_file(
+                run_args.experiment_path + "/" + target_pkl
+            )
+            if run_args.test_mode != "real":
                 context.global_skill_tree.save_functions_to_file()
                 context.local_skill_tree.save_functions_to_file()
             context.args = run_args
-        init_result['target_pkl'] = run_args.target_pkl
-        init_result['feedback'] = run_args.feedback
-        init_result['test_mode'] = run_args.test_mode
+        init_result["target_pkl"] = run_args.target_pkl
+        init_result["feedback"] = run_args.feedback
+        init_result["test_mode"] = run_args.test_mode
 
-        if run_args.test_mode in ['cap', 'meta', "llm2swarm"]:
-            init_result['first_action'] = 'RunCode'
+        if run_args.test_mode in ["cap", "meta", "llm2swarm"]:
+            init_result["first_action"] = "RunCode"
             return run_code
         if run_args.test_mode == "vlm":
-            init_result['first_action'] = 'VideoCriticize'
+            init_result["first_action"] = "VideoCriticize"
             return video_critic
-        init_result['first_action'] = 'RunAllocateRun'
+        init_result["first_action"] = str(first_run)
 
         if run_args.test_mode == "improve":
             return code_improver
-        return run_allocate
+        return first_run
     except Exception as e:
         print(f"Error in init_workflow: {e}")
-        init_result['error'] = traceback.format_exc()
+        init_result["error"] = traceback.format_exc()
 
     finally:
-        save_dict_to_json(init_result, root_manager.workspace_root / f"{run_args.test_mode}_init_run.json")
+        save_dict_to_json(
+            init_result,
+            root_manager.workspace_root / f"{run_args.test_mode}_init_run.json",
+        )
 
 
 def runcode(
-        timeout=20,
-        feedback="None",
-        experiment_path="clustering/2024-10-21_03-04-33",
-        target_pkl="WriteRun.pkl",
-        script="run.py",
-        human_feedback=False,
-        env_manager=None,
-        debug=False,
-        test_mode="wo_vlm",
+    timeout=20,
+    feedback="None",
+    experiment_path="clustering/2024-10-21_03-04-33",
+    target_pkl="WriteRun.pkl",
+    script="run.py",
+    human_feedback=False,
+    env_manager=None,
+    debug=False,
+    test_mode="wo_vlm",
 ):
     """
     Run the simulation with custom parameters (synchronously).
@@ -459,7 +659,10 @@ def runcode(
     first_action = init_workflow(run_args, env=env_manager)
     if first_action is not None:
         # 使用 asyncio.run() 来运行异步的 first_action.run()
-        result = asyncio.run(first_action.run())
+        try:
+            result = asyncio.run(first_action.run())
+        finally:
+            close_runner_pools()
         return result
     return None
     # 保存执行结果
@@ -13,11 +13,24 @@ software or the use or other dealings in the software.
 
 from .code_analyzer import CodeAnalyzer
 from .logger import setup_logger, LoggerLevel
-from .media import generate_video_from_frames, process_video, create_video_from_frames
+from .media import (
+    generate_video_from_frames,
+    process_video,
+    create_video_from_frames,
+    VideoStreamWriter,
+)
 from .root import get_project_root, root_manager
 from .run_scripts import run_script
 from .save_json import save_dict_to_json
 from .rich_print import rich_print, rich_code_print
+from .worker_scheduler import WorkerScheduler, split_evenly, task_scheduler
+from .runner_pool import RunnerPool, close_runner_pools
+from .process_group import ProcessSupervisor, kill_process_group
+from .assignment import (
+    optimal_assignment,
+    batch_assignment,
+    batch_procrustes_disparity,
+)
 
 __all__ = [
     "CodeAnalyzer",
@@ -26,10 +39,21 @@ __all__ = [
     "generate_video_from_frames",
     "process_video",
     "create_video_from_frames",
+    "VideoStreamWriter",
     "get_project_root",
     "root_manager",
     "run_script",
     "save_dict_to_json",
     "rich_print",
     "rich_code_print",
+    "WorkerScheduler",
+    "split_evenly",
+    "task_scheduler",
+    "RunnerPool",
+    "close_runner_pools",
+    "ProcessSupervisor",
+    "kill_process_group",
+    "optimal_assignment",
+    "batch_assignment",
+    "batch_procrustes_disparity",
 ]
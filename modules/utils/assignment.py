@@ -0,0 +1,89 @@
+"""
+Copyright (c) 2024 WindyLab of Westlake University, China
+All rights reserved.
+
+This software is provided "as is" without warranty of any kind, either
+express or implied, including but not limited to the warranties of
+merchantability, fitness for a particular purpose, or non-infringement.
+In no event shall the authors or copyright holders be liable for any
+claim, damages, or other liability, whether in an action of contract,
+tort, or otherwise, arising from, out of, or in connection with the
+software or the use or other dealings in the software.
+"""
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+
+def assignment_costs(positions: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    """
+    Euclidean distances between positions and targets.
+
+    :param positions: (..., N, 2) positions, e.g. (T, N, 2) for a whole run.
+    :param targets: (M, 2) targets, or (..., M, 2) with the leading shape of positions.
+    :return: (..., N, M) distances.
+    """
+    positions = np.asarray(positions, dtype=float)
+    targets = np.asarray(targets, dtype=float)
+    return np.linalg.norm(
+        positions[..., :, None, :] - targets[..., None, :, :], axis=-1
+    )
+
+
+def optimal_assignment(positions, targets) -> np.ndarray:
+    """
+    Assign every position a distinct target so that the summed distance is minimal.
+
+    :param positions: (N, 2) positions, e.g. of the robots.
+    :param targets: (M, 2) targets with M >= N.
+    :return: (N,) index of the target of each position.
+    """
+    costs = assignment_costs(positions, targets)
+    rows, columns = linear_sum_assignment(costs)
+    assignment = np.empty(len(costs), dtype=int)
+    assignment[rows] = columns
+    return assignment
+
+
+def batch_assignment(positions, targets) -> np.ndarray:
+    """
+    optimal_assignment for every time step of a run. The costs of all time steps are
+    computed in one vectorized call and each step is solved with linear_sum_assignment.
+
+    :param positions: (T, N, 2) positions, or (N, 2) shared by all steps.
+    :param targets: (M, 2) targets shared by all steps, or (T, M, 2).
+    :return: (T, N) index of the target of each position at each step.
+    """
+    costs = assignment_costs(positions, targets)
+    assignments = np.empty(costs.shape[:2], dtype=int)
+    for step, step_costs in enumerate(costs):
+        rows, columns = linear_sum_assignment(step_costs)
+        assignments[step, rows] = columns
+    return assignments
+
+
+def _standardize(shapes: np.ndarray) -> np.ndarray:
+    centered = shapes - shapes.mean(axis=-2, keepdims=True)
+    norms = np.linalg.norm(centered, axis=(-2, -1), keepdims=True)
+    if np.any(norms == 0):
+        raise ValueError("Input matrices must contain >1 unique points")
+    return centered / norms
+
+
+def batch_procrustes_disparity(shapes, target) -> np.ndarray:
+    """
+    The disparity of scipy.spatial.procrustes(target, shape) for a batch of shapes.
+
+    Both shapes are centered and scaled to unit norm, the remaining disparity after the best
+    rotation and scaling is 1 - (sum of the singular values of target^T shape)^2.
+
+    :param shapes: (T, N, 2) point sets, each in the order of the target points.
+    :param target: (N, 2) target points, or (T, N, 2).
+    :return: (T,) disparities in [0, 1].
+    """
+    shapes = _standardize(np.asarray(shapes, dtype=float))
+    target = _standardize(np.asarray(target, dtype=float))
+    singular_values = np.linalg.svd(
+        np.swapaxes(target, -1, -2) @ shapes, compute_uv=False
+    )
+    return np.clip(1 - singular_values.sum(axis=-1) ** 2, 0, None)
@@ -12,7 +12,9 @@ software or the use or other dealings in the software.
 """
 
 import os
+import queue
 import re
+import threading
 import cv2
 import base64
 
@@ -118,6 +120,101 @@ def create_video_from_frames(base64Frames, output_path, fps=30):
     video_writer.release()
 
 
+class VideoStreamWriter:
+    """
+    Encode RGB frames to MP4 in a background thread while they are produced.
+
+    Frames go through a bounded queue, so memory stays flat; when the encoder falls behind,
+    write() blocks instead of buffering. Only every frame_interval-th frame is kept (the
+    video fps is divided accordingly) and frames are resized by scale before encoding.
+    """
+
+    def __init__(
+        self,
+        path,
+        fps: float,
+        frame_interval: int = 1,
+        scale: float = 1.0,
+        queue_size: int = 64,
+    ):
+        self.path = path
+        self.frame_interval = max(1, int(frame_interval))
+        self.fps = fps / self.frame_interval
+        self.scale = scale
+        self.frames_written = 0
+        self._frame_index = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._error = None
+        self._thread = threading.Thread(target=self._encode, daemon=True)
+        self._thread.start()
+
+    def wants_frame(self) -> bool:
+        """
+        Whether the next frame will be kept; callers can skip rendering the others.
+        """
+        return self._frame_index % self.frame_interval == 0
+
+    def write(self, frame: np.ndarray):
+        keep = self.wants_frame()
+        self._frame_index += 1
+        if keep and frame is not None:
+            self._queue.put(frame)
+
+    def skip(self):
+        """
+        Count a frame that was not rendered because wants_frame() returned False.
+        """
+        self._frame_index += 1
+
+    def _encode(self):
+        writer = None
+        try:
+            while True:
+                frame = self._queue.get()
+                if frame is None:
+                    break
+                if self.scale != 1.0:
+                    frame = cv2.resize(
+                        frame,
+                        None,
+                        fx=self.scale,
+                        fy=self.scale,
+                        interpolation=cv2.INTER_AREA,
+                    )
+                if writer is None:
+                    height, width = frame.shape[:2]
+                    writer = cv2.VideoWriter(
+                        str(self.path),
+                        cv2.VideoWriter_fourcc(*"mp4v"),
+                        self.fps,
+                        (width, height),
+                    )
+                writer.write(cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+                self.frames_written += 1
+        except Exception as e:
+            self._error = e
+            # keep draining so that producers never block on a dead encoder
+            while self._queue.get() is not None:
+                pass
+        finally:
+            if writer is not None:
+                writer.release()
+
+    def close(self) -> int:
+        """
+        Flush the queued frames and finish the file.
+
+        Returns:
+            int: The number of frames written.
+        """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if self._error is not None:
+            raise RuntimeError(f"Video encoding failed: {self._error}") from self._error
+        return self.frames_written
+
+
 if __name__ == "__main__":
     generate_video_from_frames(
         "/home/derrick/catkin_ws/src/code_llm/workspace/2024-06-24_06-02-10_搬运/data/frames/frame15",
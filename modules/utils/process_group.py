@@ -0,0 +1,148 @@
+"""
+Copyright (c) 2024 WindyLab of Westlake University, China
+All rights reserved.
+
+This software is provided "as is" without warranty of any kind, either
+express or implied, including but not limited to the warranties of
+merchantability, fitness for a particular purpose, or non-infringement.
+In no event shall the authors or copyright holders be liable for any
+claim, damages, or other liability, whether in an action of contract,
+tort, or otherwise, arising from, out of, or in connection with the
+software or the use or other dealings in the software.
+"""
+
+import os
+import signal
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def kill_process_group(pgid: int, sig: int = signal.SIGKILL) -> bool:
+    """
+    Signal a process started with start_new_session=True together with everything it spawned.
+
+    Unlike `pgrep -f <script> | xargs kill -9`, this only reaches the processes of one
+    experiment, so the other experiments running on the machine are not affected. The caller
+    still waits for its own child to reap it.
+
+    Returns:
+        bool: False if the group had already exited.
+    """
+    try:
+        os.killpg(pgid, sig)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def read_group_usage(pgid: int) -> dict[int, tuple[float, int]]:
+    """
+    Read the CPU time (user + system, in seconds) and the resident memory (in bytes) of every
+    process of a process group from /proc.
+
+    Returns:
+        dict[int, tuple[float, int]]: (cpu_time, rss) by pid, empty if /proc is not available.
+    """
+    usage = {}
+    try:
+        pids = [int(entry) for entry in os.listdir("/proc") if entry.isdigit()]
+    except OSError:
+        return usage
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat", "r") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # the command name may contain spaces, fields after it are space separated
+        fields = stat[stat.rindex(")") + 2 :].split()
+        if int(fields[2]) != pgid:
+            continue
+        cpu_time = (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+        usage[pid] = (cpu_time, int(fields[21]) * _PAGE_SIZE)
+    return usage
+
+
+class ProcessSupervisor:
+    """
+    Resource accounting and limits for the process group of a generated-code process, started
+    with start_new_session=True.
+
+    sample() is called periodically while the process runs. It adds up the CPU time of every
+    process of the group, including the ones that exited since the first sample, tracks the
+    peak resident memory of the group, and kills the whole group as soon as a limit is
+    exceeded. Limits are checked by sampling rather than setrlimit, which would need a
+    preexec_fn in the threaded ROS process and only bounds each process on its own.
+    """
+
+    def __init__(
+        self, pid: int, cpu_time_limit: float = None, rss_limit_mb: float = None
+    ):
+        """
+        Args:
+            pid (int): The pid of the group leader, which is also the process group id.
+            cpu_time_limit (float): CPU seconds the group may use in total, None for no limit.
+            rss_limit_mb (float): Resident memory the group may hold at once, None for no limit.
+        """
+        self.pgid = pid
+        self.cpu_time_limit = cpu_time_limit
+        self.rss_limit_mb = rss_limit_mb
+        self._cpu_times = {}
+        self._baseline = {}
+        self.max_rss_mb = 0.0
+        self.limit_exceeded = None
+
+    @property
+    def cpu_time(self) -> float | None:
+        if not self._cpu_times:
+            return None
+        return sum(
+            cpu_time - self._baseline.get(pid, 0.0)
+            for pid, cpu_time in self._cpu_times.items()
+        )
+
+    def reset(self):
+        """
+        Start the accounting and the limits over for a process that runs several trials.
+        """
+        self._update()
+        self._baseline = dict(self._cpu_times)
+        self.max_rss_mb = 0.0
+        self.limit_exceeded = None
+
+    def _update(self) -> float:
+        usage = read_group_usage(self.pgid)
+        for pid, (cpu_time, _) in usage.items():
+            self._cpu_times[pid] = max(cpu_time, self._cpu_times.get(pid, 0.0))
+        rss_mb = sum(rss for _, rss in usage.values()) / 2**20
+        self.max_rss_mb = max(self.max_rss_mb, rss_mb)
+        return rss_mb
+
+    def sample(self) -> str | None:
+        """
+        Update the resource usage of the group and enforce the limits.
+
+        Returns:
+            str | None: The limit that was exceeded, after killing the group, or None.
+        """
+        rss_mb = self._update()
+        if self.limit_exceeded is None:
+            cpu_time = self.cpu_time or 0.0
+            if self.cpu_time_limit is not None and cpu_time > self.cpu_time_limit:
+                self.limit_exceeded = f"CPU time limit exceeded: {cpu_time:.1f}s > {self.cpu_time_limit:.1f}s"
+            elif self.rss_limit_mb is not None and rss_mb > self.rss_limit_mb:
+                self.limit_exceeded = f"Memory limit exceeded: {rss_mb:.0f} MB > {self.rss_limit_mb:.0f} MB"
+            if self.limit_exceeded is not None:
+                self.kill()
+        return self.limit_exceeded
+
+    def kill(self) -> bool:
+        return kill_process_group(self.pgid)
+
+    def report(self) -> dict:
+        return {
+            "cpu_time": self.cpu_time,
+            "max_rss_mb": self.max_rss_mb,
+            "limit_exceeded": self.limit_exceeded,
+        }
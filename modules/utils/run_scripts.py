@@ -1,6 +1,9 @@
 import asyncio
 import os
 import sys
+import time
+
+from modules.utils.process_group import ProcessSupervisor, kill_process_group
 
 
 async def run_script(
@@ -9,7 +12,20 @@ async def run_script(
     print_output=True,
     timeout=30,
     env=None,
+    process_stats: dict = None,
+    cpu_time_limit: float = None,
+    rss_limit_mb: float = None,
 ) -> str:
+    """
+    Run a command and return its stderr, "NONE" if it is empty, "Timeout", or the resource
+    limit it exceeded.
+
+    The process runs in its own process group, supervised by a ProcessSupervisor: the group is
+    killed as a whole when it is stopped or uses more than cpu_time_limit CPU seconds or
+    rss_limit_mb of resident memory.
+    If process_stats is given, it is filled with the pid, the wall time, the CPU time and peak
+    memory of the group, the return code and the exceeded limit, if any.
+    """
     from modules.file import logger
 
     working_directory = str(working_directory)
@@ -21,8 +37,34 @@ async def run_script(
         stdout=asyncio.subprocess.PIPE,
         stderr=asyncio.subprocess.PIPE,
         env=env,
+        start_new_session=True,
+    )
+    start_time = time.time()
+    supervisor = ProcessSupervisor(
+        process.pid, cpu_time_limit=cpu_time_limit, rss_limit_mb=rss_limit_mb
     )
+    if process_stats is not None:
+        process_stats.update(
+            pid=process.pid, wall_time=0.0, returncode=None, **supervisor.report()
+        )
 
+    def update_stats():
+        if process_stats is not None:
+            process_stats.update(
+                wall_time=time.time() - start_time,
+                returncode=process.returncode,
+                **supervisor.report(),
+            )
+
+    async def supervise():
+        # the last sample before the process exits is its total CPU time
+        while process.returncode is None:
+            if supervisor.sample() is not None:
+                logger.log(content=supervisor.limit_exceeded, level="error")
+            update_stats()
+            await asyncio.sleep(0.5)
+
+    sampler = asyncio.create_task(supervise())
     stdout_chunks, stderr_chunks = [], []
 
     async def read_stream(stream, accumulate, is_stdout=True):
@@ -49,6 +91,9 @@ async def run_script(
             ),
             timeout=timeout,
         )
+        if supervisor.limit_exceeded is not None:
+            await process.wait()
+            return supervisor.limit_exceeded
 
         if (
             "WARNING: cannot load logging configuration file, logging is disabled\n"
@@ -64,21 +109,28 @@ async def run_script(
 
     except asyncio.TimeoutError:
         logger.log(content="Timeout", level="error")
-        process.kill()
+        kill_process_group(process.pid)
         await process.wait()  # Ensure the process is terminated
         return "Timeout"
     except asyncio.CancelledError:
         logger.log(content="Cancelled", level="error")
-        process.kill()
+        kill_process_group(process.pid)
         await process.wait()  # Ensure the process is terminated
         raise
     except Exception as e:
         logger.log(content=f"error in run code: {e}", level="error")
-        process.kill()
+        kill_process_group(process.pid)
         await process.wait()  # Ensure the process is terminated
         return f"error in run code: {e}"
     finally:
+        if process.returncode is None:
+            supervisor.sample()
+        sampler.cancel()
         # Ensure the process is terminated in case of any other unexpected errors
         if process.returncode is None:  # Check if process is still running
-            process.kill()
+            kill_process_group(process.pid)
             await process.wait()
+        else:
+            # threads or children the script left behind
+            kill_process_group(process.pid)
+        update_stats()
@@ -0,0 +1,232 @@
+"""
+Copyright (c) 2024 WindyLab of Westlake University, China
+All rights reserved.
+
+This software is provided "as is" without warranty of any kind, either
+express or implied, including but not limited to the warranties of
+merchantability, fitness for a particular purpose, or non-infringement.
+In no event shall the authors or copyright holders be liable for any
+claim, damages, or other liability, whether in an action of contract,
+tort, or otherwise, arising from, out of, or in connection with the
+software or the use or other dealings in the software.
+"""
+
+import asyncio
+import atexit
+import json
+import queue
+import subprocess
+import sys
+import threading
+import time
+import weakref
+
+from modules.utils.process_group import ProcessSupervisor, kill_process_group
+
+# must match RUNNER_MARKER in modules/deployment/execution_scripts/run.py
+RUNNER_MARKER = "__runner__ "
+# seconds a worker gets to report a stopped trial before it is killed
+STOP_TIMEOUT = 5.0
+LOGGING_WARNING = (
+    "WARNING: cannot load logging configuration file, logging is disabled\n"
+)
+
+_pools = weakref.WeakSet()
+
+
+class RunnerWorker:
+    """
+    One long-lived `run.py start end --serve` process driving a fixed range of robots.
+    """
+
+    def __init__(
+        self,
+        command: list[str],
+        working_directory,
+        robots: list[int],
+        cpu_time_limit: float = None,
+        rss_limit_mb: float = None,
+    ):
+        self.robots = list(robots)
+        self.process = subprocess.Popen(
+            command,
+            cwd=working_directory,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+            # killed as a group in close, together with anything the skills spawned
+            start_new_session=True,
+        )
+        self.messages = queue.Queue()
+        self.stop_timeout = STOP_TIMEOUT
+        self.stderr_chunks = []
+        self.process_stats = {"robots": self.robots, "pid": self.process.pid}
+        # the limits apply to each trial, see run_trial
+        self.supervisor = ProcessSupervisor(
+            self.process.pid, cpu_time_limit=cpu_time_limit, rss_limit_mb=rss_limit_mb
+        )
+        threading.Thread(target=self._read_stdout, daemon=True).start()
+        threading.Thread(target=self._read_stderr, daemon=True).start()
+
+    def _read_stdout(self):
+        for line in self.process.stdout:
+            if line.startswith(RUNNER_MARKER):
+                self.messages.put(json.loads(line[len(RUNNER_MARKER) :]))
+            else:
+                print(line, end="")
+
+    def _read_stderr(self):
+        # the worker reports trial errors itself, this only keeps what it writes outside a trial
+        for line in self.process.stderr:
+            self.stderr_chunks.append(line)
+            print(line, end="", file=sys.stderr)
+
+    @property
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def send(self, command: str):
+        try:
+            self.process.stdin.write(command + "\n")
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError):
+            pass
+
+    async def _next_result(self) -> dict | None:
+        """
+        Wait for the next trial result, None if the worker exits first.
+        """
+        last_sample = time.time()
+        while True:
+            try:
+                message = self.messages.get_nowait()
+            except queue.Empty:
+                if not self.alive:
+                    return None
+                if time.time() - last_sample >= 0.5:
+                    self.supervisor.sample()
+                    last_sample = time.time()
+                await asyncio.sleep(0.05)
+                continue
+            if message.get("status") != "ready":
+                return message
+
+    async def run_trial(self, timeout: float) -> str:
+        """
+        Start a trial and return its result in the format of run_script:
+        the stderr of the trial, "NONE" if it is empty, or "Timeout" if it had to be stopped.
+        """
+        start_time = time.time()
+        self.supervisor.reset()
+        self.stderr_chunks = []
+        self.send("run")
+        try:
+            result = await asyncio.wait_for(self._next_result(), timeout=timeout)
+        except asyncio.TimeoutError:
+            # a worker that had to be killed to stop ran out of time as well
+            result = dict(await self.stop() or {}, status="stopped")
+        except asyncio.CancelledError:
+            await self.stop()
+            raise
+        finally:
+            if self.alive:
+                self.supervisor.sample()
+            self.process_stats.update(
+                wall_time=time.time() - start_time,
+                returncode=self.process.poll(),
+                **self.supervisor.report(),
+            )
+
+        if self.supervisor.limit_exceeded is not None:
+            return self.supervisor.limit_exceeded
+        if result is None:
+            stderr = "".join(self.stderr_chunks).replace(LOGGING_WARNING, "")
+            return stderr or f"Robot runner exited with code {self.process.returncode}"
+        if result["status"] == "stopped":
+            return "Timeout"
+        stderr = result.get("stderr", "").replace(LOGGING_WARNING, "")
+        return stderr if stderr else "NONE"
+
+    async def stop(self) -> dict | None:
+        """
+        Stop the running trial. A worker that does not report within stop_timeout is killed,
+        the pool starts a new one for the next trial.
+        """
+        self.send("stop")
+        try:
+            return await asyncio.wait_for(
+                self._next_result(), timeout=self.stop_timeout
+            )
+        except asyncio.TimeoutError:
+            kill_process_group(self.process.pid)
+            return None
+
+    def close(self, timeout: float = 5.0):
+        if self.alive:
+            self.send("exit")
+            try:
+                self.process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                pass
+        kill_process_group(self.process.pid)
+        self.process.wait()
+
+
+class RunnerPool:
+    """
+    Warm robot-runner processes reused across the debug iterations of one experiment.
+
+    Workers stay connected to ROS between trials and reload the generated skills for each
+    one, so an iteration does not pay the start-up cost of Python, rospy and numpy again.
+    The pool restarts its workers when the workspace or the robot allocation changes, or
+    when a worker died.
+    """
+
+    def __init__(
+        self,
+        script: str = "run.py",
+        cpu_time_limit: float = None,
+        rss_limit_mb: float = None,
+    ):
+        self.script = script
+        self.cpu_time_limit = cpu_time_limit
+        self.rss_limit_mb = rss_limit_mb
+        self.working_directory = None
+        self.workers: list[RunnerWorker] = []
+        _pools.add(self)
+
+    def start(self, working_directory, robot_id_chunks: list[list[int]]):
+        chunks = [list(chunk) for chunk in robot_id_chunks]
+        if (
+            str(working_directory) == str(self.working_directory)
+            and [worker.robots for worker in self.workers] == chunks
+            and all(worker.alive for worker in self.workers)
+        ):
+            return
+        self.close()
+        self.working_directory = working_directory
+        self.workers = [
+            RunnerWorker(
+                ["python", self.script, str(chunk[0]), str(chunk[-1]), "--serve"],
+                working_directory,
+                chunk,
+                cpu_time_limit=self.cpu_time_limit,
+                rss_limit_mb=self.rss_limit_mb,
+            )
+            for chunk in chunks
+        ]
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
+        self.workers = []
+
+
+def close_runner_pools():
+    for pool in list(_pools):
+        pool.close()
+
+
+atexit.register(close_runner_pools)
@@ -0,0 +1,132 @@
+"""
+Copyright (c) 2024 WindyLab of Westlake University, China
+All rights reserved.
+
+This software is provided "as is" without warranty of any kind, either
+express or implied, including but not limited to the warranties of
+merchantability, fitness for a particular purpose, or non-infringement.
+In no event shall the authors or copyright holders be liable for any
+claim, damages, or other liability, whether in an action of contract,
+tort, or otherwise, arising from, out of, or in connection with the
+software or the use or other dealings in the software.
+"""
+
+import math
+import os
+
+# workers of a run before the CPU cost of its robots was measured
+UNMEASURED_WORKERS = 4
+
+
+def split_evenly(items: list, num_chunks: int) -> list[list]:
+    """
+    Split items into num_chunks contiguous chunks whose sizes differ by at most one.
+
+    Args:
+        items (list): The items to split, e.g. robot ids.
+        num_chunks (int): The number of chunks, capped at len(items).
+
+    Returns:
+        list[list]: The non-empty chunks, in order.
+    """
+    num_chunks = max(1, min(num_chunks, len(items)))
+    base, extra = divmod(len(items), num_chunks)
+    chunks = []
+    start = 0
+    for i in range(num_chunks):
+        size = base + (1 if i < extra else 0)
+        if size:
+            chunks.append(items[start : start + size])
+        start += size
+    return chunks
+
+
+class WorkerScheduler:
+    """
+    Decide how many robot-runner processes to start and which robots each one drives.
+
+    Each worker process runs its robots under one GIL, so it can use at most one core.
+    The scheduler measures the CPU time robots actually used in the previous run and
+    starts just enough workers to keep each one below target_utilization, capped by the
+    number of cores and robots. Until then it starts at most unmeasured_workers.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = None,
+        target_utilization: float = 0.8,
+        unmeasured_workers: int = UNMEASURED_WORKERS,
+    ):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.target_utilization = target_utilization
+        self.unmeasured_workers = unmeasured_workers
+        # CPU seconds used per robot per wall-clock second, None until measured
+        self.cpu_per_robot = None
+
+    def num_workers(self, total_robots: int) -> int:
+        if total_robots <= 0:
+            return 0
+        limit = min(self.max_workers, total_robots)
+        if self.cpu_per_robot is None:
+            return min(limit, self.unmeasured_workers)
+        needed = math.ceil(total_robots * self.cpu_per_robot / self.target_utilization)
+        return max(1, min(limit, needed))
+
+    def allocate(self, robot_ids: list[int]) -> list[list[int]]:
+        """
+        Split robot ids into balanced chunks, one per worker process.
+        """
+        return split_evenly(robot_ids, self.num_workers(len(robot_ids)))
+
+    def record(self, worker_stats: list[dict]) -> list[dict]:
+        """
+        Update the per-robot CPU cost from the stats of finished workers.
+
+        Args:
+            worker_stats (list[dict]): One dict per worker with "robots", "cpu_time" and "wall_time",
+                and optionally "max_rss_mb", "returncode" and "limit_exceeded" from its ProcessSupervisor.
+
+        Returns:
+            list[dict]: Per-worker report including the CPU utilization of each worker.
+        """
+        report = []
+        total_cpu_time = 0.0
+        total_robot_time = 0.0
+        for stats in worker_stats:
+            cpu_time = stats.get("cpu_time")
+            wall_time = stats.get("wall_time") or 0.0
+            robots = stats.get("robots", [])
+            utilization = (
+                cpu_time / wall_time if cpu_time is not None and wall_time > 0 else None
+            )
+            report.append(
+                {
+                    "robots": list(robots),
+                    "pid": stats.get("pid"),
+                    "cpu_time": cpu_time,
+                    "wall_time": wall_time,
+                    "utilization": utilization,
+                    "max_rss_mb": stats.get("max_rss_mb"),
+                    "returncode": stats.get("returncode"),
+                    "limit_exceeded": stats.get("limit_exceeded"),
+                }
+            )
+            if utilization is not None and robots:
+                total_cpu_time += cpu_time
+                total_robot_time += len(robots) * wall_time
+        if total_robot_time > 0:
+            self.cpu_per_robot = total_cpu_time / total_robot_time
+        return report
+
+
+_task_schedulers: dict[str, WorkerScheduler] = {}
+
+
+def task_scheduler(task_key: str) -> WorkerScheduler:
+    """
+    The scheduler of a task, e.g. by its workspace directory, shared by all the experiments
+    of the task run in this process so that each one starts from the cost measured before.
+    """
+    if task_key not in _task_schedulers:
+        _task_schedulers[task_key] = WorkerScheduler()
+    return _task_schedulers[task_key]
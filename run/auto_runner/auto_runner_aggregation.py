@@ -29,6 +29,7 @@ class AutoRunnerAggregation(AutoRunnerBase):
         script_name="run.py",
         test_mode=None,
         exp_batch=1,
+        batch_size=1,
         max_speed=1.0,
         tolerance=0.05,
     ):
@@ -42,6 +43,7 @@ class AutoRunnerAggregation(AutoRunnerBase):
             script_name=script_name,
             max_speed=max_speed,
             exp_batch=exp_batch,
+            batch_size=batch_size,
             tolerance=tolerance,
             test_mode=test_mode,
             env=env,
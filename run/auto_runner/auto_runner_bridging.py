@@ -30,6 +30,7 @@ class AutoRunnerBridging(AutoRunnerBase):
         target_pkl="WriteRun.pkl",
         script_name="run.py",
         exp_batch=1,
+        batch_size=1,
         test_mode=None,
         max_speed=1.0,
         tolerance=0.05,
@@ -44,11 +45,19 @@ class AutoRunnerBridging(AutoRunnerBase):
             script_name=script_name,
             max_speed=max_speed,
             exp_batch=exp_batch,
+            batch_size=batch_size,
             test_mode=test_mode,
             tolerance=tolerance,
             env=self.env,
         )
 
+    @classmethod
+    def for_analysis(cls, env_config_path, tolerance):
+        runner = super().for_analysis(env_config_path, tolerance)
+        # analyze_result lines up the robots of the environment
+        runner.env = GymnasiumBridgingEnvironment(env_config_path)
+        return runner
+
     def analyze_result(self, run_result) -> dict[str, float]:
         robots_num = self.env.num_robots
         target_y = np.linspace(-2, 2, robots_num)
@@ -39,6 +39,7 @@ class AutoRunnerClustering(AutoRunnerBase):
         target_pkl="WriteRun.pkl",
         script_name="run.py",
         exp_batch=1,
+        batch_size=1,
         max_speed=1.0,
         test_mode=None,
         tolerance=0.05,
@@ -54,6 +55,7 @@ class AutoRunnerClustering(AutoRunnerBase):
             max_speed=max_speed,
             tolerance=tolerance,
             exp_batch=exp_batch,
+            batch_size=batch_size,
             test_mode=test_mode,
             env=env,
         )
@@ -34,6 +34,7 @@ class AutoRunnerCovering(AutoRunnerBase):
         target_pkl="WriteRun.pkl",
         script_name="run.py",
         exp_batch=1,
+        batch_size=1,
         max_speed=1.0,
         tolerance=0.05,
         test_mode=None,
@@ -49,6 +50,7 @@ class AutoRunnerCovering(AutoRunnerBase):
             max_speed=max_speed,
             tolerance=tolerance,
             exp_batch=exp_batch,
+            batch_size=batch_size,
             env=env,
             test_mode=test_mode,
         )
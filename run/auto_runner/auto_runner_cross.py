@@ -32,6 +32,7 @@ class AutoRunnerCross(AutoRunnerBase):
         target_pkl="WriteRun.pkl",
         script_name="run.py",
         exp_batch=1,
+        batch_size=1,
         max_speed=1.0,
         test_mode="full_version",
         tolerance=0.05,
@@ -46,6 +47,7 @@ class AutoRunnerCross(AutoRunnerBase):
             script_name=script_name,
             max_speed=max_speed,
             exp_batch=exp_batch,
+            batch_size=batch_size,
             test_mode=test_mode,
             tolerance=tolerance,
             env=env,
@@ -28,6 +28,7 @@ class AutoRunnerEncircling(AutoRunnerBase):
         target_pkl="WriteRun.pkl",
         script_name="run.py",
         exp_batch=1,
+        batch_size=1,
         test_mode=None,
         max_speed=1.0,
         tolerance=0.05,
@@ -42,6 +43,7 @@ class AutoRunnerEncircling(AutoRunnerBase):
             target_pkl=target_pkl,
             script_name=script_name,
             exp_batch=exp_batch,
+            batch_size=batch_size,
             max_speed=max_speed,
             tolerance=tolerance,
             env=env,
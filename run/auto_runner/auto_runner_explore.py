@@ -35,6 +35,7 @@ class AutoRunnerExplore(AutoRunnerBase):
         script_name="run.py",
         max_speed=1.0,
         exp_batch=1,
+        batch_size=1,
         tolerance=0.05,
         test_mode=None,
     ):
@@ -50,6 +51,7 @@ class AutoRunnerExplore(AutoRunnerBase):
             tolerance=tolerance,
             test_mode=test_mode,
             exp_batch=exp_batch,
+            batch_size=batch_size,
             env=env,
         )
 
@@ -24,23 +24,25 @@ from run.utils import (
     evaluate_trajectory_pattern,
     check_collisions,
     evaluate_min_distances_to_others,
-    evaluate_average_position, check_robots_no_movement_in_first_third,
+    evaluate_average_position,
+    check_robots_no_movement_in_first_third,
 )
 
 
 class AutoRunnerFlocking(AutoRunnerBase):
     def __init__(
-            self,
-            env_config_path,
-            workspace_path,
-            experiment_duration,
-            run_mode="rerun",
-            target_pkl="WriteRun.pkl",
-            script_name="run.py",
-            test_mode=None,
-            exp_batch=1,
-            max_speed=1.0,
-            tolerance=0.05,
+        self,
+        env_config_path,
+        workspace_path,
+        experiment_duration,
+        run_mode="rerun",
+        target_pkl="WriteRun.pkl",
+        script_name="run.py",
+        test_mode=None,
+        exp_batch=1,
+        batch_size=1,
+        max_speed=1.0,
+        tolerance=0.05,
     ):
         env = GymnasiumFlockingEnvironment(env_config_path)
         super().__init__(
@@ -53,6 +55,7 @@ class AutoRunnerFlocking(AutoRunnerBase):
             max_speed=max_speed,
             tolerance=tolerance,
             exp_batch=exp_batch,
+            batch_size=batch_size,
             test_mode=test_mode,
             env=env,
         )
@@ -74,10 +77,11 @@ class AutoRunnerFlocking(AutoRunnerBase):
         similarity = evaluate_trajectory_similarity(run_result)
         collision = check_collisions(run_result)
         merged_dict = (
-                max_min_distance
-                | terminal_distance
-                | similarity
-                | collision
-                | average_distance | no_move_num
+            max_min_distance
+            | terminal_distance
+            | similarity
+            | collision
+            | average_distance
+            | no_move_num
         )
         return merged_dict
@@ -22,6 +22,7 @@ class AutoRunnerPursuing(AutoRunnerBase):
         target_pkl="WriteRun.pkl",
         script_name="run.py",
         exp_batch=1,
+        batch_size=1,
         test_mode=None,
         max_speed=1.0,
         tolerance=0.05,
@@ -36,6 +37,7 @@ class AutoRunnerPursuing(AutoRunnerBase):
             script_name=script_name,
             max_speed=max_speed,
             exp_batch=exp_batch,
+            batch_size=batch_size,
             tolerance=tolerance,
             test_mode=test_mode,
             env=env,
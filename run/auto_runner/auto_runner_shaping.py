@@ -15,7 +15,11 @@ import operator
 
 from modules.deployment.gymnasium_env import GymnasiumShapingEnvironment
 from run.auto_runner import AutoRunnerBase
-from run.utils import evaluate_shape_similarity, check_collisions
+from run.utils import (
+    evaluate_shape_similarity,
+    evaluate_shape_convergence,
+    check_collisions,
+)
 
 
 class AutoRunnerShaping(AutoRunnerBase):
@@ -28,6 +32,7 @@ class AutoRunnerShaping(AutoRunnerBase):
         target_pkl="WriteRun.pkl",
         script_name="run.py",
         exp_batch=1,
+        batch_size=1,
         test_mode=None,
         max_speed=1.0,
         tolerance=0.05,
@@ -44,6 +49,7 @@ class AutoRunnerShaping(AutoRunnerBase):
             test_mode=test_mode,
             tolerance=tolerance,
             exp_batch=exp_batch,
+            batch_size=batch_size,
             env=env,
         )
 
@@ -56,7 +62,15 @@ class AutoRunnerShaping(AutoRunnerBase):
         target_shape = [(1, -1), (1, 1), (0, 0), (1, 0), (2, 0)]
         target_achievement = evaluate_shape_similarity(run_result, target_shape)
         collision = check_collisions(run_result)
-        merged_dict = target_achievement | collision
+        convergence = evaluate_shape_convergence(run_result, target_shape)
+        merged_dict = (
+            target_achievement
+            | collision
+            | {
+                "mean_procrustes_distance": convergence["mean_procrustes_distance"],
+                "convergence_step": convergence["convergence_step"],
+            }
+        )
         return merged_dict
 
     def setup_success_conditions(self) -> list[tuple[str, operator, float]]:
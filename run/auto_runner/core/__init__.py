@@ -1,9 +1,23 @@
 from .result_analyzer import ExperimentAnalyzer
 from .code_runner import CodeRunner
 from .environment_manager import EnvironmentManager
+from .trajectory_recorder import (
+    TrajectoryRecorder,
+    TrajectoryRecording,
+    load_trajectory_recording,
+)
+from .video_renderer import replay_frames, render_recording, render_experiment
+from .early_termination import EarlyTerminationOracle
 
 __all__ = [
     "ExperimentAnalyzer",
     "CodeRunner",
     "EnvironmentManager",
+    "TrajectoryRecorder",
+    "TrajectoryRecording",
+    "load_trajectory_recording",
+    "replay_frames",
+    "render_recording",
+    "render_experiment",
+    "EarlyTerminationOracle",
 ]
@@ -0,0 +1,190 @@
+"""
+Copyright (c) 2024 WindyLab of Westlake University, China
+All rights reserved.
+
+This software is provided "as is" without warranty of any kind, either
+express or implied, including but not limited to the warranties of
+merchantability, fitness for a particular purpose, or non-infringement.
+In no event shall the authors or copyright holders be liable for any
+claim, damages, or other liability, whether in an action of contract,
+tort, or otherwise, arising from, out of, or in connection with the
+software or the use or other dealings in the software.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from run.utils.experiment_data import ExperimentData
+from .trajectory_recorder import TrajectoryRecording
+
+
+class EarlyTerminationOracle:
+    """
+    Evaluate a running experiment every `interval` seconds of simulated time and decide
+    whether it can stop before the end of its duration:
+
+    - "success": the success conditions of the task held at `success_patience` consecutive checks.
+    - "stall": no robot moved more than `stall_tolerance` during the last `stall_window` seconds.
+    - "collision": at least `jam_ratio` of the robots stayed in collision without moving more
+      than `stall_tolerance` during the last `stall_window` seconds.
+
+    The checks run in the step of the simulation, so only motion, collisions and the distance
+    of the robots to their targets are evaluated there. The full analysis of the task, which
+    the success conditions need, runs in a background thread once every robot with a target
+    is within `target_tolerance` of it, and its result counts at the first check after it
+    finished. The stall window starts at the step given to `start`, once every robot sent
+    its first command, so that slow-starting controllers are not taken for a stall.
+
+    Enabled by the "early_termination" entry of the env config, whose keys are the arguments
+    of this class, e.g. {"interval": 1.0, "success_patience": 3}.
+    """
+
+    def __init__(
+        self,
+        analyze_result,
+        calculate_success,
+        dt: float,
+        interval: float = 1.0,
+        success_patience: int = 3,
+        stall_window: float = 5.0,
+        stall_tolerance: float = 0.01,
+        jam_ratio: float = 0.5,
+        collision_tolerance: float = 0.1,
+        target_tolerance: float = 0.2,
+    ):
+        """
+        Args:
+            analyze_result: The analyze_result of the task runner, computing its metrics.
+            calculate_success: Whether a dict of metrics meets the success conditions.
+            dt (float): Simulated seconds per environment step.
+        """
+        self.analyze_result = analyze_result
+        self.calculate_success = calculate_success
+        self.interval_steps = max(1, int(round(interval / dt)))
+        self.success_patience = success_patience
+        self.stall_steps = max(1, int(round(stall_window / dt)))
+        self.stall_tolerance = stall_tolerance
+        self.jam_ratio = jam_ratio
+        self.collision_tolerance = collision_tolerance
+        self.target_tolerance = target_tolerance
+        self._analysis_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="early-termination"
+        )
+        self.successes = 0
+        self.start_step = None
+        self._pending_analysis = None
+
+    def reset(self):
+        self.successes = 0
+        self.start_step = None
+        # an analysis of the previous run still running is ignored
+        self._pending_analysis = None
+
+    def start(self, step: int):
+        """
+        Start the stall window at `step`, when every robot has sent its first command.
+        """
+        if self.start_step is None:
+            self.start_step = step
+
+    def due(self, step: int) -> bool:
+        return step > 0 and step % self.interval_steps == 0
+
+    def _success(self, arrays: dict) -> bool:
+        try:
+            analysis = self.analyze_result(ExperimentData(TrajectoryRecording(arrays)))
+            return bool(self.calculate_success(analysis))
+        except Exception:
+            # e.g. a metric that needs more steps than recorded so far
+            return False
+
+    def _colliding(self, positions: np.ndarray, sizes: np.ndarray) -> np.ndarray:
+        distances = np.linalg.norm(positions[:, None] - positions[None, :], axis=-1)
+        colliding = (
+            distances + self.collision_tolerance < sizes[:, None] + sizes[None, :]
+        )
+        np.fill_diagonal(colliding, False)
+        return colliding.any(axis=1)
+
+    def _jammed_ratio(
+        self, window: np.ndarray, sizes: np.ndarray, moved: np.ndarray
+    ) -> float:
+        # in collision at both ends of the window and not moving in between
+        jammed = (
+            self._colliding(window[0], sizes)
+            & self._colliding(window[-1], sizes)
+            & ~moved
+        )
+        return float(np.count_nonzero(jammed)) / window.shape[1]
+
+    def _motion(self, recording: TrajectoryRecording, robots: np.ndarray) -> str | None:
+        steps = len(recording.positions)
+        if self.start_step is None or steps - 1 - self.stall_steps < self.start_step:
+            return None
+        # robots that are no longer moveable stay at their last recorded position
+        rows = np.arange(steps - self.stall_steps - 1, steps)[:, None]
+        rows = np.minimum(rows, recording.lengths[robots] - 1)
+        window = recording.positions[rows, robots]
+        displacement = np.linalg.norm(window - window[-1], axis=-1).max(axis=0)
+        moved = displacement > self.stall_tolerance
+        if not moved.any():
+            return "stall"
+        sizes = np.array(
+            [recording.meta["sizes"][robot] for robot in robots], dtype=float
+        )
+        if self._jammed_ratio(window, sizes, moved) >= self.jam_ratio:
+            return "collision"
+        return None
+
+    def _targets_reached(
+        self, recording: TrajectoryRecording, robots: np.ndarray
+    ) -> bool:
+        targets = recording.meta["targets"]
+        with_target = [robot for robot in robots if targets[robot] is not None]
+        if not with_target:
+            return True
+        final = recording.positions[recording.lengths[with_target] - 1, with_target]
+        targets = np.array([targets[robot] for robot in with_target], dtype=float)
+        return bool(
+            np.all(np.linalg.norm(final - targets, axis=-1) <= self.target_tolerance)
+        )
+
+    def _check_success(
+        self, recording: TrajectoryRecording, robots: np.ndarray
+    ) -> bool:
+        pending = self._pending_analysis
+        if pending is not None and pending.done():
+            self._pending_analysis = None
+            self.successes = self.successes + 1 if pending.result() else 0
+            if self.successes >= self.success_patience:
+                return True
+        if self._pending_analysis is None:
+            if self._targets_reached(recording, robots):
+                # the recorder keeps writing into its arrays while the analysis runs
+                snapshot = {
+                    key: value.copy() for key, value in recording.arrays.items()
+                }
+                self._pending_analysis = self._analysis_executor.submit(
+                    self._success, snapshot
+                )
+            else:
+                self.successes = 0
+        return False
+
+    def check(self, recording: TrajectoryRecording) -> str | None:
+        """
+        Evaluate the trajectories recorded so far.
+
+        Returns:
+            str | None: The reason to stop the experiment now, or None to continue.
+        """
+        robots = np.array(
+            [i for i, kind in enumerate(recording.meta["types"]) if kind == "Robot"],
+            dtype=np.int64,
+        )
+        if len(robots) == 0:
+            return None
+        if self._check_success(recording, robots):
+            return "success"
+        return self._motion(recording, robots)
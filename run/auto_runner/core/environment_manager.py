@@ -1,12 +1,18 @@
 import os
-import cv2
-import imageio
+import random
+import threading
+import time
+
+import numpy as np
 import rospy
 from code_llm.srv import StartEnvironment, StartEnvironmentResponse
 from code_llm.srv import StopEnvironment, StopEnvironmentResponse
 
 from modules.deployment.utils.manager import Manager
+from modules.deployment.utils.step_profiler import StepProfiler
+from .trajectory_recorder import TrajectoryRecorder
 from modules.deployment.gymnasium_env import GymnasiumEnvironmentBase
+from modules.utils.media import VideoStreamWriter
 
 
 class EnvironmentManager:
@@ -15,6 +21,9 @@ class EnvironmentManager:
         env: GymnasiumEnvironmentBase,
         default_fps: int = 100,
         max_speed: float = 1.0,
+        lockstep: bool = None,
+        tick_timeout: float = 1.0,
+        startup_timeout: float = 10.0,
     ):
         """
         Initialize the environment manager, no longer requiring experiment path and ID in the constructor.
@@ -23,6 +32,12 @@ class EnvironmentManager:
             env: The environment object to manage.
             default_fps (int): Default frame rate (frames per second).
             max_speed (float): Maximum speed for the manager.
+            lockstep (bool): Advance the simulation on a simulated clock, one step as soon as every robot
+                has sent its command for the current tick, instead of on a wall-clock timer.
+                Defaults to the "lockstep" entry of the env config.
+            tick_timeout (float): Wall-clock seconds to wait for a robot's command in lockstep mode before
+                the robot is dropped from the barrier.
+            startup_timeout (float): Same as tick_timeout, for the first tick, counted from the first command.
         """
         self.env = env
         self.env.reset()
@@ -32,12 +47,41 @@ class EnvironmentManager:
             real = True
             default_fps = 10
         self.fps = default_fps  # Default frame rate
+        self.max_speed = max_speed
         self.manager = Manager(self.env, max_speed=max_speed, real=real)
-        self.frames = []
-        self.frame_dir = None
+        # commands based on observations older than 5 steps count as stale
+        self.manager.telemetry.stale_after = 5.0 / self.fps
+        self.profiler = StepProfiler(budget=1.0 / self.fps)
+        self.env.profiler = self.profiler
+        # frames are encoded while the experiment runs, see start_video; with "render_video": false
+        # the simulation runs headless and videos are rendered afterwards by run/render_videos.py
+        self.video = None
+        self.render_video = self.env.data.get("render_video", True)
+        self.video_frame_interval = self.env.data.get("video_frame_interval", 1)
+        self.video_scale = self.env.data.get("video_scale", 1.0)
         self.experiment_duration = 0  # Set experiment duration
         self.start_time = None
         self.timer = None
+        self.lockstep = (
+            self.env.data.get("lockstep", False) if lockstep is None else lockstep
+        )
+        self.seed = self.env.data.get("seed", None)
+        # "thread": one thread per robot, "tick": run.py steps all robots of a process each tick
+        self.robot_scheduler = self.env.data.get("robot_scheduler", "thread")
+        # {"cpu_time": seconds, "rss_mb": megabytes} allowed to each generated-code process group
+        self.process_limits = self.env.data.get("process_limits", {})
+        self.tick_timeout = tick_timeout
+        self.startup_timeout = startup_timeout
+        self._lockstep_thread = None
+        self._lockstep_stop = threading.Event()
+        self._lockstep_done = threading.Event()
+        # time from start_environment to the first command of the robots, see startup_report
+        self.startup_report = {}
+        # EarlyTerminationOracle deciding to stop a run before its duration, see set_oracle
+        self.oracle = None
+        # {"reason", "step", "time"} of the last run if the oracle stopped it
+        self.early_termination = None
+        self._stopped_early = threading.Event()
         _, infos = self.env.reset()
         self.result = self.init_result(infos)
         # Register ROS services
@@ -48,31 +92,47 @@ class EnvironmentManager:
             "/stop_environment", StopEnvironment, self.handle_stop_environment
         )
 
-    def init_result(self, infos: dict) -> dict:
+    def set_oracle(self, oracle):
+        """
+        Check the live trajectories with an EarlyTerminationOracle every few steps and stop the
+        simulation as soon as it returns a reason.
+        """
+        self.oracle = oracle
+
+    def init_result(self, infos: dict) -> TrajectoryRecorder:
         """
-        Initialize the result structure with information about each entity in the environment.
+        Initialize the trajectory recorder with information about each entity in the environment.
 
         Args:
             infos (dict): A dictionary containing initial information for each entity.
 
         Returns:
-            dict: Initialized result dictionary.
-        """
-        result = {}
-        for entity_id in infos:
-            result[entity_id] = {
-                "size": 0,
-                "target": None,
-                "trajectory": [],
-                "type": "",
-                "states": [],
-                "dt": self.env.dt,
-            }
-            result[entity_id]["size"] = infos[entity_id]["size"]
-            result[entity_id]["target"] = infos[entity_id]["target_position"]
-            result[entity_id]["type"] = infos[entity_id]["type"]
-            result[entity_id]["trajectory"].append(infos[entity_id]["position"])
-        return result
+            TrajectoryRecorder: Recorder holding the initial position of each entity.
+        """
+        return TrajectoryRecorder(infos, dt=self.env.dt)
+
+    def smoke_test_world(self) -> dict:
+        """
+        The entities of the current episode in JSON types, with the tick period and the speed of
+        the robots, for the headless smoke test of the generated skills
+        (modules/deployment/execution_scripts/run_smoke.py).
+        """
+        entities = []
+        for entity_id, info in self.env.get_observation("dict").items():
+            target_position = info["target_position"]
+            entities.append(
+                {
+                    "id": int(entity_id),
+                    "type": info["type"],
+                    "position": np.asarray(info["position"], dtype=float).tolist(),
+                    "size": np.asarray(info["size"], dtype=float).tolist(),
+                    "color": str(info["color"]),
+                    "target_position": None
+                    if target_position is None
+                    else np.asarray(target_position, dtype=float).tolist(),
+                }
+            )
+        return {"entities": entities, "dt": 1.0 / self.fps, "max_speed": self.max_speed}
 
     def handle_start_environment(self, req) -> StartEnvironmentResponse:
         """
@@ -104,15 +164,35 @@ class EnvironmentManager:
             success=True, message="Environment stopped successfully."
         )
 
-    def start_environment(self, experiment_path: str, keep_entities=False):
+    def start_environment(
+        self, experiment_path: str, keep_entities=False, duration: float = None
+    ):
         """
-        Start the environment and run the experiment periodically using a timer.
+        Start the environment and run the experiment periodically using a timer,
+        or on the simulated clock in lockstep mode.
 
         Args:
             experiment_path (str): The path where experiment data will be saved.
+            keep_entities (bool): Keep the current entities instead of sampling new ones.
+            duration (float): Simulated experiment duration in seconds. In lockstep mode the
+                environment stops stepping after duration * fps ticks.
         """
         self.experiment_path = experiment_path
+        if duration is not None:
+            self.experiment_duration = duration
         self.reset_environment(keep_entities)
+        self.early_termination = None
+        self._stopped_early.clear()
+        if self.oracle is not None:
+            self.oracle.reset()
+        self.start_video()
+        self.start_time = time.time()
+        rospy.set_param("lockstep", self.lockstep)
+        rospy.set_param("lockstep_period", 1.0 / self.fps)
+        rospy.set_param("robot_scheduler", self.robot_scheduler)
+        if self.lockstep:
+            self.start_lockstep()
+            return
         fps_duration = 1.0 / self.fps
         secs = int(fps_duration)  # Whole seconds
         nsecs = int((fps_duration - secs) * 1e9)  # Nanoseconds
@@ -126,9 +206,15 @@ class EnvironmentManager:
         """
         Reset the environment to its initial state.
         """
-        self.env.reset(keep_entity=keep_entities)
+        if self.seed is not None and not keep_entities:
+            np.random.seed(self.seed)
+            random.seed(self.seed)
+        _, infos = self.env.reset(seed=self.seed, keep_entity=keep_entities)
+        self.result = self.init_result(infos)
         self.manager.clear_velocity()
-        self.frames.clear()
+        self.manager.reset_lockstep()
+        self.manager.telemetry.reset()
+        self.profiler.reset()
         print("Environment reset successfully.")
 
     def stop_environment(self, file_name: str = None, save_result: bool = True):
@@ -141,57 +227,232 @@ class EnvironmentManager:
         """
         if self.timer:
             self.timer.shutdown()
+        self.stop_lockstep()
+        self.startup_report = self.build_startup_report()
         if save_result:
             self.save_frames_as_animations(file_name)
             self.save_simulation_data(file_name)
+            self.save_telemetry(file_name)
+            self.save_profile(file_name)
             print(f"Environment stopped and saved as {file_name} successfully.")
         else:
             _, infos = self.env.reset(keep_entity=True)
             self.result = self.init_result(infos)
-            self.frames.clear()
+            self.discard_video()
             print("Environment stopped successfully without saving.")
 
-    def save_frames_as_animations(self, file_name: str):
+    def build_startup_report(self) -> dict:
         """
-        Save the recorded frames as GIF and MP4 animation files.
+        Summarize how long the robots took from the start of the environment to their first command.
 
-        Args:
-            file_name (str): The name of the file for saving the animation.
+        Returns:
+            dict: Number of robots that sent a command, and the first, mean and last time to first command in seconds.
         """
-        # Save as GIF
-        # gif_path = os.path.join(self.experiment_path, f"{file_name}.gif")
-        # imageio.mimsave(gif_path, self.frames, fps=self.fps)
-        # print(f"Saved animation as GIF at {gif_path}")
+        if self.start_time is None:
+            return {}
+        delays = [
+            command_time - self.start_time
+            for command_time in self.manager.first_command_times().values()
+        ]
+        report = {
+            "robots": len(self.manager.robotID_velocity),
+            "robots_commanded": len(delays),
+        }
+        if delays:
+            report["first"] = min(delays)
+            report["mean"] = float(np.mean(delays))
+            report["last"] = max(delays)
+            print(
+                f"Time to first command: {report['first']:.3f}s (first), "
+                f"{report['mean']:.3f}s (mean), {report['last']:.3f}s (last) "
+                f"for {len(delays)}/{report['robots']} robots"
+            )
+        return report
 
-        # Save as MP4
-        mp4_path = os.path.join(self.experiment_path, f"{file_name}.mp4")
-        height, width, layers = self.frames[0].shape
-        size = (width, height)
-        out = cv2.VideoWriter(mp4_path, cv2.VideoWriter_fourcc(*"mp4v"), self.fps, size)
+    def _recording_path(self) -> str:
+        return os.path.join(self.experiment_path, f".recording_{os.getpid()}.mp4")
 
-        for i, frame in enumerate(self.frames):
-            # sample frame in frame list
-            # if i//10 == 0:
+    def start_video(self):
+        """
+        Start streaming the rendered frames of this run to a temporary MP4 in the experiment directory.
+        """
+        self.discard_video()
+        if not self.render_video:
+            return
+        self.video = VideoStreamWriter(
+            self._recording_path(),
+            fps=self.fps,
+            frame_interval=self.video_frame_interval,
+            scale=self.video_scale,
+        )
 
-            out.write(cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+    def discard_video(self):
+        if self.video is None:
+            return
+        video, self.video = self.video, None
+        video.close()
+        if os.path.exists(video.path):
+            os.remove(video.path)
+
+    def save_frames_as_animations(self, file_name: str):
+        """
+        Finish the streamed MP4 of this run and move it to {file_name}.mp4.
 
-        out.release()
+        Args:
+            file_name (str): The name of the file for saving the animation.
+        """
+        if self.video is None:
+            return
+        video, self.video = self.video, None
+        frames = video.close()
+        if frames == 0:
+            print("No frames rendered, no animation saved")
+            return
+        mp4_path = os.path.join(self.experiment_path, f"{file_name}.mp4")
+        os.replace(video.path, mp4_path)
         print(f"Saved animation as MP4 at {mp4_path}")
-        self.frames.clear()
 
     def save_simulation_data(self, file_name: str):
         """
-        Save the simulation data as a pickle file.
+        Save the recorded trajectories as an .npz file, read back with load_trajectory_recording.
 
         Args:
             file_name (str): The name of the file for saving the data.
         """
-        import pickle
+        data_path = os.path.join(self.experiment_path, f"{file_name}.npz")
+        self.result.save(data_path)
+        print(f"Saved simulation data at {data_path}")
+
+    def save_telemetry(self, file_name: str):
+        """
+        Save the command latency time series and summary next to the simulation data.
 
-        data_path = os.path.join(self.experiment_path, f"{file_name}.pkl")
-        with open(data_path, "wb") as f:
-            pickle.dump(self.result, f)
-        print(f"Saved simulation data as pickle at {data_path}")
+        Args:
+            file_name (str): The name of the simulation data file, without extension.
+        """
+        summary = self.manager.telemetry.save(
+            os.path.join(self.experiment_path, file_name)
+        )
+        latency = summary["latency"].get("obs_to_apply")
+        if latency:
+            print(
+                f"Observation to apply latency: {latency['p50'] * 1000:.1f}ms (p50), "
+                f"{latency['p95'] * 1000:.1f}ms (p95)"
+            )
+
+    def save_profile(self, file_name: str):
+        """
+        Save the per-phase step timings as {file_name}_profile.json next to the simulation data.
+        """
+        summary = self.profiler.save(
+            os.path.join(self.experiment_path, f"{file_name}_profile.json")
+        )
+        total = summary["phases"]["total"]
+        if total:
+            print(
+                f"Step time: {total['mean_ms']:.2f}ms (mean), {total['p95_ms']:.2f}ms (p95), "
+                f"{summary['overruns']}/{summary['steps']} steps over the {summary['budget_ms']:.1f}ms budget"
+            )
+
+    def start_lockstep(self):
+        """
+        Run the simulation in a background thread on a simulated clock.
+        """
+        self.stop_lockstep()
+        self._lockstep_stop.clear()
+        self._lockstep_done.clear()
+        self._lockstep_thread = threading.Thread(target=self._run_lockstep, daemon=True)
+        self._lockstep_thread.start()
+        print(
+            f"Environment started in lockstep mode with path: {self.experiment_path}, "
+            f"duration: {self.experiment_duration}s at {self.fps} ticks/s"
+        )
+
+    def stop_lockstep(self):
+        if self._lockstep_thread is None:
+            return
+        self._lockstep_stop.set()
+        self._lockstep_thread.join()
+        self._lockstep_thread = None
+
+    def lockstep_done(self) -> bool:
+        """
+        Whether the lockstep simulation has reached the end of the experiment.
+        """
+        return self._lockstep_done.is_set()
+
+    def finished(self) -> bool:
+        """
+        Whether the simulation has reached the end of the experiment or was stopped early.
+        """
+        return self._stopped_early.is_set() or self.lockstep_done()
+
+    def check_early_termination(self):
+        """
+        Let the oracle evaluate the trajectories so far, and stop stepping if it gives a reason.
+        """
+        step = self.env.time_step
+        if self.oracle is None or self._stopped_early.is_set():
+            return
+        # the stall window of the oracle starts once every robot is running its code
+        if self.oracle.start_step is None and self.manager.all_robots_commanded():
+            self.oracle.start(step)
+        if not self.oracle.due(step):
+            return
+        reason = self.oracle.check(self.result.view())
+        if reason is None:
+            return
+        self.early_termination = {
+            "reason": reason,
+            "step": int(step),
+            "time": step / self.fps,
+        }
+        print(f"Experiment stopped early at step {step}: {reason}")
+        self._stopped_early.set()
+        if self.timer:
+            self.timer.shutdown()
+
+    def _wait_for_tick(self, tick: int, infos: dict) -> bool:
+        """
+        Wait until all robots have reported for the current tick, republishing the observation
+        so that late subscribers receive it. Robots that exceed the timeout are dropped.
+
+        Returns:
+            bool: False if the environment was stopped while waiting.
+        """
+        deadline = None
+        while not self._lockstep_stop.is_set():
+            if self.manager.wait_for_commands(timeout=0.1):
+                return True
+            if deadline is None and (tick > 0 or self.manager.has_reports()):
+                timeout = self.startup_timeout if tick == 0 else self.tick_timeout
+                deadline = time.time() + timeout
+            if deadline is not None and time.time() > deadline:
+                dropped = self.manager.drop_unreported_robots()
+                print(
+                    f"Lockstep: robots {dropped} missed tick {tick}, dropped from lockstep."
+                )
+                return True
+            self.manager.publish_observations(infos, tick=tick)
+        return False
+
+    def _run_lockstep(self):
+        total_ticks = int(round(self.experiment_duration * self.fps))
+        infos = self.env.get_observation()
+        self.manager.publish_observations(infos, tick=self.env.time_step)
+        try:
+            while not self._lockstep_stop.is_set():
+                if total_ticks and self.env.time_step >= total_ticks:
+                    break
+                if self._stopped_early.is_set():
+                    break
+                if not self._wait_for_tick(self.env.time_step, infos):
+                    break
+                self.manager.next_tick()
+                infos = self.step(None)
+        finally:
+            self._lockstep_done.set()
+            print(f"Lockstep simulation finished at tick {self.env.time_step}.")
 
     def step(self, event):
         """
@@ -200,14 +461,43 @@ class EnvironmentManager:
         Args:
             event: ROS Timer event that triggers this function.
         """
+        profiler = self.profiler
+        step_start = time.perf_counter()
         action = self.manager.robotID_velocity
         obs, reward, termination, truncation, infos = self.env.step(action=action)
-        for entity_id in infos:
-            if infos[entity_id]["moveable"]:
-                self.result[entity_id]["trajectory"].append(
-                    infos[entity_id]["position"]
-                )
-            if infos[entity_id]["state"] is not None:
-                self.result[entity_id]["states"].append(infos[entity_id]["state"])
-        self.frames.append(self.env.render())
-        self.manager.publish_observations(infos)
+        physics_end = time.perf_counter()
+        # env.step reports the observation building itself, the rest of it is physics
+        observation_time = profiler.current.get("observation", 0.0)
+        profiler.record("physics", physics_end - step_start - observation_time)
+
+        self.manager.telemetry.record_step(time.time(), self.env.time_step)
+        self.result.record(infos)
+        self.check_early_termination()
+        recording_end = time.perf_counter()
+        profiler.record("recording", recording_end - physics_end)
+
+        video = self.video
+        if video is not None:
+            if video.wants_frame():
+                video.write(self.env.render())
+            else:
+                video.skip()
+        render_end = time.perf_counter()
+        profiler.record("render", render_end - recording_end)
+
+        self.manager.publish_observations(infos, tick=self.env.time_step)
+        step_end = time.perf_counter()
+        profiler.record("publish", step_end - render_end)
+
+        # rospy.Timer passes the scheduled and the actual start time of the step
+        lateness = (
+            (event.current_real - event.current_expected).to_sec()
+            if event is not None and event.current_expected is not None
+            else 0.0
+        )
+        profiler.end_step(step_end - step_start, lateness)
+        if self.experiment_path is not None:
+            profiler.flush_rolling_stats(
+                os.path.join(self.experiment_path, "step_profile.json")
+            )
+        return infos
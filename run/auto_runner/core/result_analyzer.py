@@ -1,16 +1,183 @@
 import os
 import json
+import multiprocessing
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 import numpy as np
-import matplotlib.pyplot as plt
+from matplotlib import colormaps
+from matplotlib.figure import Figure
+from tqdm import tqdm
 
+from run.utils.experiment_data import ExperimentData
+from run.utils.metric_cache import is_cached, metric_cache_entry, metric_code_version
+from run.utils.result_store import (
+    load_analysis,
+    load_result_record,
+    save_experiment_result,
+    to_serializable,
+)
+from .trajectory_recorder import load_trajectory_recording
 
 # from streamlit import success
 
+# kept from the saved analysis when it is recomputed
+RUN_KEYS = ["run_result", "early_termination_reason", "early_termination_step"]
+
+# the analyzer of a spawned analysis worker, built by _init_analysis_worker
+_worker_analyzer = None
+
+
+def _init_analysis_worker(analysis_runner, success_conditions):
+    global _worker_analyzer
+    runner_class, env_config_path, tolerance = analysis_runner
+    runner = runner_class.for_analysis(env_config_path, tolerance)
+    _worker_analyzer = ExperimentAnalyzer(
+        None, success_conditions, analyze_result=runner.analyze_result
+    )
+
+
+def _reanalyze_in_worker(experiment_dir, name, code_version, analyzer=None):
+    try:
+        analyzer = analyzer or _worker_analyzer
+        return analyzer.reanalyze(experiment_dir, name, code_version), None
+    except Exception:
+        return None, traceback.format_exc()
+
 
 class ExperimentAnalyzer:
-    def __init__(self, experiment_path, success_conditions, tolerance=0.05):
+    def __init__(
+        self,
+        experiment_path,
+        success_conditions,
+        tolerance=0.05,
+        experiment_index=None,
+        index_key=None,
+        analyze_result=None,
+        max_workers=None,
+        analysis_runner=None,
+    ):
         self.experiment_path = experiment_path
         self.success_conditions = success_conditions
+        # ExperimentIndex and workspace key to read the metrics from instead of the result files
+        self.experiment_index = experiment_index
+        self.index_key = index_key
+        # analyze_result of the runner, to recompute the analyses whose trajectories or metrics changed
+        self.analyze_result = analyze_result
+        self.max_workers = max_workers
+        # (runner class, env config path, tolerance) to build the runner of analyze_result in
+        # spawned workers, which do not inherit the threads of its ROS node
+        self.analysis_runner = analysis_runner
+
+    def metric_code_version(self) -> str:
+        return metric_code_version(
+            self.analyze_result, extra=repr(self.success_conditions)
+        )
+
+    def reanalyze(self, experiment_dir, name, code_version) -> dict:
+        """
+        Recompute the analysis of a run from its saved trajectories and save it with its cache entry.
+        """
+        previous = load_analysis(experiment_dir, name) or {}
+        recording = load_trajectory_recording(os.path.join(experiment_dir, name))
+        analysis = self.analyze_result(ExperimentData(recording))
+        analysis.update({"success": self.calculate_success(analysis)})
+        # facts of the run itself rather than metrics of its trajectories
+        for key in RUN_KEYS:
+            if key in previous:
+                analysis[key] = previous[key]
+        save_experiment_result(
+            experiment_dir,
+            name,
+            recording,
+            analysis,
+            metric_cache=metric_cache_entry(
+                os.path.join(experiment_dir, f"{name}.npz"), code_version
+            ),
+        )
+        return to_serializable(analysis)
+
+    def update_analyses(self, experiment_dirs, name) -> dict[str, dict]:
+        """
+        Recompute in a process pool the analyses saved as {name}.json whose trajectory file or
+        metric code changed since they were computed, and index them.
+
+        Returns:
+            dict[str, dict]: The recomputed analyses, by experiment.
+        """
+        if self.analyze_result is None:
+            return {}
+        code_version = self.metric_code_version()
+        stale = []
+        for experiment in experiment_dirs:
+            experiment_dir = os.path.join(self.experiment_path, experiment)
+            trajectory_path = os.path.join(experiment_dir, f"{name}.npz")
+            if not os.path.exists(trajectory_path):
+                continue
+            record = load_result_record(experiment_dir, name) or {}
+            if not is_cached(record.get("metric_cache"), trajectory_path, code_version):
+                stale.append(experiment)
+        if not stale:
+            return {}
+
+        updated = {}
+        tasks = {
+            experiment: (
+                os.path.join(self.experiment_path, experiment),
+                name,
+                code_version,
+            )
+            for experiment in stale
+        }
+        parallel = (
+            self.analysis_runner is not None
+            and self.max_workers != 1
+            and len(stale) > 1
+        )
+        if not parallel:
+            for experiment, task in tqdm(tasks.items(), desc=f"Analyzing {name}"):
+                self._collect(
+                    updated, experiment, *_reanalyze_in_worker(*task, analyzer=self)
+                )
+        else:
+            with ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_analysis_worker,
+                initargs=(self.analysis_runner, self.success_conditions),
+            ) as executor:
+                futures = {
+                    executor.submit(_reanalyze_in_worker, *task): experiment
+                    for experiment, task in tasks.items()
+                }
+                for future in tqdm(
+                    as_completed(futures),
+                    total=len(futures),
+                    desc=f"Analyzing {name}",
+                ):
+                    self._collect(updated, futures[future], *future.result())
+
+        if self.experiment_index is not None and updated:
+            self.experiment_index.record_many(self.index_key, name, updated)
+        print(
+            f"Reanalyzed {len(updated)} of {len(experiment_dirs)} experiments for {name}"
+        )
+        return updated
+
+    @staticmethod
+    def _collect(updated, experiment, analysis, error):
+        if error is not None:
+            print(f"Failed to analyze {experiment}:\n{error}")
+        else:
+            updated[experiment] = analysis
+
+    def load_analyses(self, file) -> dict[str, dict]:
+        if self.experiment_index is None or file == "vlm.json":
+            return {}
+        indexed = self.experiment_index.results(
+            self.index_key, os.path.splitext(file)[0]
+        )
+        return {experiment: row["metrics"] for experiment, row in indexed.items()}
 
     def calculate_success(self, analysis):
         success = True
@@ -24,32 +191,52 @@ class ExperimentAnalyzer:
                 break
         return success
 
-    def analyze_all_results(self, experiment_dirs=None, target_file=['wo_vlm.json'],
-                            only_success: bool = False):
+    def analyze_all_results(
+        self,
+        experiment_dirs=None,
+        target_file=["wo_vlm.json"],
+        only_success: bool = False,
+    ):
         exp_data = {experiment: {} for experiment in experiment_dirs}
         all_metric_names = []
+        for file in target_file:
+            if file != "vlm.json":
+                self.update_analyses(experiment_dirs, os.path.splitext(file)[0])
+        indexed_analyses = {file: self.load_analyses(file) for file in target_file}
 
         for experiment in experiment_dirs:
-            combined_success = False  # Initialize combined success as False for each experiment
-            first_file_data = None  # Variable to store the first file's data for non-success metrics
+            combined_success = (
+                False  # Initialize combined success as False for each experiment
+            )
+            first_file_data = (
+                None  # Variable to store the first file's data for non-success metrics
+            )
             analysis = {}
             for file in target_file:
                 result_path = os.path.join(self.experiment_path, experiment, file)
-                if os.path.exists(result_path):
-                    with open(result_path, 'r') as f:
-                        result_data = json.load(f)
-                        if file == 'vlm.json':
-                            success = result_data.get('success', False)
-                            combined_success = combined_success or success
-                        else:
-                            analysis = result_data.get('analysis', {})
-                            success = analysis.get('success', False)
-                            combined_success = combined_success or success  # Logical OR with the existing combined success
+                if experiment in indexed_analyses[file]:
+                    analysis = indexed_analyses[file][experiment]
+                    success = analysis.get("success", False)
+                    combined_success = combined_success or success
+                elif os.path.exists(result_path):
+                    if file == "vlm.json":
+                        with open(result_path, "r") as f:
+                            success = json.load(f).get("success", False)
+                        combined_success = combined_success or success
+                    else:
+                        analysis = load_analysis(
+                            os.path.join(self.experiment_path, experiment),
+                            os.path.splitext(file)[0],
+                        )
+                        success = analysis.get("success", False)
+                        combined_success = (
+                            combined_success or success
+                        )  # Logical OR with the existing combined success
                 else:
                     print(f"File {result_path} not found.")
                     # if file == 'improve.json':
                     #     combined_success = True
-            data = {**analysis, 'success': combined_success}
+            data = {**analysis, "success": combined_success}
 
             exp_data[experiment] = data
             all_metric_names = list(data.keys())
@@ -68,16 +255,18 @@ class ExperimentAnalyzer:
 
         # Plotting results
         for metric in all_metric_names:
-            if only_success and metric != 'success':
+            if only_success and metric != "success":
                 continue
             data = [
-                exp_data[exp].get(metric, 0) if isinstance(exp_data[exp].get(metric, 0), (int, float)) else 0
+                exp_data[exp].get(metric, 0)
+                if isinstance(exp_data[exp].get(metric, 0), (int, float))
+                else 0
                 for exp in exp_data.keys()
             ]
-            filename = f'{metric}_metric.png'
+            filename = f"{metric}_metric.png"
 
-            if metric == 'success':
-                filename = 'success_' + '_'.join(target_file) + '.png'
+            if metric == "success":
+                filename = "success_" + "_".join(target_file) + ".png"
             self.plot_and_print_results(
                 data=data,
                 labels=exp_data.keys(),
@@ -87,73 +276,105 @@ class ExperimentAnalyzer:
                 save_filename=filename,
                 rotation=True,
                 figsize=(32, 20),
-                success_conditions=self.success_conditions
+                success_conditions=self.success_conditions,
             )
 
-        self.plot_summary(mean_metric_value, file_name='_'.join(target_file))
+        self.plot_summary(mean_metric_value, file_name="_".join(target_file))
 
     def plot_summary(self, exp_data, file_name):
         labels = list(exp_data.keys())
         data = list(exp_data.values())
-        colors = ['blue']
+        colors = ["blue"]
 
         self.plot_and_print_results(
             data=data,
             labels=labels,
-            ylabel='Average Value',
-            title='Summary of All Metric Averages',
+            ylabel="Average Value",
+            title="Summary of All Metric Averages",
             colors=colors,
-            save_filename=f'summary_metrics_{file_name}.png',
+            save_filename=f"summary_metrics_{file_name}.png",
             rotation=False,
-            figsize=(32, 20)  # 传入图像大小参数
+            figsize=(32, 20),  # 传入图像大小参数
         )
 
     @staticmethod
     def get_color(index, total):
-        cmap = plt.get_cmap('viridis')
+        cmap = colormaps["viridis"]
         return cmap(index / total)
 
     def analyze_code(self, functions_path):
         from modules.utils import CodeAnalyzer
-        with open(functions_path, 'r') as f:
+
+        with open(functions_path, "r") as f:
             analyzer = CodeAnalyzer(f.read())
             analysis_result = analyzer.analyze()
         return analysis_result["code_lines"]
 
-    def plot_and_print_results(self, data, labels, ylabel, title, colors, save_filename, rotation=False,
-                               figsize=(10, 6), success_conditions=None):  # 添加figsize参数
+    def plot_and_print_results(
+        self,
+        data,
+        labels,
+        ylabel,
+        title,
+        colors,
+        save_filename,
+        rotation=False,
+        figsize=(10, 6),
+        success_conditions=None,
+    ):  # 添加figsize参数
         if rotation:
             rotation = -90
         else:
             rotation = 0
 
-        plt.figure(figsize=figsize)  # 使用传入的figsize设置图像大小
-        plt.bar(labels, data, color=colors)
-        plt.xticks(rotation=rotation)
-        plt.ylabel(ylabel)
-        plt.title(title)
-
-        if success_conditions:
-            for condition in success_conditions:
-                metric, operator, threshold = condition
-                if metric == ylabel:
-                    plt.axhline(y=threshold, color='r', linestyle='--', label=f"Success threshold ({threshold})")
-
-        for i, v in enumerate(data):
-            plt.text(i, v + 0.01, f"{v:.2f}", ha='center', rotation=rotation)
+        thresholds = [
+            threshold
+            for metric, operator, threshold in (success_conditions or [])
+            if metric == ylabel
+        ]
 
         if not os.path.exists(f"{self.experiment_path}/pic"):
             os.makedirs(f"{self.experiment_path}/pic")
         plt_path = os.path.join(f"{self.experiment_path}/pic", save_filename)
-        txt_path = os.path.join(f"{self.experiment_path}/pic", save_filename.replace('.png', '.txt'))
+        txt_path = os.path.join(
+            f"{self.experiment_path}/pic", save_filename.replace(".png", ".txt")
+        )
+        summary = (
+            "Summary of All Metric Averages\n"
+            + "".join(f"{label}: {value}\n" for label, value in zip(labels, data))
+            + "".join(f"Success threshold: {threshold}\n" for threshold in thresholds)
+        )
+        # the plot is only drawn again when its values changed
+        if os.path.exists(plt_path) and os.path.exists(txt_path):
+            with open(txt_path, "r") as file:
+                if file.read() == summary:
+                    print(f"{title}: {data}")
+                    return
         # 保存结果到 txt 文件
-        with open(txt_path, 'w') as file:
-            file.write("Summary of All Metric Averages\n")
-            for label, value in zip(labels, data):
-                file.write(f"{label}: {value}\n")
-
-        plt.tight_layout()
-        plt.legend()
-        plt.savefig(plt_path)
-        plt.show()
+        with open(txt_path, "w") as file:
+            file.write(summary)
+
+        # drawn on an Agg canvas without pyplot, nothing is shown
+        fig = Figure(figsize=figsize)  # 使用传入的figsize设置图像大小
+        ax = fig.subplots()
+        ax.bar(list(labels), data, color=colors)
+        ax.tick_params(axis="x", labelrotation=rotation)
+        ax.set_ylabel(ylabel)
+        ax.set_title(title)
+
+        for threshold in thresholds:
+            ax.axhline(
+                y=threshold,
+                color="r",
+                linestyle="--",
+                label=f"Success threshold ({threshold})",
+            )
+
+        for i, v in enumerate(data):
+            ax.text(i, v + 0.01, f"{v:.2f}", ha="center", rotation=rotation)
+
+        fig.tight_layout()
+        if thresholds:
+            ax.legend()
+        fig.savefig(plt_path)
         print(f"{title}: {data}")
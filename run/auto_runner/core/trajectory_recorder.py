@@ -0,0 +1,277 @@
+import json
+import os
+import pickle
+from collections.abc import Mapping
+
+import numpy as np
+
+
+def _to_json(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (np.floating, np.integer)):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return [_to_json(item) for item in value]
+    return value
+
+
+class TrajectoryRecorder:
+    """
+    Record the trajectories of all entities into preallocated arrays.
+
+    Positions and velocities are kept in (T, N, 2) arrays and states in a (T, N) array of
+    codes into a vocabulary of state strings; the arrays grow by `chunk_size` steps when full.
+    Like the dict-of-lists result it replaces, an entity gets a new trajectory point only in
+    steps where it is moveable and a new state only when its state is not None, so each
+    entity has its own length.
+    """
+
+    def __init__(self, infos: dict, dt: float, chunk_size: int = 1024):
+        self.dt = dt
+        self.chunk_size = chunk_size
+        self.ids = list(infos)
+        self.column = {entity_id: i for i, entity_id in enumerate(self.ids)}
+        self.meta = {
+            "dt": dt,
+            "ids": [_to_json(entity_id) for entity_id in self.ids],
+            "sizes": [_to_json(infos[entity_id]["size"]) for entity_id in self.ids],
+            "targets": [
+                _to_json(infos[entity_id]["target_position"]) for entity_id in self.ids
+            ],
+            "types": [infos[entity_id]["type"] for entity_id in self.ids],
+            "colors": [
+                _to_json(infos[entity_id].get("color")) for entity_id in self.ids
+            ],
+        }
+        num_entities = len(self.ids)
+        self.positions = np.zeros((chunk_size, num_entities, 2))
+        self.velocities = np.zeros((chunk_size, num_entities, 2))
+        self.lengths = np.zeros(num_entities, dtype=np.int64)
+        self.state_codes = np.full((chunk_size, num_entities), -1, dtype=np.int16)
+        self.state_lengths = np.zeros(num_entities, dtype=np.int64)
+        self.state_vocabulary = []
+        self._state_index = {}
+
+        # the initial position of every entity is the first trajectory point
+        columns = np.arange(num_entities)
+        self._append(
+            columns,
+            [infos[entity_id]["position"] for entity_id in self.ids],
+            [infos[entity_id].get("velocity", (0.0, 0.0)) for entity_id in self.ids],
+        )
+
+    def _grow(self, needed: int):
+        capacity = len(self.positions)
+        if needed <= capacity:
+            return
+        new_capacity = capacity + max(self.chunk_size, needed - capacity)
+        extra = new_capacity - capacity
+        self.positions = np.concatenate(
+            [self.positions, np.zeros((extra,) + self.positions.shape[1:])]
+        )
+        self.velocities = np.concatenate(
+            [self.velocities, np.zeros((extra,) + self.velocities.shape[1:])]
+        )
+        self.state_codes = np.concatenate(
+            [
+                self.state_codes,
+                np.full((extra,) + self.state_codes.shape[1:], -1, dtype=np.int16),
+            ]
+        )
+
+    def _append(self, columns: np.ndarray, positions: list, velocities: list):
+        if len(columns) == 0:
+            return
+        rows = self.lengths[columns]
+        self._grow(int(rows.max()) + 1)
+        self.positions[rows, columns] = positions
+        self.velocities[rows, columns] = velocities
+        self.lengths[columns] += 1
+
+    def _state_code(self, state) -> int:
+        if state not in self._state_index:
+            self._state_index[state] = len(self.state_vocabulary)
+            self.state_vocabulary.append(state)
+        return self._state_index[state]
+
+    def record(self, infos: dict):
+        """
+        Record one environment step from the infos returned by env.step.
+        """
+        columns, positions, velocities = [], [], []
+        state_columns, states = [], []
+        for entity_id, info in infos.items():
+            column = self.column.get(entity_id)
+            if column is None:
+                continue
+            if info["moveable"]:
+                columns.append(column)
+                positions.append(info["position"])
+                velocities.append(info.get("velocity", (0.0, 0.0)))
+            if info["state"] is not None:
+                state_columns.append(column)
+                states.append(self._state_code(info["state"]))
+        self._append(np.array(columns, dtype=np.int64), positions, velocities)
+        if state_columns:
+            state_columns = np.array(state_columns, dtype=np.int64)
+            rows = self.state_lengths[state_columns]
+            self._grow(int(rows.max()) + 1)
+            self.state_codes[rows, state_columns] = states
+            self.state_lengths[state_columns] += 1
+
+    def arrays(self) -> dict[str, np.ndarray]:
+        steps = int(max(self.lengths.max(initial=0), self.state_lengths.max(initial=0)))
+        return {
+            "positions": self.positions[:steps],
+            "velocities": self.velocities[:steps],
+            "lengths": self.lengths,
+            "state_codes": self.state_codes[:steps],
+            "state_lengths": self.state_lengths,
+            "state_vocabulary": np.array(
+                json.dumps([_to_json(state) for state in self.state_vocabulary])
+            ),
+            "meta": np.array(json.dumps(self.meta)),
+        }
+
+    def save(self, path: str):
+        """
+        Save the recording as an uncompressed .npz file, see load_trajectory_recording.
+        """
+        np.savez(path, **self.arrays())
+
+    def view(self) -> "TrajectoryRecording":
+        return TrajectoryRecording(self.arrays())
+
+
+class TrajectoryRecording(Mapping):
+    """
+    Read-only dict-of-entities view of a recording, in the format of the old result dict:
+    recording[entity_id] = {"size", "target", "trajectory", "type", "states", "dt"}.
+    Trajectories are (length, 2) views into the positions array, built on first access.
+    """
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.meta = json.loads(str(arrays["meta"]))
+        self.ids = self.meta["ids"]
+        self.column = {entity_id: i for i, entity_id in enumerate(self.ids)}
+        self._entities = {}
+        self._state_vocabulary = None
+
+    @property
+    def positions(self) -> np.ndarray:
+        return self.arrays["positions"]
+
+    @property
+    def velocities(self) -> np.ndarray:
+        return self.arrays["velocities"]
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return self.arrays["lengths"]
+
+    def _states(self, column: int) -> list:
+        if self._state_vocabulary is None:
+            self._state_vocabulary = json.loads(str(self.arrays["state_vocabulary"]))
+        length = self.arrays["state_lengths"][column]
+        codes = self.arrays["state_codes"][:length, column]
+        return [self._state_vocabulary[code] for code in codes]
+
+    def __getitem__(self, entity_id) -> dict:
+        if entity_id not in self._entities:
+            column = self.column[entity_id]
+            target = self.meta["targets"][column]
+            self._entities[entity_id] = {
+                "size": self.meta["sizes"][column],
+                "target": np.array(target) if target is not None else None,
+                "trajectory": self.positions[: self.lengths[column], column],
+                "type": self.meta["types"][column],
+                "states": self._states(column),
+                "dt": self.meta["dt"],
+            }
+        return self._entities[entity_id]
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+def recording_arrays(result) -> dict[str, np.ndarray]:
+    """
+    Arrays of a simulation result in the .npz format of TrajectoryRecorder.save, for results
+    loaded from the .pkl files of older runs.
+    """
+    if isinstance(result, TrajectoryRecording):
+        return result.arrays
+    ids = list(result)
+    entities = [result[entity_id] for entity_id in ids]
+    trajectories = [
+        np.asarray(entity["trajectory"], dtype=float).reshape(-1, 2)
+        for entity in entities
+    ]
+    lengths = np.array([len(trajectory) for trajectory in trajectories], dtype=np.int64)
+    state_vocabulary, state_index = [], {}
+    state_lists = []
+    for entity in entities:
+        codes = []
+        for state in entity.get("states", []):
+            if state not in state_index:
+                state_index[state] = len(state_vocabulary)
+                state_vocabulary.append(state)
+            codes.append(state_index[state])
+        state_lists.append(codes)
+    state_lengths = np.array([len(codes) for codes in state_lists], dtype=np.int64)
+    steps = int(max(lengths.max(initial=0), state_lengths.max(initial=0)))
+    positions = np.zeros((steps, len(ids), 2))
+    state_codes = np.full((steps, len(ids)), -1, dtype=np.int16)
+    for column, (trajectory, codes) in enumerate(zip(trajectories, state_lists)):
+        positions[: len(trajectory), column] = trajectory
+        state_codes[: len(codes), column] = codes
+    meta = {
+        "dt": entities[0]["dt"] if entities else None,
+        "ids": [_to_json(entity_id) for entity_id in ids],
+        "sizes": [_to_json(entity["size"]) for entity in entities],
+        "targets": [_to_json(entity["target"]) for entity in entities],
+        "types": [entity["type"] for entity in entities],
+        # the renderer keeps the colors of the env config for the entities without one
+        "colors": [_to_json(entity.get("color")) for entity in entities],
+    }
+    return {
+        "positions": positions,
+        # velocities were not kept in the old format
+        "velocities": np.zeros_like(positions),
+        "lengths": lengths,
+        "state_codes": state_codes,
+        "state_lengths": state_lengths,
+        "state_vocabulary": np.array(
+            json.dumps([_to_json(state) for state in state_vocabulary])
+        ),
+        "meta": np.array(json.dumps(meta)),
+    }
+
+
+def save_trajectory_result(path: str, result):
+    """
+    Save a simulation result, recorded or loaded from an old .pkl file, as {path}.npz.
+    """
+    np.savez(f"{path}.npz", **recording_arrays(result))
+
+
+def load_trajectory_recording(path: str):
+    """
+    Load a simulation result saved by EnvironmentManager. `path` is the file name without
+    extension: {path}.npz is preferred, results of older runs are read from {path}.pkl.
+
+    Returns:
+        The dict-of-entities result, or None if neither file exists.
+    """
+    if os.path.exists(f"{path}.npz"):
+        with np.load(f"{path}.npz") as data:
+            return TrajectoryRecording({key: data[key] for key in data.files})
+    if os.path.exists(f"{path}.pkl"):
+        with open(f"{path}.pkl", "rb") as f:
+            return pickle.load(f)
+    return None
@@ -0,0 +1,150 @@
+import os
+from collections.abc import Iterator
+
+import numpy as np
+
+from modules.deployment.gymnasium_env import GymnasiumEnvironmentBase
+from modules.utils.media import VideoStreamWriter
+from .trajectory_recorder import load_trajectory_recording
+
+
+def _recording_dt(recording) -> float:
+    if hasattr(recording, "meta"):
+        return recording.meta["dt"]
+    return next(iter(recording.values()))["dt"]
+
+
+def _recording_colors(recording) -> dict:
+    if hasattr(recording, "meta"):
+        colors = dict(zip(recording.ids, recording.meta.get("colors") or []))
+    else:
+        # dict-of-entities result of an older run, loaded from its .pkl file
+        colors = {
+            entity_id: entity.get("color") for entity_id, entity in recording.items()
+        }
+    return {
+        entity_id: tuple(color) if isinstance(color, list) else color
+        for entity_id, color in colors.items()
+        if color is not None
+    }
+
+
+def replay_frames(
+    env: GymnasiumEnvironmentBase, recording, frame_interval: int = 1
+) -> Iterator[np.ndarray]:
+    """
+    Render a saved simulation result step by step without running the simulation.
+
+    The entities created by env.reset() are moved to their recorded positions before each
+    frame is drawn, so the env has to be built from the config the experiment ran with.
+    Entities that are not in the recording keep their reset positions.
+
+    Args:
+        env: The environment the experiment ran in, its render_mode must not be None.
+        recording: The result returned by load_trajectory_recording.
+        frame_interval (int): Render only every frame_interval-th step.
+
+    Yields:
+        np.ndarray: The RGB frame of each rendered step.
+    """
+    env.reset()
+    colors = _recording_colors(recording)
+    replayed = []
+    for entity in env.entities:
+        if entity.id not in recording:
+            continue
+        trajectory = np.asarray(recording[entity.id]["trajectory"], dtype=float)
+        if len(trajectory) == 0:
+            continue
+        if entity.id in colors:
+            entity.color = colors[entity.id]
+        replayed.append((entity, trajectory))
+    if not replayed:
+        return
+
+    steps = max(len(trajectory) for _, trajectory in replayed)
+    for step in range(0, steps, max(1, int(frame_interval))):
+        for entity, trajectory in replayed:
+            _move(entity, trajectory[min(step, len(trajectory) - 1)])
+        yield env.render()
+
+
+def _move(entity, position: np.ndarray):
+    # static entities refuse position updates, they are only moved to where the run placed them
+    moveable = entity.moveable
+    if not moveable:
+        entity.moveable = True
+    entity.position = position
+    if not moveable:
+        entity.moveable = False
+
+
+def render_recording(
+    env: GymnasiumEnvironmentBase,
+    recording,
+    output_path: str,
+    keyframe_interval: float = None,
+    scale: float = 1.0,
+) -> int:
+    """
+    Render a saved simulation result to an MP4 file.
+
+    Args:
+        env: The environment the experiment ran in.
+        recording: The result returned by load_trajectory_recording.
+        output_path (str): The MP4 file to write.
+        keyframe_interval (float): If set, render one frame every keyframe_interval simulated
+            seconds and play them at one frame per keyframe_interval, so that sampling the video
+            every keyframe_interval seconds, as VideoCriticize does, yields exactly these frames.
+        scale (float): Resize factor of the frames.
+
+    Returns:
+        int: The number of frames written.
+    """
+    dt = _recording_dt(recording)
+    fps = 1.0 / dt
+    frame_interval = 1
+    if keyframe_interval:
+        frame_interval = max(1, round(keyframe_interval / dt))
+        fps = fps / frame_interval
+    writer = VideoStreamWriter(output_path, fps=fps, scale=scale)
+    try:
+        for frame in replay_frames(env, recording, frame_interval=frame_interval):
+            writer.write(frame)
+    finally:
+        frames = writer.close()
+    return frames
+
+
+def render_experiment(
+    env: GymnasiumEnvironmentBase,
+    experiment_path: str,
+    result_name: str,
+    keyframe_interval: float = None,
+    scale: float = 1.0,
+    overwrite: bool = False,
+) -> str | None:
+    """
+    Render {experiment_path}/{result_name}.npz (or .pkl) to {result_name}.mp4, or to
+    {result_name}_keyframes.mp4 when keyframe_interval is set.
+
+    Returns:
+        str | None: The path of the video, None if the experiment has no saved result.
+    """
+    recording = load_trajectory_recording(os.path.join(experiment_path, result_name))
+    if recording is None:
+        return None
+    suffix = "_keyframes" if keyframe_interval else ""
+    output_path = os.path.join(experiment_path, f"{result_name}{suffix}.mp4")
+    if os.path.exists(output_path) and not overwrite:
+        return output_path
+    temporary_path = os.path.join(experiment_path, f".render_{os.getpid()}.mp4")
+    frames = render_recording(
+        env, recording, temporary_path, keyframe_interval=keyframe_interval, scale=scale
+    )
+    if frames == 0:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        return None
+    os.replace(temporary_path, output_path)
+    return output_path
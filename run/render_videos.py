@@ -0,0 +1,172 @@
+"""
+Copyright (c) 2024 WindyLab of Westlake University, China
+All rights reserved.
+
+This software is provided "as is" without warranty of any kind, either
+express or implied, including but not limited to the warranties of
+merchantability, fitness for a particular purpose, or non-infringement.
+In no event shall the authors or copyright holders be liable for any
+claim, damages, or other liability, whether in an action of contract,
+tort, or otherwise, arising from, out of, or in connection with the
+software or the use or other dealings in the software.
+"""
+
+import os
+
+# render off-screen, also in the worker processes
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from tqdm import tqdm
+
+from modules.deployment.gymnasium_env import (
+    GymnasiumAggregationEnvironment,
+    GymnasiumBridgingEnvironment,
+    GymnasiumClusteringEnvironment,
+    GymnasiumCoveringEnvironment,
+    GymnasiumCrossingEnvironment,
+    GymnasiumEncirclingEnvironment,
+    GymnasiumExplorationEnvironment,
+    GymnasiumFlockingEnvironment,
+    GymnasiumPursuingEnvironment,
+    GymnasiumShapingEnvironment,
+)
+from modules.utils import root_manager
+from run.auto_runner.core import render_experiment
+
+
+def env_mapping(task_name: str, env_config_path: str):
+    # same environments as the auto runners of run_code.py
+    if task_name == "crossing":
+        return GymnasiumCrossingEnvironment(env_config_path, radius=2.20)
+    env_dict = {
+        "exploration": GymnasiumExplorationEnvironment,
+        "flocking": GymnasiumFlockingEnvironment,
+        "shaping": GymnasiumShapingEnvironment,
+        "bridging": GymnasiumBridgingEnvironment,
+        "aggregation": GymnasiumAggregationEnvironment,
+        "encircling": GymnasiumEncirclingEnvironment,
+        "covering": GymnasiumCoveringEnvironment,
+        "clustering": GymnasiumClusteringEnvironment,
+        "pursuing": GymnasiumPursuingEnvironment,
+    }
+    return env_dict[task_name](env_config_path)
+
+
+_env = None
+
+
+def _init_worker(task_name: str, env_config_path: str):
+    global _env
+    _env = env_mapping(task_name, env_config_path)
+    if _env.render_mode is None:
+        _env.render_mode = "rgb_array"
+
+
+def _render(
+    experiment_path: str, result_name: str, keyframe_interval, scale, overwrite
+):
+    try:
+        video_path = render_experiment(
+            _env,
+            experiment_path,
+            result_name,
+            keyframe_interval=keyframe_interval,
+            scale=scale,
+            overwrite=overwrite,
+        )
+        return experiment_path, video_path, None
+    except Exception:
+        return experiment_path, None, traceback.format_exc()
+
+
+def render_videos(
+    task_name: str,
+    env_config_path: str,
+    workspace_path,
+    result_name: str,
+    experiments: list[str] = None,
+    keyframe_interval: float = None,
+    scale: float = 1.0,
+    overwrite: bool = False,
+    max_workers: int = None,
+):
+    """
+    Render the videos of saved experiments in parallel, one environment per worker process.
+    """
+    if not experiments:
+        experiments = sorted(
+            item
+            for item in os.listdir(workspace_path)
+            if os.path.isdir(os.path.join(workspace_path, item))
+            and item not in ["pic", "real"]
+        )
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_init_worker,
+        initargs=(task_name, env_config_path),
+    ) as executor:
+        futures = [
+            executor.submit(
+                _render,
+                os.path.join(workspace_path, experiment),
+                result_name,
+                keyframe_interval,
+                scale,
+                overwrite,
+            )
+            for experiment in experiments
+        ]
+        for future in tqdm(
+            as_completed(futures), total=len(futures), desc="Rendering videos"
+        ):
+            experiment_path, video_path, error = future.result()
+            if error is not None:
+                print(f"Failed to render {experiment_path}:\n{error}")
+            elif video_path is None:
+                print(f"No saved result in {experiment_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Render the videos of finished experiments from their saved trajectories."
+    )
+    parser.add_argument("--task_name", type=str, default="encircling")
+    parser.add_argument("--task_path", type=str, default="", help="The workspace path")
+    parser.add_argument(
+        "--result_name",
+        type=str,
+        default="wo_vlm",
+        help="The saved result to render, e.g. wo_vlm or debug",
+    )
+    parser.add_argument("--experiments", type=str, nargs="*", default=None)
+    parser.add_argument(
+        "--keyframe_interval",
+        type=float,
+        default=None,
+        help="Only render one frame every this many seconds, e.g. 0.5 for VideoCriticize",
+    )
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--overwrite", action="store_true")
+    parser.add_argument("--max_workers", type=int, default=None)
+    args = parser.parse_args()
+
+    render_videos(
+        task_name=args.task_name,
+        env_config_path=f"config/env/{args.task_name}_config.json",
+        workspace_path=root_manager.project_root
+        / f"workspace/{args.task_path}/{args.task_name}",
+        result_name=args.result_name,
+        experiments=args.experiments,
+        keyframe_interval=args.keyframe_interval,
+        scale=args.scale,
+        overwrite=args.overwrite,
+        max_workers=args.max_workers,
+    )
+
+
+if __name__ == "__main__":
+    main()
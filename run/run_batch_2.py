@@ -1,10 +1,14 @@
-import logging
+import argparse
 import os
-import subprocess
-import time
 
-from tqdm import tqdm
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from run.run_code import workspace_path_of
+from run.utils.batch_service import (
+    BatchService,
+    ExperimentJob,
+    add_sweep_arguments,
+    sweep_of,
+)
+from run.utils.experiment_selector import ExperimentSelector
 
 task_keys = [
     # "exploration",
@@ -22,7 +26,7 @@ task_keys = [
 test_modes = [
     # 'cap',
     # 'meta'
-    'wo_vlm'
+    "wo_vlm"
     # 'debug'
     # 'vlm'
     # 'improve'
@@ -32,7 +36,7 @@ test_modes = [
 run_modes = [
     # 'rerun',
     # 'continue',
-    'fail_rerun',
+    "fail_rerun",
     # 'rerun',
     # 'fail_rerun',
     # 'analyze',
@@ -40,46 +44,63 @@ run_modes = [
 # run_modes = [
 #     'analyze',
 # ]
-MAX_THREADS = 1  # Set the maximum number of threads you want to run concurrently
+MAX_THREADS = (
+    4  # Set the maximum number of worker processes you want to run concurrently
+)
+# the workspaces of the tasks, relative to workspace/
+task_paths = ["different_model/claude-3.7"]
 
 
-def run_batch(batch_num, task_name, run_mode, test_mode, task_path):
-    print(f"Running batch {batch_num} for task {task_name}...")
-    result = subprocess.run(["python", "run/run_code.py", "--exp_batch", str(batch_num), "--task_name", task_name,
-                             '--run_mode', run_mode, '--test_mode', test_mode, '--task_path', 'different_model/claude-3.7'], )
-    if result.returncode != 0:
-        print(f"Batch {batch_num} encountered an error.")
-    return result.returncode
+def collect_jobs(run_mode) -> list[ExperimentJob]:
+    """
+    The experiments the run mode applies to in every workspace of the sweep, grouped by task.
+    """
+    jobs = []
+    for task_name in task_keys:
+        for test_mode in test_modes:
+            for task_path in task_paths:
+                if run_mode == "analyze":
+                    jobs.append(
+                        ExperimentJob(
+                            task_name, test_mode, task_path, run_mode=run_mode
+                        )
+                    )
+                    continue
+                selector = ExperimentSelector(
+                    workspace_path_of(task_name, test_mode, task_path),
+                    run_mode=run_mode,
+                    test_mode=test_mode,
+                )
+                if not os.path.isdir(selector.experiment_path):
+                    print(f"Workspace {selector.experiment_path} not found.")
+                    continue
+                jobs += [
+                    ExperimentJob(task_name, test_mode, task_path, experiment, run_mode)
+                    for experiment in selector.select_experiments()
+                ]
+    return jobs
 
 
-def run_batches(task_name, run_mode, test_mode):
-    batch_numbers = range(1, 101)  # Adjust range as needed
-    with ThreadPoolExecutor(max_workers=MAX_THREADS) as executor:
-        # Submit all batches to the executor and create progress bar
-        future_to_batch = {executor.submit(run_batch, batch_num, task_name, run_mode, test_mode,
-                                           task_path=f''): batch_num for
-                           batch_num in
-                           batch_numbers}
-        for future in tqdm(as_completed(future_to_batch), total=len(batch_numbers),
-                           desc=f"Running {task_name} batches"):
-            batch_num = future_to_batch[future]
-            try:
-                return_code = future.result()
-                if return_code != 0:
-                    print(f"Batch {batch_num} encountered an error and stopped.")
-                    break
-            except Exception as exc:
-                print(f"Batch {batch_num} generated an exception: {exc}")
-
-
-def run_tasks():
+def run_tasks(args):
+    # the environment of each task is built once per worker instead of once per batch
+    service = BatchService(max_workers=MAX_THREADS)
     for run_mode in run_modes:
         print(f"Running tasks in {run_mode} mode...")
-        for task_name in task_keys:
-            print(f"Running task {task_name}...")
-            for test_mode in test_modes:
-                run_batches(task_name, run_mode, test_mode)
+        sweep = sweep_of(args.sweep, run_mode)
+        if args.reset:
+            service.work_queue.reset(sweep)
+        if args.retry_failed:
+            service.work_queue.retry_failed(sweep)
+        # continue adds the experiments without a result to the rerun sweep and resumes it
+        service.run(
+            sweep,
+            collect_jobs(run_mode),
+            priority=args.priority,
+            restart=run_mode != "continue",
+        )
 
 
 if __name__ == "__main__":
-    run_tasks()
+    parser = argparse.ArgumentParser(description="Run the experiments of the sweep.")
+    add_sweep_arguments(parser, os.path.splitext(os.path.basename(__file__))[0])
+    run_tasks(parser.parse_args())
@@ -15,6 +15,7 @@ import subprocess
 import time
 
 from run.auto_runner import *
+from run.utils.ros_master import IsolatedRosMaster
 import argparse
 
 
@@ -38,6 +39,47 @@ def config_mapping(task_name: str) -> str:
     return task_name + "_config.json"
 
 
+def workspace_path_of(task_name: str, test_mode: str, task_path: str) -> str:
+    """
+    The workspace of a task relative to workspace/, e.g. "gpt-4o/structured_default/flocking".
+    """
+    if test_mode in ["cap", "meta", "llm2swarm"]:
+        return f"comparative/" + test_mode + f"/{task_path}/" + task_name
+    return f"{task_path}/" + task_name
+
+
+def build_runner(
+    task_name: str,
+    test_mode: str,
+    task_path: str,
+    run_mode: str = "rerun",
+    exp_batch: int = 1,
+    batch_size: int = 1,
+) -> AutoRunnerBase:
+    """
+    Build the runner of a task with its environment, which starts the ROS node of this process.
+    """
+    runner_class = task_mapping(task_name)
+    config_file = config_mapping(task_name)
+    if test_mode == "real":
+        env_config_path = f"config/real_env/{config_file}"
+        experiment_duration = 50
+    else:
+        env_config_path = f"config/env/{config_file}"
+        experiment_duration = 15
+    return runner_class(
+        env_config_path=env_config_path,
+        workspace_path=workspace_path_of(task_name, test_mode, task_path),
+        experiment_duration=experiment_duration,
+        exp_batch=exp_batch,
+        batch_size=batch_size,
+        run_mode=run_mode,
+        test_mode=test_mode,
+        max_speed=4.5,
+        tolerance=0.15,
+    )
+
+
 def restart_roscore():
     # 终止所有正在运行的 roscore
     subprocess.run(["killall", "roscore"])
@@ -58,6 +100,17 @@ def main():
         default=1,
         help="The number of experiment batches to run",
     )
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=1,
+        help="The number of experiments in each batch",
+    )
+    parser.add_argument(
+        "--isolated",
+        action="store_true",
+        help="Run on a roscore of this process, so several batches can run at the same time",
+    )
     parser.add_argument(
         "--task_name",
         type=str,
@@ -84,47 +137,34 @@ def main():
     )
     # 解析参数
     args = parser.parse_args()
-    task_name = args.task_name
-    task_path = args.task_path
-    # workspace_path = 'ablation/constraint_pool/' + task_name
-    runner_class = task_mapping(task_name)
-    config_file = config_mapping(task_name)
-    # test_mode = 'improve'
-    test_mode = args.test_mode
-    # workspace_path = 'encircling'
-    if test_mode in ['cap', 'meta', "llm2swarm"]:
-        workspace_path = f'comparative/' + test_mode + f"/{task_path}/" + task_name
-    else:
-        workspace_path = f"{task_path}/" + task_name
-
-    if test_mode == 'real':
-        env_config_path = f"config/real_env/{config_file}"
-        experiment_duration = 50
-    else:
-        env_config_path = f"config/env/{config_file}"
-        experiment_duration = 15
-    runner = runner_class(
-        env_config_path=env_config_path,
-        workspace_path=workspace_path,
-        experiment_duration=experiment_duration,
-        exp_batch=args.exp_batch,
-        run_mode=args.run_mode,
-        test_mode=test_mode,
-        max_speed=4.5,
-        tolerance=0.15,
-    )
-
-    # 人工复核，哪些任务需要重新跑，写在下面
-
-    # exp_list = ['2024-10-28_01-49-03', '2024-10-28_01-49-05', '2024-10-28_01-49-09', '2024-10-28_01-49-15',
-    #             '2024-10-28_01-49-19', '2024-10-28_01-49-27', '2024-10-28_01-51-49']
-    exp_list = None
-
-    # exp_list = ['2025-01-14_14-38-06']
-    exp_list = ['2025-05-12_13-14-16']
-    # exp_list = ['flocking_20250116_161606_765_6566053']
-
-    runner.run(exp_list=exp_list)
+    ros_master = IsolatedRosMaster() if args.isolated else None
+    if ros_master is not None:
+        # before the environment manager calls rospy.init_node
+        ros_master.start()
+    try:
+        runner = build_runner(
+            args.task_name,
+            args.test_mode,
+            args.task_path,
+            run_mode=args.run_mode,
+            exp_batch=args.exp_batch,
+            batch_size=args.batch_size,
+        )
+
+        # 人工复核，哪些任务需要重新跑，写在下面
+
+        # exp_list = ['2024-10-28_01-49-03', '2024-10-28_01-49-05', '2024-10-28_01-49-09', '2024-10-28_01-49-15',
+        #             '2024-10-28_01-49-19', '2024-10-28_01-49-27', '2024-10-28_01-51-49']
+        exp_list = None
+
+        # exp_list = ['2025-01-14_14-38-06']
+        exp_list = ["2025-05-12_13-14-16"]
+        # exp_list = ['flocking_20250116_161606_765_6566053']
+
+        runner.run(exp_list=exp_list)
+    finally:
+        if ros_master is not None:
+            ros_master.stop()
 
 
 if __name__ == "__main__":
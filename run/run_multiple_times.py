@@ -11,29 +11,83 @@ tort, or otherwise, arising from, out of, or in connection with the
 software or the use or other dealings in the software.
 """
 
+import argparse
 import subprocess
+import threading
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 from datetime import datetime
 from pathlib import Path
 
+from run.utils.batch_service import add_sweep_arguments
+from run.utils.work_queue import WorkQueue, lease_owner
+
 
 def run_command(index, command, timeout):
     try:
         print(f"[{index}] Running: {command}")
-        subprocess.run(command, shell=True, timeout=timeout)
-        return f"[✓] {index} SUCCESS | {command}"
+        returncode = subprocess.run(command, shell=True, timeout=timeout).returncode
+        if returncode != 0:
+            return False, f"[✗] {index} ERROR | {command} | exit code {returncode}"
+        return True, f"[✓] {index} SUCCESS | {command}"
     except subprocess.TimeoutExpired:
-        return f"[⏱] {index} TIMEOUT | {command}"
+        return False, f"[⏱] {index} TIMEOUT | {command}"
     except Exception as e:
-        return f"[✗] {index} ERROR | {command} | {str(e)}"
+        return False, f"[✗] {index} ERROR | {command} | {str(e)}"
 
 
-def run_all(llm_list, prompt_list, task_list, repeat_count=1, max_workers=1, timeout=1800, log_path="run_log.txt"):
-    commands = []
-    index = 0
+def serve_commands(
+    work_queue, sweep, worker_id, timeout, log_file, lock, progress, stop
+):
+    """
+    Lease the commands of the sweep one after another until none is left.
+    """
+    owner = lease_owner(f"thread{worker_id}")
+    while not stop.is_set():
+        # the lease outlives the timeout of the command, so no other run takes it over
+        job = work_queue.lease(sweep, owner, timeout + 60)
+        if job is None:
+            next_available = work_queue.next_available(sweep)
+            if next_available is None:
+                return
+            # a failed command is retried after its backoff
+            stop.wait(min(max(next_available - time.time(), 1.0), 10.0))
+            continue
+        start_time = time.time()
+        success, result = run_command(job["id"], job["payload"]["command"], timeout)
+        duration = time.time() - start_time
+        if stop.is_set():
+            # interrupted with Ctrl+C like the command, the next run of the sweep starts it over
+            work_queue.release(job["id"], owner)
+            return
+        if success:
+            work_queue.complete(job["id"], owner, duration)
+        else:
+            work_queue.fail(job["id"], owner, result, duration=duration)
+        with lock:
+            log_file.write(f"{result} | attempt {job['attempts']}\n")
+            log_file.flush()
+            if success or job["attempts"] >= job["max_attempts"]:
+                progress.update(1)
+
 
+def run_all(
+    llm_list,
+    prompt_list,
+    task_list,
+    repeat_count=1,
+    max_workers=1,
+    timeout=1800,
+    log_path="run_log.txt",
+    sweep="run_multiple_times",
+    priority=0,
+):
+    """
+    Generate the code of every combination repeat_count times from a sweep of the work queue, so
+    that running the same sweep again resumes it: commands that succeeded are not run again,
+    failed ones are retried with a backoff.
+    """
+    commands = []
     for llm in llm_list:
         for prompt in prompt_list:
             for task in task_list:
@@ -44,37 +98,63 @@ def run_all(llm_list, prompt_list, task_list, repeat_count=1, max_workers=1, tim
                         f"--prompt_type {prompt} "
                         f"--llm_name {llm} "
                     )
-                    commands.append((index, cmd))
-                    index += 1
+                    commands.append(
+                        (f"{llm}/{prompt}/{task}/{repeat}", task, {"command": cmd})
+                    )
 
-    results = []
+    work_queue = WorkQueue()
+    added = work_queue.enqueue(sweep, commands, priority=priority)
+    counts = work_queue.counts(sweep)
+    print(f"Sweep {sweep}: {added} commands added, {counts}")
     Path(log_path).parent.mkdir(parents=True, exist_ok=True)
 
     with open(log_path, "w") as log_file:
         log_file.write(f"=== Run started at {datetime.now()} ===\n\n")
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = []
-            for idx, cmd in commands:
-                future = executor.submit(run_command, idx, cmd, timeout)
-                futures.append(future)
-                time.sleep(2)  # 👉 每提交一个任务，暂停 2 秒
-            for future in tqdm(as_completed(futures), total=len(futures), desc="Executing Tasks"):
-                result = future.result()
-                results.append(result)
-                log_file.write(result + "\n")
+        lock = threading.Lock()
+        stop = threading.Event()
+        threads = []
+        with tqdm(
+            total=sum(counts.values()),
+            initial=counts["done"] + counts["failed"],
+            desc="Executing Tasks",
+        ) as progress:
+            try:
+                for worker_id in range(max_workers):
+                    thread = threading.Thread(
+                        target=serve_commands,
+                        args=(
+                            work_queue,
+                            sweep,
+                            worker_id,
+                            timeout,
+                            log_file,
+                            lock,
+                            progress,
+                            stop,
+                        ),
+                        daemon=True,
+                    )
+                    thread.start()
+                    threads.append(thread)
+                    if stop.wait(2):  # 👉 每启动一个任务，暂停 2 秒
+                        break
+                for thread in threads:
+                    while thread.is_alive():
+                        thread.join(timeout=1)
+            except KeyboardInterrupt:
+                print("Keyboard interrupt received. Stopping all tasks.")
+                stop.set()
+                for thread in threads:
+                    thread.join(timeout=10)
 
         # ✅ 统计结果
-        success_count = sum("SUCCESS" in r for r in results)
-        timeout_count = sum("TIMEOUT" in r for r in results)
-        error_count = sum("ERROR" in r for r in results)
-        total = len(results)
-
+        counts = work_queue.counts(sweep)
         summary = (
             f"\n=== Execution Summary ===\n"
-            f"Total Tasks: {total}\n"
-            f"✓ Success:   {success_count}\n"
-            f"⏱ Timeout:   {timeout_count}\n"
-            f"✗ Error:     {error_count}\n"
+            f"Total Tasks: {sum(counts.values())}\n"
+            f"✓ Success:   {counts['done']}\n"
+            f"✗ Failed:    {counts['failed']}\n"
+            f"… Left:      {counts['pending'] + counts['leased']}\n"
         )
         print(summary)
         log_file.write(summary)
@@ -102,6 +182,17 @@ if __name__ == "__main__":
     timestamp = datetime.now().strftime("[%Y-%m-%d %H:%M:%S:%f]")
     log_file_path = f"logs/run_log_{timestamp}.txt"
 
+    parser = argparse.ArgumentParser(
+        description="Generate the code of the tasks several times."
+    )
+    add_sweep_arguments(parser, "run_multiple_times")
+    args = parser.parse_args()
+    work_queue = WorkQueue()
+    if args.reset:
+        work_queue.reset(args.sweep)
+    if args.retry_failed:
+        work_queue.retry_failed(args.sweep)
+
     run_all(
         llm_list=llm_model_list,
         prompt_list=prompt_type_list,
@@ -110,4 +201,6 @@ if __name__ == "__main__":
         max_workers=max_concurrent,
         timeout=per_task_timeout,
         log_path=log_file_path,
+        sweep=args.sweep,
+        priority=args.priority,
     )
@@ -0,0 +1,451 @@
+"""
+Copyright (c) 2024 WindyLab of Westlake University, China
+All rights reserved.
+
+This software is provided "as is" without warranty of any kind, either
+express or implied, including but not limited to the warranties of
+merchantability, fitness for a particular purpose, or non-infringement.
+In no event shall the authors or copyright holders be liable for any
+claim, damages, or other liability, whether in an action of contract,
+tort, or otherwise, arising from, out of, or in connection with the
+software or the use or other dealings in the software.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import time
+import traceback
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+
+import numpy as np
+from tqdm import tqdm
+
+from modules.utils import root_manager
+from .ros_master import IsolatedRosMaster
+from .work_queue import WorkQueue, lease_owner
+
+
+# seconds a worker holds a job without a heartbeat, and between the heartbeats of running jobs;
+# the jobs of a service that died are run again once their lease expired
+LEASE_TIME = 120.0
+HEARTBEAT_INTERVAL = 30.0
+
+
+@dataclass(frozen=True)
+class ExperimentJob:
+    """
+    One experiment of a sweep, or the analysis of a whole workspace when experiment is None.
+    """
+
+    task_name: str
+    test_mode: str
+    task_path: str
+    experiment: str = None
+    run_mode: str = "rerun"
+
+    @property
+    def group(self) -> str:
+        # a worker builds the runner and the environment of one task and test mode
+        return f"{self.task_name}/{self.test_mode}"
+
+    @property
+    def key(self) -> str:
+        # unique within a sweep, which has one run mode
+        return f"{self.task_path}/{self.task_name}/{self.test_mode}/{self.experiment or ''}"
+
+    def __str__(self):
+        return f"{self.task_path}/{self.task_name}/{self.experiment or 'analyze'} ({self.test_mode})"
+
+
+def sweep_of(name: str, run_mode: str) -> str:
+    """
+    The work queue sweep of a run mode of a batch script; continue resumes the sweep of rerun.
+    """
+    return f"{name}/{'rerun' if run_mode == 'continue' else run_mode}"
+
+
+def add_sweep_arguments(parser: argparse.ArgumentParser, sweep: str):
+    """
+    The work queue arguments of a batch script whose sweeps are named after sweep by default.
+    """
+    parser.add_argument(
+        "--sweep",
+        type=str,
+        default=sweep,
+        help="The name of the sweep in the work queue, a sweep that was interrupted resumes",
+    )
+    parser.add_argument(
+        "--reset",
+        action="store_true",
+        help="Forget the jobs of the sweep and start it over",
+    )
+    parser.add_argument(
+        "--retry_failed",
+        action="store_true",
+        help="Run the jobs of the sweep that failed all their attempts again",
+    )
+    parser.add_argument(
+        "--priority",
+        type=int,
+        default=0,
+        help="Jobs of higher priority are run first",
+    )
+
+
+def _serve(worker_id: int, inbox, outbox, isolated: bool):
+    """
+    Worker process: build the runner of the task with the first job, then run the jobs sent to
+    the inbox with it until None arrives.
+    """
+    from run.run_code import build_runner, workspace_path_of
+
+    # terminate() stops the worker like Ctrl+C, so that its roscore is stopped as well
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    ros_master = IsolatedRosMaster() if isolated else None
+    runner = None
+    try:
+        if ros_master is not None:
+            # before the environment manager calls rospy.init_node
+            ros_master.start()
+        for job in iter(inbox.get, None):
+            start_time = time.time()
+            setup_time = 0.0
+            status = "done"
+            error = None
+            try:
+                if runner is None:
+                    runner = build_runner(
+                        job.task_name,
+                        job.test_mode,
+                        job.task_path,
+                        run_mode=job.run_mode,
+                    )
+                    setup_time = time.time() - start_time
+                else:
+                    runner.set_workspace(
+                        workspace_path_of(job.task_name, job.test_mode, job.task_path)
+                    )
+                    runner.run_mode = job.run_mode
+                if job.experiment is None:
+                    runner.run()
+                else:
+                    runner.run_experiment(job.experiment)
+                    if runner.unmoved_robots:
+                        # the result is saved, the experiment is run again while it has attempts left
+                        status = "retry"
+                        error = f"{runner.unmoved_robots} robots did not move"
+            except (Exception, SystemExit):
+                status = "failed"
+                error = traceback.format_exc()
+            outbox.put(
+                {
+                    "worker": worker_id,
+                    "status": status,
+                    "setup_time": setup_time,
+                    "duration": time.time() - start_time,
+                    "error": error,
+                }
+            )
+    except Exception:
+        outbox.put(
+            {"worker": worker_id, "status": "crashed", "error": traceback.format_exc()}
+        )
+    finally:
+        if ros_master is not None:
+            ros_master.stop()
+
+
+class _Worker:
+    def __init__(self, worker_id: int, group: str, context, outbox, isolated: bool):
+        self.worker_id = worker_id
+        self.group = group
+        self.owner = lease_owner(f"worker{worker_id}")
+        self.inbox = context.Queue()
+        # not a daemon: the analysis of a job runs in a process pool of the worker, and
+        # BatchService.run joins the workers when it stops
+        self.process = context.Process(
+            target=_serve, args=(worker_id, self.inbox, outbox, isolated)
+        )
+        self.process.start()
+        self.job = None
+        self.started = None
+
+    def send(self, job: dict):
+        """
+        Run a job leased from the work queue.
+        """
+        self.job = job
+        self.started = time.time()
+        self.inbox.put(ExperimentJob(**job["payload"]))
+
+    def retire(self):
+        self.job = None
+        self.inbox.put(None)
+
+
+class BatchService:
+    """
+    Runs the experiments of a sweep in long-lived worker processes instead of one
+    `python run/run_code.py` per batch.
+
+    The experiments are jobs of a durable WorkQueue. Each worker serves one task and test mode:
+    it builds the runner, the environment and the ROS node once, on a roscore of its own when
+    several workers run at the same time, then runs experiments of any model and prompt type of
+    that task one after another. The service leases the next job of its task for a worker as soon
+    as it is done, moves the worker slots to the other tasks once a task runs out of jobs, keeps
+    the leases of running jobs alive, and replaces workers that die; their jobs are retried with
+    a backoff like the ones that raised. The workers are forked after the runner modules are
+    imported, so rospy, pygame, scipy and cv2 are imported once for the whole sweep.
+
+    Progress is shown centrally, and the status, duration and error of every attempt and the
+    environment setup time of the workers are saved to report_path.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        isolated: bool = None,
+        report_path=None,
+        work_queue: WorkQueue = None,
+        lease_time: float = LEASE_TIME,
+    ):
+        self.max_workers = max_workers
+        # workers running at the same time would share topic names on one roscore
+        self.isolated = max_workers > 1 if isolated is None else isolated
+        self.report_path = (
+            report_path or root_manager.project_root / "workspace/batch_report.json"
+        )
+        self.work_queue = work_queue or WorkQueue()
+        self.lease_time = lease_time
+        start_method = (
+            "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        )
+        self.context = multiprocessing.get_context(start_method)
+        self.records = []
+        self._workers = {}
+        # workers without a job left, joined at the end so that they stop their roscore
+        self._retired = []
+        self._next_worker_id = 0
+        self._last_heartbeat = 0.0
+
+    def run(
+        self,
+        sweep: str,
+        jobs: list[ExperimentJob] = (),
+        priority: int = 0,
+        restart: bool = False,
+    ) -> list[dict]:
+        """
+        Add the jobs the sweep does not have yet to the work queue, then run the jobs of the sweep
+        that are not done, including the ones an interrupted run left, until none is left.
+
+        Args:
+            sweep (str): The name of the sweep in the work queue.
+            jobs (list[ExperimentJob]): The experiments of the sweep.
+            priority (int): Jobs of higher priority are run first.
+            restart (bool): Start the sweep over if it finished, i.e. all its jobs are done or
+                failed; a sweep that was interrupted resumes anyway.
+
+        Returns:
+            list[dict]: The job, worker, status, setup time, duration and error of every attempt.
+        """
+        # imported once here, the forked workers inherit the modules
+        import run.run_code  # noqa: F401
+
+        counts = self.work_queue.counts(sweep)
+        if restart and not counts["pending"] + counts["leased"]:
+            self.work_queue.reset(sweep)
+        added = self.work_queue.enqueue(
+            sweep,
+            [(job.key, job.group, asdict(job)) for job in jobs],
+            priority=priority,
+        )
+        counts = self.work_queue.counts(sweep)
+        print(f"Sweep {sweep}: {added} jobs added, {counts}")
+        outbox = self.context.Queue()
+        self.records = []
+        self._next_worker_id = 0
+        start_time = time.time()
+        try:
+            with tqdm(
+                total=sum(counts.values()),
+                initial=counts["done"] + counts["failed"],
+                desc=f"Running {sweep}",
+            ) as progress:
+                while True:
+                    self._start_workers(sweep, outbox)
+                    if (
+                        not self._workers
+                        and self.work_queue.next_available(sweep) is None
+                    ):
+                        break
+                    try:
+                        message = outbox.get(timeout=1.0)
+                    except queue.Empty:
+                        self._check_workers(progress)
+                        self._heartbeat()
+                        continue
+                    worker = self._workers.get(message["worker"])
+                    if worker is None:
+                        continue
+                    if message["status"] == "crashed":
+                        self._remove(worker, message["error"], progress)
+                        continue
+                    self._finish(worker, message, progress)
+                    job = self.work_queue.lease(
+                        sweep, worker.owner, self.lease_time, group=worker.group
+                    )
+                    if job is not None:
+                        worker.send(job)
+                    else:
+                        # the slot goes to a task that still has jobs
+                        worker.retire()
+                        self._retired.append(self._workers.pop(worker.worker_id))
+        except KeyboardInterrupt:
+            print("Keyboard interrupt received. Stopping all workers.")
+        finally:
+            self._stop_workers()
+            self.save_report(sweep, time.time() - start_time)
+        return self.records
+
+    def _start_workers(self, sweep: str, outbox):
+        while len(self._workers) < self.max_workers:
+            busy = defaultdict(int)
+            for worker in self._workers.values():
+                busy[worker.group] += 1
+            # the task with the fewest workers first, then by priority and enqueue order
+            groups = sorted(
+                self.work_queue.groups(sweep), key=lambda group: busy[group]
+            )
+            owner = lease_owner(f"worker{self._next_worker_id}")
+            for group in groups:
+                job = self.work_queue.lease(sweep, owner, self.lease_time, group=group)
+                if job is not None:
+                    break
+            else:
+                return
+            worker = _Worker(
+                self._next_worker_id, group, self.context, outbox, self.isolated
+            )
+            self._next_worker_id += 1
+            self._workers[worker.worker_id] = worker
+            worker.send(job)
+
+    def _heartbeat(self):
+        if time.time() - self._last_heartbeat < HEARTBEAT_INTERVAL:
+            return
+        self._last_heartbeat = time.time()
+        for worker in self._workers.values():
+            if worker.job is not None:
+                self.work_queue.heartbeat(
+                    worker.job["id"], worker.owner, self.lease_time
+                )
+
+    def _check_workers(self, progress):
+        for worker in list(self._workers.values()):
+            if not worker.process.is_alive():
+                self._remove(
+                    worker,
+                    f"Worker exited with code {worker.process.exitcode}",
+                    progress,
+                )
+
+    def _remove(self, worker: _Worker, error: str, progress):
+        del self._workers[worker.worker_id]
+        if worker.job is not None:
+            self._finish(
+                worker,
+                {
+                    "status": "failed",
+                    "setup_time": 0.0,
+                    "duration": time.time() - worker.started,
+                    "error": error,
+                },
+                progress,
+            )
+        worker.process.join(timeout=5)
+
+    def _finish(self, worker: _Worker, message: dict, progress):
+        job = worker.job
+        record = {
+            **job["payload"],
+            "worker": worker.worker_id,
+            "attempt": job["attempts"],
+            "status": message["status"],
+            "setup_time": message["setup_time"],
+            "duration": message["duration"],
+            "error": message["error"],
+        }
+        self.records.append(record)
+        worker.job = None
+        if record["status"] == "done":
+            self.work_queue.complete(job["id"], worker.owner, record["duration"])
+        else:
+            print(
+                f"Attempt {record['attempt']} of {ExperimentJob(**job['payload'])} "
+                f"{record['status']}:\n{record['error']}"
+            )
+            # an experiment whose robots did not move still has its result once out of attempts
+            self.work_queue.fail(
+                job["id"],
+                worker.owner,
+                record["error"],
+                duration=record["duration"],
+                exhausted_state="done" if record["status"] == "retry" else "failed",
+            )
+            if job["attempts"] < job["max_attempts"]:
+                return
+        progress.set_postfix_str(
+            f"{record['experiment'] or record['task_name']}: {record['duration']:.1f}s"
+        )
+        progress.update(1)
+
+    def _stop_workers(self):
+        for worker in self._workers.values():
+            if worker.job is not None:
+                # not counted as an attempt, the next run of the sweep starts the job over
+                self.work_queue.release(worker.job["id"], worker.owner)
+            worker.retire()
+        for worker in self._retired + list(self._workers.values()):
+            worker.process.join(timeout=10)
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join()
+        self._workers = {}
+        self._retired = []
+
+    def summary(self, sweep: str, wall_time: float) -> dict:
+        durations = [record["duration"] for record in self.records]
+        return {
+            "sweep": sweep,
+            "jobs": self.work_queue.counts(sweep),
+            "attempts": len(self.records),
+            "failed_attempts": sum(
+                record["status"] != "done" for record in self.records
+            ),
+            "workers": self._next_worker_id,
+            "wall_time": wall_time,
+            "setup_time": sum(record["setup_time"] for record in self.records),
+            "mean_duration": float(np.mean(durations)) if durations else None,
+            "max_duration": max(durations) if durations else None,
+        }
+
+    def save_report(self, sweep: str, wall_time: float):
+        summary = self.summary(sweep, wall_time)
+        os.makedirs(os.path.dirname(self.report_path), exist_ok=True)
+        with open(self.report_path, "w") as f:
+            json.dump({"summary": summary, "experiments": self.records}, f, indent=4)
+        if summary["attempts"]:
+            jobs = summary["jobs"]
+            print(
+                f"Sweep {sweep}: {jobs['done']} done, {jobs['failed']} failed, "
+                f"{jobs['pending'] + jobs['leased']} left; {summary['attempts']} attempts "
+                f"in {wall_time:.0f}s by {summary['workers']} workers, "
+                f"{summary['mean_duration']:.1f}s per attempt, "
+                f"{summary['setup_time']:.1f}s of environment setup"
+            )
@@ -0,0 +1,172 @@
+"""
+Copyright (c) 2024 WindyLab of Westlake University, China
+All rights reserved.
+
+This software is provided "as is" without warranty of any kind, either
+express or implied, including but not limited to the warranties of
+merchantability, fitness for a particular purpose, or non-infringement.
+In no event shall the authors or copyright holders be liable for any
+claim, damages, or other liability, whether in an action of contract,
+tort, or otherwise, arising from, out of, or in connection with the
+software or the use or other dealings in the software.
+"""
+
+import hashlib
+import math
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# pairwise distances of the last few trajectory sets, see pairwise_dtw
+_CACHE_SIZE = 32
+_cache = OrderedDict()
+_EPSILON = 1e-9
+
+
+def _band_limits(k: int, ratio: float, window: int, n: int, m: int) -> tuple[int, int]:
+    """
+    Rows i of anti-diagonal k (cells (i, k - i)) that lie inside the grid and inside the
+    Sakoe-Chiba band |i - j * ratio| <= window around the scaled diagonal.
+    """
+    # rows exactly on the edge of the band must not be lost to rounding
+    low = max(0, k - (m - 1), math.ceil((k * ratio - window) / (1 + ratio) - _EPSILON))
+    high = min(n - 1, k, math.floor((k * ratio + window) / (1 + ratio) + _EPSILON))
+    return low, high
+
+
+def batch_band_dtw(a: np.ndarray, b: np.ndarray, window: int) -> np.ndarray:
+    """
+    Dynamic time warping distances with Euclidean point costs, restricted to a
+    Sakoe-Chiba band, for a batch of trajectory pairs of equal shapes.
+
+    The cost matrix is swept along its anti-diagonals, whose cells only depend on the two
+    previous anti-diagonals, so every step is one vectorized operation over the band of
+    all pairs.
+
+    :param a: (P, n, 2) first trajectory of each pair.
+    :param b: (P, m, 2) second trajectory of each pair.
+    :param window: half width of the band in rows of the first trajectory.
+    :return: (P,) DTW distances.
+    """
+    num_pairs, n = a.shape[:2]
+    m = b.shape[1]
+    if n == 1 or m == 1:
+        # a single point is matched to every point of the other trajectory
+        ratio, window = 1.0, max(n, m)
+    else:
+        ratio = (n - 1) / (m - 1)
+        # the band has to be wide enough for a warping path to get through it
+        window = max(int(window), math.ceil(ratio), math.ceil(1 / ratio))
+
+    # buffers of the last three anti-diagonals, indexed by row + 1, index 0 stays infinite
+    buffers = [np.full((num_pairs, n + 2), np.inf) for _ in range(3)]
+    for k in range(n + m - 1):
+        current, previous, before_previous = (
+            buffers[k % 3],
+            buffers[(k - 1) % 3],
+            buffers[(k - 2) % 3],
+        )
+        low, high = _band_limits(k, ratio, window, n, m)
+        if low > high:
+            current[:] = np.inf
+            continue
+        rows = slice(low, high + 1)
+        cost = np.linalg.norm(
+            a[:, rows] - b[:, k - high : k - low + 1][:, ::-1], axis=-1
+        )
+        if k == 0:
+            best = np.zeros((num_pairs, 1))
+        else:
+            best = np.minimum(
+                np.minimum(
+                    previous[:, low : high + 1], previous[:, low + 1 : high + 2]
+                ),
+                before_previous[:, low : high + 1],
+            )
+        current[:, low + 1 : high + 2] = cost + best
+        # cells next to the band may still hold values of an older anti-diagonal
+        current[:, low] = np.inf
+        current[:, high + 2] = np.inf
+    return buffers[(n + m - 2) % 3][:, n].copy()
+
+
+def downsample(trajectory: np.ndarray, max_points: int | None) -> np.ndarray:
+    if max_points is None or len(trajectory) <= max_points:
+        return trajectory
+    step = math.ceil(len(trajectory) / max_points)
+    return trajectory[::step]
+
+
+def _pair_distances(args) -> np.ndarray:
+    a, b, window = args
+    return batch_band_dtw(a, b, window)
+
+
+def _cache_key(trajectories: list[np.ndarray], window: float, max_points) -> str:
+    digest = hashlib.sha1()
+    for trajectory in trajectories:
+        digest.update(np.ascontiguousarray(trajectory, dtype=float).tobytes())
+        digest.update(str(trajectory.shape).encode())
+    digest.update(f"{window}-{max_points}".encode())
+    return digest.hexdigest()
+
+
+def pairwise_dtw(
+    trajectories: list[np.ndarray],
+    window: float = 0.1,
+    max_points: int = None,
+    max_workers: int = 1,
+    batch_size: int = 64,
+) -> np.ndarray:
+    """
+    Band-limited DTW distances between all pairs of trajectories, in the order of
+    itertools.combinations(range(len(trajectories)), 2).
+
+    :param trajectories: (length, 2) arrays.
+    :param window: half width of the Sakoe-Chiba band, as a fraction of the longer trajectory
+        of a pair if below 1, otherwise in points.
+    :param max_points: downsample longer trajectories to at most this many points first.
+    :param max_workers: compute batches of pairs in this many processes.
+    :param batch_size: number of pairs computed in one vectorized sweep.
+    """
+    trajectories = [
+        downsample(np.asarray(trajectory, dtype=float).reshape(-1, 2), max_points)
+        for trajectory in trajectories
+    ]
+    key = _cache_key(trajectories, window, max_points)
+    if key in _cache:
+        _cache.move_to_end(key)
+        return _cache[key].copy()
+
+    first, second = np.triu_indices(len(trajectories), k=1)
+    distances = np.zeros(len(first))
+    # pairs are batched by trajectory lengths, robots recorded in every step all share one
+    groups = {}
+    for index, (i, j) in enumerate(zip(first, second)):
+        groups.setdefault((len(trajectories[i]), len(trajectories[j])), []).append(
+            index
+        )
+
+    tasks, task_indices = [], []
+    for (n, m), indices in groups.items():
+        half_width = window * max(n, m) if window < 1 else window
+        for start in range(0, len(indices), batch_size):
+            batch = indices[start : start + batch_size]
+            a = np.stack([trajectories[first[index]] for index in batch])
+            b = np.stack([trajectories[second[index]] for index in batch])
+            tasks.append((a, b, math.ceil(half_width)))
+            task_indices.append(batch)
+
+    if max_workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_pair_distances, tasks))
+    else:
+        results = [_pair_distances(task) for task in tasks]
+    for batch, result in zip(task_indices, results):
+        distances[batch] = result
+
+    _cache[key] = distances
+    if len(_cache) > _CACHE_SIZE:
+        _cache.popitem(last=False)
+    return distances.copy()
@@ -0,0 +1,154 @@
+"""
+Copyright (c) 2024 WindyLab of Westlake University, China
+All rights reserved.
+
+This software is provided "as is" without warranty of any kind, either
+express or implied, including but not limited to the warranties of
+merchantability, fitness for a particular purpose, or non-infringement.
+In no event shall the authors or copyright holders be liable for any
+claim, damages, or other liability, whether in an action of contract,
+tort, or otherwise, arising from, out of, or in connection with the
+software or the use or other dealings in the software.
+"""
+
+from collections.abc import Mapping
+from functools import cached_property
+
+import numpy as np
+from scipy.spatial import distance_matrix
+
+
+class EntityGroup:
+    """
+    The entities of one type as arrays, in the order of the result dict.
+    Derived quantities are computed on first access and shared by all metrics.
+    """
+
+    def __init__(self, ids: list, infos: list[dict]):
+        self.ids = ids
+        self.infos = infos
+        self.trajectories = [
+            np.asarray(info["trajectory"], dtype=float).reshape(-1, 2) for info in infos
+        ]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @cached_property
+    def sizes(self) -> list:
+        return [info["size"] for info in self.infos]
+
+    @cached_property
+    def lengths(self) -> np.ndarray:
+        return np.array(
+            [len(trajectory) for trajectory in self.trajectories], dtype=int
+        )
+
+    @cached_property
+    def positions(self) -> np.ndarray:
+        """
+        (T, N, 2) positions at every time step, all trajectories must have the same length.
+        """
+        if not self.trajectories:
+            return np.zeros((0, 0, 2))
+        return np.stack(self.trajectories, axis=1)
+
+    @cached_property
+    def initial(self) -> np.ndarray:
+        return np.array([trajectory[0] for trajectory in self.trajectories]).reshape(
+            -1, 2
+        )
+
+    @cached_property
+    def final(self) -> np.ndarray:
+        return np.array([trajectory[-1] for trajectory in self.trajectories]).reshape(
+            -1, 2
+        )
+
+    @cached_property
+    def final_distances(self) -> np.ndarray:
+        """
+        (N, N) distances between the final positions.
+        """
+        return distance_matrix(self.final, self.final)
+
+    @cached_property
+    def final_nearest_neighbor_distances(self) -> np.ndarray:
+        distances = self.final_distances.copy()
+        np.fill_diagonal(distances, np.inf)
+        return distances.min(axis=1)
+
+
+class ExperimentData(Mapping):
+    """
+    A simulation result loaded once for all the metrics of an experiment.
+
+    It is still the dict of entities the metrics take (entity_id -> {"type", "trajectory", ...}),
+    so it can be passed to any of them, and it adds the entities of each type as an
+    EntityGroup of arrays, built on first use.
+    """
+
+    def __init__(self, data: Mapping):
+        self.data = data
+        self._groups = {}
+
+    def __getitem__(self, entity_id):
+        return self.data[entity_id]
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def group(self, *types: str) -> EntityGroup:
+        """
+        The entities of the given types, in the order of the result dict.
+        """
+        if types not in self._groups:
+            ids = [
+                entity_id
+                for entity_id, info in self.data.items()
+                if info["type"] in types
+            ]
+            self._groups[types] = EntityGroup(
+                ids, [self.data[entity_id] for entity_id in ids]
+            )
+        return self._groups[types]
+
+    @cached_property
+    def entities(self) -> EntityGroup:
+        """
+        All the entities, whatever their type.
+        """
+        ids = list(self.data)
+        return EntityGroup(ids, [self.data[entity_id] for entity_id in ids])
+
+    @property
+    def robots(self) -> EntityGroup:
+        return self.group("Robot")
+
+    @property
+    def obstacles(self) -> EntityGroup:
+        return self.group("Obstacle")
+
+    @property
+    def preys(self) -> EntityGroup:
+        return self.group("Prey")
+
+    @property
+    def landmarks(self) -> EntityGroup:
+        return self.group("Landmark")
+
+    @cached_property
+    def num_timesteps(self) -> int:
+        """
+        The trajectory length of the first entity, the number of steps of the run.
+        """
+        return len(next(iter(self.data.values()))["trajectory"])
+
+
+def as_experiment_data(data) -> ExperimentData:
+    if isinstance(data, ExperimentData):
+        return data
+    return ExperimentData(data)
@@ -0,0 +1,267 @@
+"""
+Copyright (c) 2024 WindyLab of Westlake University, China
+All rights reserved.
+
+This software is provided "as is" without warranty of any kind, either
+express or implied, including but not limited to the warranties of
+merchantability, fitness for a particular purpose, or non-infringement.
+In no event shall the authors or copyright holders be liable for any
+claim, damages, or other liability, whether in an action of contract,
+tort, or otherwise, arising from, out of, or in connection with the
+software or the use or other dealings in the software.
+"""
+
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+
+from .result_store import load_analysis, scalar_metrics
+
+INDEX_FILE = "experiments.db"
+KEY_COLUMNS = ["task", "model", "prompt_type", "test_mode", "experiment"]
+# run results that do not count as an error of the generated code
+NON_ERROR_RESULTS = ["Timeout", "None", "NONE", "No task to run"]
+# result files written by save_experiment_result
+RESULT_NAMES = ["wo_vlm", "debug", "improve", "cap", "meta", "llm2swarm"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS experiments (
+    task TEXT NOT NULL,
+    model TEXT NOT NULL,
+    prompt_type TEXT NOT NULL,
+    test_mode TEXT NOT NULL,
+    experiment TEXT NOT NULL,
+    workspace TEXT NOT NULL,
+    success INTEGER,
+    error INTEGER,
+    global_missing INTEGER,
+    errors TEXT,
+    metrics TEXT,
+    finished_at REAL,
+    PRIMARY KEY (task, model, prompt_type, test_mode, experiment)
+);
+CREATE INDEX IF NOT EXISTS experiments_by_workspace ON experiments (workspace, test_mode);
+"""
+
+
+def workspace_key(workspace_path) -> dict:
+    """
+    Split a workspace path relative to workspace/, e.g. "gpt-4o/full/flocking" or
+    "comparative/cap/gpt-4o/full/flocking", into the task, model and prompt type.
+    """
+    parts = [part for part in Path(workspace_path).parts if part not in ("", "/")]
+    workspace = "/".join(parts[:-1])
+    if len(parts) > 2 and parts[0] == "comparative":
+        parts = parts[2:]
+    return {
+        "task": parts[-1],
+        "model": parts[0] if len(parts) > 1 else "",
+        "prompt_type": "/".join(parts[1:-1]),
+        "workspace": workspace,
+    }
+
+
+def classify_run_result(run_result) -> tuple[bool, list]:
+    """
+    Returns:
+        tuple[bool, list]: Whether the global skills did not run, and the results of the global
+        and local runs that are errors of the generated code rather than a timeout.
+    """
+    run_result = run_result or {}
+    global_result = run_result.get("global")
+    results = [global_result.get("result", "")] if global_result is not None else []
+    local_result = run_result.get("local") or {}
+    local_results = local_result.get("result", [])
+    results += local_results if isinstance(local_results, list) else [local_results]
+    return global_result is None, [
+        result for result in results if result not in NON_ERROR_RESULTS
+    ]
+
+
+class ExperimentIndex:
+    """
+    SQLite index of the analysed runs of all workspaces, keyed by (task, model, prompt_type,
+    test_mode, experiment). save_experiment_result updates it in one transaction per run, so
+    selecting the experiments to rerun and summarizing a workspace are queries instead of
+    opening the result file of every experiment.
+    """
+
+    def __init__(self, db_path=None):
+        if db_path is None:
+            from modules.utils import root_manager
+
+            db_path = root_manager.project_root / "workspace" / INDEX_FILE
+        self.db_path = str(db_path)
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # several run_code processes write to the same index
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _row(key: dict, test_mode: str, experiment: str, analysis: dict) -> dict:
+        global_missing, errors = classify_run_result(analysis.get("run_result"))
+        return {
+            "task": key["task"],
+            "model": key["model"],
+            "prompt_type": key["prompt_type"],
+            "test_mode": test_mode,
+            "experiment": experiment,
+            "workspace": key["workspace"],
+            "success": int(bool(analysis.get("success", False))),
+            "error": int(bool(errors)),
+            "global_missing": int(global_missing),
+            "errors": json.dumps(errors),
+            "metrics": json.dumps(scalar_metrics(analysis)),
+            "finished_at": time.time(),
+        }
+
+    def _upsert(self, conn: sqlite3.Connection, rows: list[dict]):
+        if not rows:
+            return
+        columns = list(rows[0])
+        conn.executemany(
+            f"INSERT OR REPLACE INTO experiments ({', '.join(columns)}) "
+            f"VALUES ({', '.join(':' + column for column in columns)})",
+            rows,
+        )
+
+    def record(self, key: dict, test_mode: str, experiment: str, analysis: dict):
+        """
+        Add or replace the analysis of a run.
+
+        Args:
+            key (dict): The workspace of the experiment, see workspace_key.
+            test_mode (str): The name of the result, e.g. "wo_vlm".
+            experiment (str): The experiment directory name.
+            analysis (dict): The analysis saved with the result.
+        """
+        with closing(self._connect()) as conn, conn:
+            self._upsert(conn, [self._row(key, test_mode, experiment, analysis)])
+
+    def record_many(self, key: dict, test_mode: str, analyses: dict[str, dict]):
+        """
+        Add or replace the analyses of several runs, by experiment, in one transaction.
+        """
+        with closing(self._connect()) as conn, conn:
+            self._upsert(
+                conn,
+                [
+                    self._row(key, test_mode, experiment, analysis)
+                    for experiment, analysis in analyses.items()
+                ],
+            )
+
+    def reconcile(self, workspace_dir, key: dict) -> int:
+        """
+        Bring the index of a workspace in line with its result files: index the files that
+        have no row or were written after it, e.g. before the index existed or by a run that
+        failed to record, and drop the rows whose file was deleted. Only the rows of this
+        workspace and of the RESULT_NAMES it scans are touched.
+
+        Returns:
+            int: The number of runs added, updated or removed.
+        """
+        indexed = {
+            (row["test_mode"], row["experiment"]): row["finished_at"]
+            for row in self.query(
+                f"test_mode IN ({', '.join('?' for _ in RESULT_NAMES)})",
+                tuple(RESULT_NAMES),
+                task=key["task"],
+                model=key["model"],
+                prompt_type=key["prompt_type"],
+                workspace=key["workspace"],
+            )
+        }
+        rows, on_disk = [], set()
+        if os.path.isdir(workspace_dir):
+            for experiment in sorted(os.listdir(workspace_dir)):
+                experiment_dir = os.path.join(workspace_dir, experiment)
+                if not os.path.isdir(experiment_dir):
+                    continue
+                for name in RESULT_NAMES:
+                    try:
+                        modified = os.path.getmtime(
+                            os.path.join(experiment_dir, f"{name}.json")
+                        )
+                    except OSError:
+                        continue
+                    on_disk.add((name, experiment))
+                    finished_at = indexed.get((name, experiment))
+                    if finished_at is not None and finished_at >= modified:
+                        continue
+                    try:
+                        analysis = load_analysis(experiment_dir, name)
+                    except (OSError, json.JSONDecodeError):
+                        continue
+                    if analysis is not None:
+                        rows.append(self._row(key, name, experiment, analysis))
+        removed = [run for run in indexed if run not in on_disk]
+        with closing(self._connect()) as conn, conn:
+            self._upsert(conn, rows)
+            conn.executemany(
+                "DELETE FROM experiments WHERE task = ? AND model = ? AND prompt_type = ? "
+                "AND test_mode = ? AND experiment = ?",
+                [
+                    (
+                        key["task"],
+                        key["model"],
+                        key["prompt_type"],
+                        test_mode,
+                        experiment,
+                    )
+                    for test_mode, experiment in removed
+                ],
+            )
+        return len(rows) + len(removed)
+
+    def query(self, where: str = "", parameters: tuple = (), **filters) -> list[dict]:
+        """
+        Rows matching the column filters and an optional SQL condition, e.g.
+        query("success = 0 AND error = 1", task="flocking", test_mode="wo_vlm") for the
+        runs that failed with an error other than a timeout.
+        """
+        conditions = [f"{column} = ?" for column in filters]
+        values = list(filters.values())
+        if where:
+            conditions.append(f"({where})")
+            values += list(parameters)
+        sql = "SELECT * FROM experiments"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY experiment"
+        with closing(self._connect()) as conn:
+            rows = conn.execute(sql, values).fetchall()
+        return [
+            {
+                **dict(row),
+                "success": bool(row["success"]),
+                "error": bool(row["error"]),
+                "global_missing": bool(row["global_missing"]),
+                "errors": json.loads(row["errors"]),
+                "metrics": json.loads(row["metrics"]),
+            }
+            for row in rows
+        ]
+
+    def results(self, key: dict, test_mode: str) -> dict[str, dict]:
+        """
+        The indexed runs of one workspace and test mode, by experiment.
+        """
+        return {
+            row["experiment"]: row
+            for row in self.query(
+                task=key["task"],
+                model=key["model"],
+                prompt_type=key["prompt_type"],
+                test_mode=test_mode,
+            )
+        }
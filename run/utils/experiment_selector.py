@@ -0,0 +1,167 @@
+"""
+Copyright (c) 2024 WindyLab of Westlake University, China
+All rights reserved.
+
+This software is provided "as is" without warranty of any kind, either
+express or implied, including but not limited to the warranties of
+merchantability, fitness for a particular purpose, or non-infringement.
+In no event shall the authors or copyright holders be liable for any
+claim, damages, or other liability, whether in an action of contract,
+tort, or otherwise, arising from, out of, or in connection with the
+software or the use or other dealings in the software.
+"""
+
+import os
+
+from modules.utils import root_manager
+from .experiment_index import ExperimentIndex, workspace_key
+
+
+class ExperimentSelector:
+    """
+    The experiments of a workspace that a run mode runs, from the experiment directories and the
+    experiment index. It needs no environment, so the batch service selects the experiments of a
+    sweep before any runner is built; AutoRunnerBase inherits it.
+    """
+
+    def __init__(
+        self,
+        workspace_path,
+        run_mode="rerun",
+        test_mode="full_version",
+        exp_batch=1,
+        batch_size=1,
+        experiment_index: ExperimentIndex = None,
+    ):
+        self.exp_batch = exp_batch
+        # experiments of one batch, run one after another by the same process
+        self.batch_size = batch_size
+        self.run_mode = run_mode
+        self.test_mode = test_mode
+        self.experiment_index = experiment_index or ExperimentIndex()
+        self._set_workspace_path(workspace_path)
+
+    def _set_workspace_path(self, workspace_path):
+        self.workspace_path = workspace_path
+        self.experiment_path = root_manager.project_root / f"workspace/{workspace_path}"
+        self.index_key = workspace_key(workspace_path)
+        self._index_checked = False
+
+    def ensure_indexed(self):
+        """
+        Reconcile the index with the result files of this workspace, once per workspace, so that
+        runs analysed before the index existed or deleted since count as they are on disk.
+        """
+        if self._index_checked:
+            return
+        self._index_checked = True
+        self.experiment_index.reconcile(self.experiment_path, self.index_key)
+
+    def indexed_results(self, test_mode: str) -> dict[str, dict]:
+        """
+        The indexed runs of this workspace for a test mode, by experiment.
+        """
+        self.ensure_indexed()
+        return self.experiment_index.results(self.index_key, test_mode)
+
+    def select_experiments(self) -> list[str]:
+        """
+        All the experiments of the workspace the run mode applies to, sorted, without splitting
+        them into batches.
+        """
+        directories = []
+        if self.test_mode in ["cap", "meta", "llm2swarm"]:
+            fail_rerun_results = self.indexed_results(self.test_mode)
+        else:
+            fail_rerun_results = self.indexed_results("wo_vlm")
+        debug_results = self.indexed_results("debug")
+        completed = (
+            self.completed_experiments()
+            if self.run_mode in ["continue", "fail_rerun"]
+            else set()
+        )
+        for item in os.listdir(self.experiment_path):
+            if item == "pic" or item == "real":
+                continue
+            item_path = os.path.join(self.experiment_path, item)
+            if os.path.isdir(item_path):
+                if self.run_mode == "continue":
+                    if item not in completed:
+                        directories.append(item)
+                elif self.run_mode == "rerun":
+                    directories.append(item)
+                elif self.run_mode == "analyze":
+                    # if self.experiment_completed(item_path):
+                    directories.append(item)
+                elif self.run_mode == "fail_rerun":
+                    if item in completed and item in fail_rerun_results:
+                        row = fail_rerun_results[item]
+                        success = row["success"]
+                        # any global or local run result other than a timeout
+                        error = row["error"]
+
+                        if not success:
+                            # for cap and meta, global_results is []
+                            if row["global_missing"] and self.test_mode not in [
+                                "cap",
+                                "meta",
+                                "llm2swarm",
+                            ]:
+                                continue
+                            if self.test_mode == "debug":
+                                if error:
+                                    directories.append(item)
+                            else:
+                                if error:
+                                    print(f"Error in {item}")
+                                    continue
+                                else:
+                                    directories.append(item)
+                elif self.run_mode == "debug_rerun":
+                    if item in debug_results:
+                        success = debug_results[item]["success"]
+                        if not success:
+                            directories.append(item)
+        if self.test_mode == "debug":
+            print(f"Total {len(directories)} experiments to run: {directories}")
+        return sorted(directories)
+
+    def get_experiment_directories(self):
+        directories = self.select_experiments()
+        if self.run_mode in ["rerun", "fail_rerun", "debug_rerun"]:
+            # 根据batch数目，将实验分批次,一共10批，根据batch数目，确定当前分批
+            batch_size = self.batch_size
+            batch_num = self.exp_batch
+            if (batch_num - 1) * batch_size >= len(directories):
+                print(f"Batch {batch_num} is out of range")
+                raise SystemExit
+            directories = directories[
+                (batch_num - 1) * batch_size : batch_num * batch_size
+            ]
+            print(
+                f"Batch {batch_num} from {batch_size * (batch_num - 1)} to {batch_size * batch_num}"
+            )
+
+        return directories
+
+    def completed_experiments(self) -> set[str]:
+        map = {
+            "cap": "cap.json",
+            "meta": "meta.json",
+            "llm2swarm": "llm2swarm.json",
+            "wo_vlm": "wo_vlm.json",
+            "debug": "wo_vlm.json",
+            "vlm": "vlm.json",
+        }
+        test_mode = os.path.splitext(map[self.test_mode])[0]
+        if test_mode == "vlm":
+            # vlm.json is written by VideoCriticize and not indexed
+            return {
+                item
+                for item in os.listdir(self.experiment_path)
+                if os.path.exists(os.path.join(self.experiment_path, item, "vlm.json"))
+            }
+        return set(self.indexed_results(test_mode))
+
+    def experiment_completed(self, path):
+        return os.path.basename(os.path.normpath(path)) in self.completed_experiments()
@@ -12,19 +12,110 @@ software or the use or other dealings in the software.
 """
 
 import numpy as np
-from itertools import combinations
 
 from scipy.spatial import Delaunay, procrustes, distance_matrix
 
-from run.utils import calculate_overlap_ratio
-import numpy as np
 from scipy.optimize import leastsq
 
+from modules.utils.assignment import (
+    batch_assignment,
+    batch_procrustes_disparity,
+    optimal_assignment,
+)
+from .dtw import pairwise_dtw
+from .experiment_data import EntityGroup, ExperimentData, as_experiment_data
+
+
+# robot-robot pairs are checked with a KD-tree per frame above this many robots
+KD_TREE_MIN_ROBOTS = 200
+# upper bound on the number of pair distances computed at once
+COLLISION_CHUNK_PAIRS = 2_000_000
+
+
+def _overlap(distances: np.ndarray, combined_sizes: np.ndarray, tolerance: float):
+    """
+    Vectorized calculate_overlap_ratio: the number and summed overlap ratio of the colliding pairs.
+    """
+    colliding = distances + tolerance < combined_sizes
+    if not np.any(colliding):
+        return 0, 0.0
+    combined = np.broadcast_to(combined_sizes, distances.shape)[colliding]
+    ratios = (combined - distances[colliding]) / combined
+    return int(np.count_nonzero(colliding)), float(np.sum(ratios))
+
+
+def collision_metrics(
+    robot_positions: np.ndarray,
+    robot_sizes: np.ndarray,
+    obstacle_positions: np.ndarray,
+    obstacle_sizes: np.ndarray,
+    tolerance: float = 0.1,
+) -> tuple[int, float]:
+    """
+    Count the robot-obstacle and robot-robot collisions over a whole run.
+
+    :param robot_positions: (T, N, 2) positions of the robots at every time step.
+    :param robot_sizes: (N,) radii of the robots.
+    :param obstacle_positions: (M, 2) positions of the static obstacles.
+    :param obstacle_sizes: (M,) radii of the obstacles.
+    :param tolerance: allowed tolerance for collision
+    :return: the number of colliding pairs summed over all time steps and the sum of their overlap ratios.
+    """
+    num_timesteps, num_robots = robot_positions.shape[:2]
+    collision_count = 0
+    collision_severity_sum = 0.0
+
+    if len(obstacle_positions) and num_robots:
+        # (N, M) combined sizes, shared by all time steps
+        combined_sizes = robot_sizes[:, None] + obstacle_sizes[None, :]
+        chunk = max(1, COLLISION_CHUNK_PAIRS // (num_robots * len(obstacle_positions)))
+        for start in range(0, num_timesteps, chunk):
+            positions = robot_positions[start : start + chunk]
+            distances = np.linalg.norm(
+                positions[:, :, None, :] - obstacle_positions[None, None, :, :], axis=-1
+            )
+            count, severity = _overlap(distances, combined_sizes, tolerance)
+            collision_count += count
+            collision_severity_sum += severity
+
+    if num_robots < 2:
+        return collision_count, collision_severity_sum
+
+    if num_robots > KD_TREE_MIN_ROBOTS:
+        from scipy.spatial import cKDTree
+
+        search_radius = 2 * np.max(robot_sizes) - tolerance
+        if search_radius <= 0:
+            return collision_count, collision_severity_sum
+        for positions in robot_positions:
+            pairs = cKDTree(positions).query_pairs(search_radius, output_type="ndarray")
+            if len(pairs) == 0:
+                continue
+            first, second = pairs[:, 0], pairs[:, 1]
+            distances = np.linalg.norm(positions[first] - positions[second], axis=-1)
+            count, severity = _overlap(
+                distances, robot_sizes[first] + robot_sizes[second], tolerance
+            )
+            collision_count += count
+            collision_severity_sum += severity
+        return collision_count, collision_severity_sum
+
+    first, second = np.triu_indices(num_robots, k=1)
+    combined_sizes = robot_sizes[first] + robot_sizes[second]
+    chunk = max(1, COLLISION_CHUNK_PAIRS // len(first))
+    for start in range(0, num_timesteps, chunk):
+        positions = robot_positions[start : start + chunk]
+        distances = np.linalg.norm(positions[:, first] - positions[:, second], axis=-1)
+        count, severity = _overlap(distances, combined_sizes, tolerance)
+        collision_count += count
+        collision_severity_sum += severity
+    return collision_count, collision_severity_sum
+
 
 def check_collisions(data, tolerance: float = 0.1) -> dict:
     """
     Check if there are any collisions between robots and obstacles at any time step.
-    :param data: dictionary containing information about entities
+    :param data: dictionary containing information about entities, or its ExperimentData
     :param tolerance: allowed tolerance for collision
     :return:
         a dictionary containing:
@@ -32,42 +123,19 @@ def check_collisions(data, tolerance: float = 0.1) -> dict:
         - collision_count (int): The total number of collisions across all time steps.
         - collision_severity_sum (float): The sum of overlap ratios for all collisions.
     """
-    robots = {id: info for id, info in data.items() if info["type"] == "Robot"}
-    obstacles = {id: info for id, info in data.items() if info["type"] == "Obstacle"}
-    num_timesteps = len(next(iter(data.values()))["trajectory"])
-    collision_count = 0
-    collision_severity_sum = 0
-
-    for t in range(num_timesteps):
-        # Check for robot-obstacle collisions
-        for robot_id, robot_info in robots.items():
-            robot_position = robot_info["trajectory"][t]
-            for _, obstacle_info in obstacles.items():
-                overlap_ratio = calculate_overlap_ratio(
-                    robot_position,
-                    obstacle_info["trajectory"][0],
-                    robot_info["size"],
-                    obstacle_info["size"],
-                    tolerance,
-                )
-                if overlap_ratio is not None:
-                    collision_count += 1
-                    collision_severity_sum += overlap_ratio
-
-        # Check for robot-robot collisions
-        for (id1, robot1_info), (id2, robot2_info) in combinations(robots.items(), 2):
-            robot1_position = robot1_info["trajectory"][t]
-            robot2_position = robot2_info["trajectory"][t]
-            overlap_ratio = calculate_overlap_ratio(
-                robot1_position,
-                robot2_position,
-                robot1_info["size"],
-                robot2_info["size"],
-                tolerance,
-            )
-            if overlap_ratio is not None:
-                collision_count += 1
-                collision_severity_sum += overlap_ratio
+    experiment = as_experiment_data(data)
+    robots, obstacles = experiment.robots, experiment.obstacles
+    num_timesteps = experiment.num_timesteps
+
+    robot_positions = robots.positions[:num_timesteps].reshape(
+        num_timesteps, len(robots), 2
+    )
+    robot_sizes = np.array(robots.sizes, dtype=float)
+    obstacle_sizes = np.array(obstacles.sizes, dtype=float)
+
+    collision_count, collision_severity_sum = collision_metrics(
+        robot_positions, robot_sizes, obstacles.initial, obstacle_sizes, tolerance
+    )
     collision = collision_count > 0
     return {
         "collision": collision,
@@ -93,29 +161,32 @@ def evaluate_target_achievement(data, tolerance=0.1) -> dict:
     num_targets = 0
     total_steps_ratio = 0
 
-    for entity_id, info in data.items():
+    experiment = as_experiment_data(data)
+    entities = experiment.entities
+    for entity_id, info, trajectory in zip(
+        entities.ids, entities.infos, entities.trajectories
+    ):
         target = info.get("target")
         if target is None:
             continue
 
         num_targets += 1
-        initial_position = info["trajectory"][0]
-        initial_distance = np.linalg.norm(target - initial_position)
-        steps_to_target = len(info["trajectory"])
+        # distances to the target over the whole trajectory at once
+        distances = np.linalg.norm(np.asarray(target, dtype=float) - trajectory, axis=1)
+        initial_distance = distances[0]
+        steps_to_target = len(trajectory)
         final_distance = initial_distance
 
-        for t, position in enumerate(info["trajectory"]):
-            current_distance = np.linalg.norm(target - position)
-            if current_distance <= tolerance:
-                steps_to_target = t + 1
-                final_distance = current_distance
-                break
+        reached = np.flatnonzero(distances <= tolerance)
+        if len(reached):
+            steps_to_target = reached[0] + 1
+            final_distance = distances[reached[0]]
 
-        if np.linalg.norm(target - info["trajectory"][-1]) <= tolerance:
+        if distances[-1] <= tolerance:
             achieved_targets += 1
-            total_steps_ratio += steps_to_target / len(info["trajectory"])
+            total_steps_ratio += steps_to_target / len(trajectory)
         else:
-            print(np.linalg.norm(target - info["trajectory"][-1]))
+            print(distances[-1])
 
         distance_ratio = (
             final_distance / initial_distance if initial_distance > 0 else 1
@@ -185,18 +256,13 @@ def calculate_line_similarity(data, target_line: tuple) -> dict:
         - slope_similarity (float): The cosine similarity between the slopes of the fitted line and the target line.
         - point_similarity (float): The average Euclidean distance between the points on the fitted line and the target line.
     """
-    robot_positions = []
-    for entity_id, info in data.items():
-        if info["type"] == "Robot":
-            robot_positions.append(
-                info["trajectory"][-1]
-            )  # Get final positions of robots
+    # Get final positions of robots
+    robot_positions = as_experiment_data(data).robots.final
 
     if len(robot_positions) < 2:
         raise ValueError("Not enough robots to form a line.")
 
     # Fit a line to the robots' final positions
-    robot_positions = np.array(robot_positions)
     A = np.vstack([robot_positions[:, 0], np.ones(len(robot_positions))]).T
     slope, intercept = np.linalg.lstsq(A, robot_positions[:, 1], rcond=None)[0]
 
@@ -220,14 +286,14 @@ def calculate_line_similarity(data, target_line: tuple) -> dict:
         else np.inf
     )
     slope_similarity = np.dot([1, slope], [1, target_slope]) / (
-            np.linalg.norm([1, slope]) * np.linalg.norm([1, target_slope])
+        np.linalg.norm([1, slope]) * np.linalg.norm([1, target_slope])
     )
 
     # Calculate point similarity (average distance between points on the fitted line and target line)
     point_distances = []
     for point in robot_positions:
         target_y = target_slope * point[0] + (
-                target_line[0][1] - target_slope * target_line[0][0]
+            target_line[0][1] - target_slope * target_line[0][0]
         )
         fitted_y = slope * point[0] + intercept
         point_distances.append(np.abs(target_y - fitted_y))
@@ -251,23 +317,12 @@ def evaluate_robot_final_positions(data) -> dict:
         - mean_displacement (float): The mean displacement of robots from their initial positions to their final positions.
         - area_ratio (float): The ratio of the area occupied by the robots' final positions to 25.
     """
-    robot_positions_initial = []
-    robot_positions_final = []
-
-    for entity_id, info in data.items():
-        if info["type"] == "Robot":
-            robot_positions_initial.append(info["trajectory"][0])
-            robot_positions_final.append(info["trajectory"][-1])
-
-    robot_positions_initial = np.array(robot_positions_initial)
-    robot_positions_final = np.array(robot_positions_final)
+    robots = as_experiment_data(data).robots
+    robot_positions_initial = robots.initial
+    robot_positions_final = robots.final
 
     # Calculate nearest neighbor distances for final positions
-    nearest_neighbor_distances = []
-    for i, pos1 in enumerate(robot_positions_final):
-        distances = np.linalg.norm(robot_positions_final - pos1, axis=1)
-        distances[i] = np.inf  # Exclude the distance to itself
-        nearest_neighbor_distances.append(np.min(distances))
+    nearest_neighbor_distances = robots.final_nearest_neighbor_distances
 
     mean_nearest_neighbor_distance = np.mean(nearest_neighbor_distances)
     variance_nearest_neighbor_distance = np.var(nearest_neighbor_distances)
@@ -319,7 +374,7 @@ def fit_circle(positions):
 
 
 def evaluate_robot_circle_similarity(
-        data, expected_circle_center: tuple, expected_circle_radius: float
+    data, expected_circle_center: tuple, expected_circle_radius: float
 ) -> dict:
     """
     Evaluate the similarity between the robots' final positions and a fitted circle,
@@ -336,13 +391,7 @@ def evaluate_robot_circle_similarity(
         - angle_standard_deviation (float): The standard deviation of the angle differences between adjacent robots.
         - angle_max_min_difference (float): The difference between the maximum and minimum angle intervals.
     """
-    robot_positions_final = []
-
-    for entity_id, info in data.items():
-        if info["type"] == "Robot":
-            robot_positions_final.append(info["trajectory"][-1])
-
-    robot_positions_final = np.array(robot_positions_final)
+    robot_positions_final = as_experiment_data(data).robots.final
     num_robots = len(robot_positions_final)
 
     if num_robots == 0:
@@ -361,14 +410,10 @@ def evaluate_robot_circle_similarity(
     radius_difference = np.abs(fitted_circle_radius - expected_circle_radius)
 
     # Step 3: Calculate the angle of each robot with respect to the fitted circle center
-    angles = []
-    for position in robot_positions_final:
-        dx, dy = position - np.array(fitted_circle_center)
-        angle = np.arctan2(dy, dx)
-        angles.append(angle)
+    offsets = robot_positions_final - np.array(fitted_circle_center)
+    angles = np.arctan2(offsets[:, 1], offsets[:, 0])
 
     # Normalize angles to be within [0, 2*pi]
-    angles = np.array(angles)
     angles = np.mod(angles, 2 * np.pi)
 
     # Sort the angles
@@ -398,15 +443,8 @@ def evaluate_trajectory_pattern(data) -> dict:
         - spatial_variance (float): Variance of the robot positions indicating the spread.
         - bounding_box_area (float): Area of the bounding box enclosing all final positions of the robots.
     """
-    robot_positions_final = []
-
-    for entity_id, info in data.items():
-        if info["type"] == "Robot":
-            robot_positions_final.append(
-                info["trajectory"][-1]
-            )  # Use the final position of each robot
-
-    robot_positions_final = np.array(robot_positions_final)
+    # Use the final position of each robot
+    robot_positions_final = as_experiment_data(data).robots.final
     num_robots = len(robot_positions_final)
 
     if num_robots == 0:
@@ -426,37 +464,30 @@ def evaluate_trajectory_pattern(data) -> dict:
     }
 
 
-def evaluate_trajectory_similarity(data) -> dict:
+def evaluate_trajectory_similarity(
+    data, window: float = 0.1, max_points: int = None, max_workers: int = 1
+) -> dict:
     """
     Evaluate the similarity between the trajectories of all robots using Dynamic Time Warping (DTW).
 
     :param data: dictionary containing information about entities, including their trajectories.
+    :param window: half width of the Sakoe-Chiba band of the DTW, as a fraction of the trajectory length.
+    :param max_points: downsample the trajectories to at most this many points before the DTW.
+    :param max_workers: number of processes computing the robot pairs.
     :return: A dictionary containing:
         - mean_dtw_distance (float): The mean DTW distance between all pairs of robot trajectories.
         - variance_dtw_distance (float): The variance of DTW distances between all pairs of robot trajectories.
     """
-    from fastdtw import fastdtw
-    from scipy.spatial.distance import euclidean
-
-    trajectories = []
-
-    for entity_id, info in data.items():
-        if info["type"] == "Robot":
-            trajectories.append(np.array(info["trajectory"]))
-        if info["type"] == "Prey":
-            trajectories.append(np.array(info["trajectory"]))
+    trajectories = as_experiment_data(data).group("Robot", "Prey").trajectories
 
     num_robots = len(trajectories)
 
     if num_robots < 2:
         raise ValueError("Not enough robots to calculate trajectory similarity.")
 
-    dtw_distances = []
-
-    for i in range(num_robots):
-        for j in range(i + 1, num_robots):
-            distance, _ = fastdtw(trajectories[i], trajectories[j], dist=euclidean)
-            dtw_distances.append(distance)
+    dtw_distances = pairwise_dtw(
+        trajectories, window=window, max_points=max_points, max_workers=max_workers
+    )
 
     mean_dtw_distance = np.mean(dtw_distances)
     variance_dtw_distance = np.var(dtw_distances)
@@ -475,34 +506,17 @@ def evaluate_min_distances_to_others(data) -> dict:
     :return: A dictionary containing:
         - max_min_distance (float): The maximum of the minimum distances between each robot's final position and the others.
     """
-    from scipy.spatial.distance import euclidean
-    robot_radius = 0.10
-    final_positions = []
-    for entity_id, info in data.items():
-        if info["type"] == "Robot":
-            # Assuming the final position is the last point in the trajectory
-            final_positions.append(np.array(info["trajectory"][-1]))
-    for entity_id, info in data.items():
-        if info["type"] == "Robot":
-            robot_radius = info["size"]
-
-    num_robots = len(final_positions)
+    robots = as_experiment_data(data).robots
+    num_robots = len(robots)
 
     if num_robots < 2:
         raise ValueError("Not enough robots to calculate distances.")
 
-    min_distances = []
-
-    for i in range(num_robots):
-        distances_to_others = []
-        for j in range(num_robots):
-            if i != j:
-                distance = euclidean(final_positions[i], final_positions[j])
-                distance = distance - 2 * robot_radius
-                distances_to_others.append(distance)
-        min_distances.append(min(distances_to_others))
+    # the size of the last robot is used for all of them
+    robot_radius = robots.sizes[-1]
+    min_distances = robots.final_nearest_neighbor_distances - 2 * robot_radius
 
-    max_min_distance = max(min_distances)
+    max_min_distance = np.max(min_distances)
 
     return {
         "max_min_distance": max_min_distance,
@@ -517,13 +531,7 @@ def evaluate_average_position(data) -> dict:
     :return: A dictionary containing:
         - average_position (tuple): The average position of all robots.
     """
-    robot_positions_final = []
-
-    for entity_id, info in data.items():
-        if info["type"] == "Robot":
-            robot_positions_final.append(info["trajectory"][-1])
-
-    robot_positions_final = np.array(robot_positions_final)
+    robot_positions_final = as_experiment_data(data).robots.final
     num_robots = len(robot_positions_final)
 
     if num_robots == 0:
@@ -542,15 +550,10 @@ def evaluate_average_distance_to_prey(data) -> dict:
     :return: A dictionary containing:
         - average_position (tuple): The average position of all robots.
     """
-    robot_positions_final = []
-    prey_final_position = []
-    for entity_id, info in data.items():
-        if info["type"] == "Robot":
-            robot_positions_final.append(info["trajectory"][-1])
-        elif info["type"] == "Prey":
-            prey_final_position = info["trajectory"][-1]
-
-    robot_positions_final = np.array(robot_positions_final)
+    experiment = as_experiment_data(data)
+    robot_positions_final = experiment.robots.final
+    # the last prey of the result
+    prey_final_position = experiment.preys.final[-1] if len(experiment.preys) else []
     num_robots = len(robot_positions_final)
 
     if num_robots == 0:
@@ -569,14 +572,8 @@ def evaluate_shape_similarity(data, target_shape: list) -> dict:
     :return: A dictionary containing:
         - procrustes_distance (float): A measure of dissimilarity between the robot positions and the target shape using Procrustes analysis.
     """
-    robot_positions_final = []
-
     # Collect the final positions of the robots
-    for entity_id, info in data.items():
-        if info["type"] == "Robot":
-            robot_positions_final.append(info["trajectory"][-1])
-
-    robot_positions_final = np.array(robot_positions_final)
+    robot_positions_final = as_experiment_data(data).robots.final
 
     if len(robot_positions_final) == 0:
         raise ValueError("No robots found in the data.")
@@ -590,39 +587,67 @@ def evaluate_shape_similarity(data, target_shape: list) -> dict:
             "The number of robot positions and the target shape points must be equal for Procrustes analysis."
         )
 
-    # Calculate the distance matrix between robot final positions and target shape points
-    distances = distance_matrix(robot_positions_final, target_shape)
+    # Step 3: Match the target shape points to the robots with the minimal summed distance
+    robot_indices = optimal_assignment(target_shape, robot_positions_final)
+    sorted_robot_positions = robot_positions_final[robot_indices]
 
-    # Step 3: Match each robot's final position to the closest target shape point
-    sorted_robot_positions = []
-    sorted_target_shape = []
-    used_robot_indices = set()
+    # Step 4: Perform Procrustes analysis
+    _, _, disparity = procrustes(target_shape, sorted_robot_positions)
 
-    for i in range(len(target_shape)):
-        # Find the closest robot to the current target point
-        closest_robot_index = np.argmin(distances[:, i])
+    return {"procrustes_distance": disparity}
 
-        # Ensure that no robot is used more than once
-        while closest_robot_index in used_robot_indices:
-            distances[closest_robot_index, i] = np.inf
-            closest_robot_index = np.argmin(distances[:, i])
 
-        used_robot_indices.add(closest_robot_index)
-        sorted_robot_positions.append(robot_positions_final[closest_robot_index])
-        sorted_target_shape.append(target_shape[i])
+def evaluate_shape_convergence(
+    data, target_shape: list, threshold: float = 0.1, interval: int = 1
+) -> dict:
+    """
+    Evaluate how the robots converge to a specified shape over the whole run, with the matching
+    and Procrustes analysis of evaluate_shape_similarity at every time step.
 
-    # Convert sorted lists to numpy arrays for Procrustes analysis
-    sorted_robot_positions = np.array(sorted_robot_positions)
-    sorted_target_shape = np.array(sorted_target_shape)
+    :param data: dictionary containing information about entities, including their trajectories.
+    :param target_shape: a list of tuples representing the vertices of the target shape in order.
+    :param threshold: the Procrustes distance below which the shape is considered formed.
+    :param interval: only evaluate every this many time steps.
+    :return: A dictionary containing:
+        - procrustes_distances (np.ndarray): The Procrustes distance at each evaluated time step.
+        - mean_procrustes_distance (float): The mean of these distances.
+        - convergence_step (int or None): The first time step from which the distance stays
+          below the threshold until the end, None if the shape is not formed at the end.
+    """
+    robots = as_experiment_data(data).robots
+    target_shape = np.array(target_shape, dtype=float)
 
-    # Step 4: Perform Procrustes analysis
-    _, _, disparity = procrustes(sorted_target_shape, sorted_robot_positions)
+    if len(robots) == 0:
+        raise ValueError("No robots found in the data.")
+    if len(robots) != len(target_shape):
+        raise ValueError(
+            "The number of robot positions and the target shape points must be equal for Procrustes analysis."
+        )
 
-    return {"procrustes_distance": disparity}
+    steps = np.arange(0, len(robots.positions), interval)
+    positions = robots.positions[steps]
+    # (T, N) robot of each target point at each step
+    robot_indices = batch_assignment(target_shape, positions)
+    sorted_positions = np.take_along_axis(positions, robot_indices[..., None], axis=1)
+    disparities = batch_procrustes_disparity(sorted_positions, target_shape)
+
+    outside = np.flatnonzero(disparities >= threshold)
+    if len(outside) == 0:
+        convergence_step = int(steps[0])
+    elif outside[-1] + 1 < len(steps):
+        convergence_step = int(steps[outside[-1] + 1])
+    else:
+        convergence_step = None
+
+    return {
+        "procrustes_distances": disparities,
+        "mean_procrustes_distance": float(np.mean(disparities)),
+        "convergence_step": convergence_step,
+    }
 
 
 def evaluate_encircling_end(
-        data, target_radius: float = 1, tolerance: float = 0.1
+    data, target_radius: float = 1, tolerance: float = 0.1
 ) -> dict:
     """
     Evaluate the task completion by calculating the mean and variance of the robots' final distances to the prey,
@@ -636,36 +661,20 @@ def evaluate_encircling_end(
         - variance_distance_error (float): The variance of the distance errors.
         - initial_distance_error (float): The initial mean distance to the target radius.
     """
-    robot_positions_initial = []
-    robot_positions_final = []
-    initial_distances = []
-    final_distances = []
-
-    prey_trajectory = None
+    experiment = as_experiment_data(data)
 
-    # First pass: find the prey trajectory
-    for entity_id, info in data.items():
-        if info["type"] == "Prey":
-            prey_trajectory = np.array(info["trajectory"])
-            break
-
-    if prey_trajectory is None:
+    # the first prey is the one to encircle
+    if not len(experiment.preys):
         raise ValueError("Prey trajectory not found in data.")
+    prey_trajectory = experiment.preys.trajectories[0]
 
     # Get the final position of the prey
     prey_final_position = prey_trajectory[-1]
 
-    # Process robot data
-    for entity_id, info in data.items():
-        if info["type"] == "Robot":
-            trajectory = np.array(info["trajectory"])
-            initial_distances.append(
-                np.linalg.norm(trajectory[0] - prey_trajectory[0])
-            )  # Distance at the start
-            robot_positions_initial.append(trajectory[0])
-            robot_positions_final.append(trajectory[-1])  # Distance at the final step
-
-    robot_positions_final = np.array(robot_positions_final)
+    robots = experiment.robots
+    # Distance at the start
+    initial_distances = np.linalg.norm(robots.initial - prey_trajectory[0], axis=1)
+    robot_positions_final = robots.final
 
     # Calculate final distances between robots and prey
     final_distances = np.linalg.norm(
@@ -689,7 +698,7 @@ def evaluate_encircling_end(
 
 
 def evaluate_robot_quadrant_positions(
-        data, target_regions: dict, tolerance: float = 0.1
+    data, target_regions: dict, tolerance: float = 0.1
 ) -> dict:
     """
     根据机器人最开始所在的象限进行分类，并检查每一类机器人是否最终位于指定的区域内。
@@ -702,39 +711,33 @@ def evaluate_robot_quadrant_positions(
         - total_achieved (int): 符合要求的机器人总数。
         - achievement_ratio (float): 符合要求的机器人占总数的比例。
     """
-    quadrant_robots = {1: [], 2: [], 3: [], 4: []}  # 第一象限  # 第二象限  # 第三象限  # 第四象限
+    robots = as_experiment_data(data).robots
+    initial, final = robots.initial, robots.final
 
     # 根据初始位置对机器人进行象限分类
-    for entity_id, info in data.items():
-        if info["type"] == "Robot":
-            initial_position = np.array(info["trajectory"][0])
-            if initial_position[0] >= 0 and initial_position[1] >= 0:
-                quadrant_robots[1].append((entity_id, info))
-            elif initial_position[0] < 0 and initial_position[1] >= 0:
-                quadrant_robots[2].append((entity_id, info))
-            elif initial_position[0] < 0 and initial_position[1] < 0:
-                quadrant_robots[3].append((entity_id, info))
-            elif initial_position[0] >= 0 and initial_position[1] < 0:
-                quadrant_robots[4].append((entity_id, info))
+    right, top = initial[:, 0] >= 0, initial[:, 1] >= 0
+    quadrants = np.select(
+        [right & top, ~right & top, ~right & ~top], [1, 2, 3], default=4
+    )
 
     # 计算符合要求的机器人数量
     achieved_robots_by_quadrant = {1: 0, 2: 0, 3: 0, 4: 0}
-    total_robots = sum(len(robots) for robots in quadrant_robots.values())
+    total_robots = len(robots)
 
-    for quadrant, robots in quadrant_robots.items():
+    for quadrant in achieved_robots_by_quadrant:
         target_region = target_regions.get(quadrant)
         if target_region is None:
             continue
 
         x_min, x_max, y_min, y_max = target_region
-
-        for entity_id, info in robots:
-            final_position = np.array(info["trajectory"][-1])
-            if (
-                    x_min - tolerance <= final_position[0] <= x_max + tolerance
-                    and y_min - tolerance <= final_position[1] <= y_max + tolerance
-            ):
-                achieved_robots_by_quadrant[quadrant] += 1
+        final_positions = final[quadrants == quadrant]
+        inside = (
+            (x_min - tolerance <= final_positions[:, 0])
+            & (final_positions[:, 0] <= x_max + tolerance)
+            & (y_min - tolerance <= final_positions[:, 1])
+            & (final_positions[:, 1] <= y_max + tolerance)
+        )
+        achieved_robots_by_quadrant[quadrant] = int(np.count_nonzero(inside))
 
     total_achieved = sum(achieved_robots_by_quadrant.values())
     achievement_ratio = total_achieved / total_robots if total_robots > 0 else 0
@@ -747,7 +750,7 @@ def evaluate_robot_quadrant_positions(
 
 
 def evaluate_robot_prey_distance(
-        data, distance_threshold: float = 1.0, proportion_threshold: float = 0.8
+    data, distance_threshold: float = 1.0, proportion_threshold: float = 0.8
 ) -> dict:
     """
     计算每个时刻机器人与猎物之间的距离，并统计至少80%机器人在猎物1m范围内的step数占总步数的比例。
@@ -760,42 +763,32 @@ def evaluate_robot_prey_distance(
         - total_steps (int): 总的时间步数。
         - within_distance_steps (int): 满足条件的时间步数。
     """
-    robot_positions = []
-    prey_trajectory = None
+    experiment = as_experiment_data(data)
 
     # 获取猎物的轨迹
-    for entity_id, info in data.items():
-        if info["type"] == "Prey":
-            prey_trajectory = np.array(info["trajectory"])
-            break
-
-    if prey_trajectory is None:
+    if not len(experiment.preys):
         raise ValueError("Prey trajectory not found in data.")
+    prey_trajectory = experiment.preys.trajectories[0]
 
     # 获取所有机器人的轨迹
-    for entity_id, info in data.items():
-        if info["type"] == "Robot":
-            robot_positions.append(np.array(info["trajectory"]))
-
-    if len(robot_positions) == 0:
+    robots = experiment.robots
+    if len(robots) == 0:
         raise ValueError("No robots found in data.")
 
-    robot_positions = np.array(robot_positions)
-    num_robots = robot_positions.shape[0]
+    num_robots = len(robots)
     total_steps = len(prey_trajectory)
-    within_distance_steps = 0
 
-    # 遍历每个时间步
-    for t in range(total_steps):
-        distances = np.linalg.norm(
-            robot_positions[:, t, :] - prey_trajectory[t], axis=1
-        )
-        # 统计距离猎物在指定范围内的机器人数量
-        num_within_distance = np.sum(distances <= distance_threshold)
+    # 所有时间步的距离, (T, N)
+    distances = np.linalg.norm(
+        robots.positions[:total_steps] - prey_trajectory[:, None, :], axis=-1
+    )
+    # 统计距离猎物在指定范围内的机器人数量
+    num_within_distance = np.sum(distances <= distance_threshold, axis=1)
 
-        # 如果至少80%的机器人在指定范围内
-        if num_within_distance / num_robots >= proportion_threshold:
-            within_distance_steps += 1
+    # 如果至少80%的机器人在指定范围内
+    within_distance_steps = int(
+        np.count_nonzero(num_within_distance / num_robots >= proportion_threshold)
+    )
 
     within_distance_steps_ratio = (
         within_distance_steps / total_steps if total_steps > 0 else 0
@@ -818,25 +811,21 @@ def check_robots_no_movement_in_first_third(data) -> dict:
     no_movement_robots = []
     if not data:
         return []
-    for entity_id, info in data.items():
-        if info["type"] == "Robot":
-            trajectory = np.array(info["trajectory"])
-            num_timesteps = len(trajectory)
-            one_third_timestep = num_timesteps // 3
-
-            # 判断机器人是否在前1/3时间内移动
-            initial_position = trajectory[10]
-            has_moved = False
-
-            for t in range(1, one_third_timestep):
-                if not np.allclose(initial_position, trajectory[t]):
-                    has_moved = True
-                    break
+    robots = as_experiment_data(data).robots
+    for entity_id, trajectory in zip(robots.ids, robots.trajectories):
+        one_third_timestep = len(trajectory) // 3
+
+        # 判断机器人是否在前1/3时间内移动
+        initial_position = trajectory[10]
+        has_moved = not np.all(
+            np.isclose(initial_position, trajectory[1:one_third_timestep])
+        )
 
-            if not has_moved:
-                no_movement_robots.append(entity_id)
+        if not has_moved:
+            no_movement_robots.append(entity_id)
 
     return {"no_move_num": len(no_movement_robots)}
 
+
 # if __name__ == '__main__':
 #     _, _, disparity = procrustes(target_shape, robot_positions_final)
@@ -0,0 +1,70 @@
+"""
+Copyright (c) 2024 WindyLab of Westlake University, China
+All rights reserved.
+
+This software is provided "as is" without warranty of any kind, either
+express or implied, including but not limited to the warranties of
+merchantability, fitness for a particular purpose, or non-infringement.
+In no event shall the authors or copyright holders be liable for any
+claim, damages, or other liability, whether in an action of contract,
+tort, or otherwise, arising from, out of, or in connection with the
+software or the use or other dealings in the software.
+"""
+
+import hashlib
+import inspect
+import os
+
+# the metrics of a run only depend on these modules and the analyze_result of its task
+METRIC_MODULES = ["metric.py", "experiment_data.py", "dtw.py"]
+
+
+def file_digest(path) -> str:
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def metric_code_version(*functions, extra: str = "") -> str:
+    """
+    Hash of the metric code: the metric modules, the source of the given functions, e.g. the
+    analyze_result of a runner, and any extra text such as the success conditions.
+    """
+    digest = hashlib.sha1()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for module in METRIC_MODULES:
+        with open(os.path.join(directory, module), "rb") as f:
+            digest.update(f.read())
+    for function in functions:
+        try:
+            digest.update(inspect.getsource(function).encode())
+        except (OSError, TypeError):
+            digest.update(repr(function).encode())
+    digest.update(extra.encode())
+    return digest.hexdigest()
+
+
+def metric_cache_entry(trajectory_path, code_version: str) -> dict | None:
+    """
+    The cache key saved with an analysis: the digest of its trajectory file and the version
+    of the metric code that computed it. None if the trajectory file does not exist.
+    """
+    if not os.path.exists(trajectory_path):
+        return None
+    return {
+        "trajectory_digest": file_digest(trajectory_path),
+        "code_version": code_version,
+    }
+
+
+def is_cached(entry: dict | None, trajectory_path, code_version: str) -> bool:
+    """
+    Whether an analysis saved with this cache entry is still valid for the trajectory file.
+    """
+    if not entry or entry.get("code_version") != code_version:
+        return False
+    if not os.path.exists(trajectory_path):
+        return False
+    return entry.get("trajectory_digest") == file_digest(trajectory_path)
@@ -0,0 +1,135 @@
+"""
+Copyright (c) 2024 WindyLab of Westlake University, China
+All rights reserved.
+
+This software is provided "as is" without warranty of any kind, either
+express or implied, including but not limited to the warranties of
+merchantability, fitness for a particular purpose, or non-infringement.
+In no event shall the authors or copyright holders be liable for any
+claim, damages, or other liability, whether in an action of contract,
+tort, or otherwise, arising from, out of, or in connection with the
+software or the use or other dealings in the software.
+"""
+
+import json
+import os
+from collections.abc import Mapping
+
+import numpy as np
+
+
+def to_serializable(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (np.floating, np.integer, np.bool_)):
+        return obj.item()
+    if isinstance(obj, Mapping):
+        return {k: to_serializable(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_serializable(i) for i in obj]
+    return obj
+
+
+def scalar_metrics(analysis: dict) -> dict:
+    return {
+        key: value
+        for key, value in to_serializable(analysis).items()
+        if isinstance(value, (bool, int, float, str)) or value is None
+    }
+
+
+def save_experiment_result(
+    experiment_dir, name: str, result, analysis: dict, metric_cache: dict = None
+) -> str:
+    """
+    Save the analysis of a run as {name}.json and its trajectories as the binary {name}.npz.
+
+    EnvironmentManager already saves {name}.npz when the run ends, the trajectories are only
+    written here for results loaded from the .pkl files of older runs.
+
+    metric_cache is the entry of run.utils.metric_cache the analysis was computed for, it
+    lets a later analysis skip the run while neither its trajectories nor the metrics change.
+
+    Returns:
+        str: The path of the analysis file.
+    """
+    os.makedirs(experiment_dir, exist_ok=True)
+    trajectory_file = f"{name}.npz"
+    if result is not None and not os.path.exists(
+        os.path.join(experiment_dir, trajectory_file)
+    ):
+        from run.auto_runner.core.trajectory_recorder import save_trajectory_result
+
+        save_trajectory_result(os.path.join(experiment_dir, name), result)
+    record = {
+        "analysis": to_serializable(analysis),
+        "trajectory_file": trajectory_file if result is not None else None,
+        "metric_cache": metric_cache,
+    }
+    result_file = os.path.join(experiment_dir, f"{name}.json")
+    temporary_file = f"{result_file}.tmp"
+    with open(temporary_file, "w") as f:
+        json.dump(record, f, indent=4)
+    os.replace(temporary_file, result_file)
+    return result_file
+
+
+def load_result_record(experiment_dir, name: str) -> dict | None:
+    """
+    The whole record saved by save_experiment_result, None if the run has no result.
+    """
+    result_file = os.path.join(experiment_dir, f"{name}.json")
+    if not os.path.exists(result_file):
+        return None
+    with open(result_file, "r") as f:
+        return json.load(f)
+
+
+def load_analysis(experiment_dir, name: str) -> dict | None:
+    """
+    The analysis saved by save_experiment_result, None if the run has no result.
+    """
+    record = load_result_record(experiment_dir, name)
+    if record is None:
+        return None
+    return record.get("analysis", {})
+
+
+def compact_result_file(experiment_dir, name: str) -> bool:
+    """
+    Split a {name}.json written before the trajectories were stored separately into the
+    analysis file and {name}.npz.
+
+    Returns:
+        bool: Whether the file had to be compacted.
+    """
+    result_file = os.path.join(experiment_dir, f"{name}.json")
+    if not os.path.exists(result_file):
+        return False
+    with open(result_file, "r") as f:
+        result_data = json.load(f)
+    if "experiment_data" not in result_data:
+        return False
+    result = result_data["experiment_data"] or None
+    save_experiment_result(
+        experiment_dir, name, result, result_data.get("analysis", {})
+    )
+    return True
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Move the trajectories out of the result files of a workspace."
+    )
+    parser.add_argument("workspace_dir", type=str)
+    args = parser.parse_args()
+    compacted = 0
+    for root, _, files in os.walk(args.workspace_dir):
+        for file in files:
+            if file.endswith(".json") and compact_result_file(
+                root, file[: -len(".json")]
+            ):
+                compacted += 1
+    print(f"Compacted {compacted} result files")
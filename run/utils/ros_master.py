@@ -0,0 +1,113 @@
+"""
+Copyright (c) 2024 WindyLab of Westlake University, China
+All rights reserved.
+
+This software is provided "as is" without warranty of any kind, either
+express or implied, including but not limited to the warranties of
+merchantability, fitness for a particular purpose, or non-infringement.
+In no event shall the authors or copyright holders be liable for any
+claim, damages, or other liability, whether in an action of contract,
+tort, or otherwise, arising from, out of, or in connection with the
+software or the use or other dealings in the software.
+"""
+
+import os
+import signal
+import socket
+import subprocess
+import time
+
+from modules.utils.process_group import kill_process_group
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+class IsolatedRosMaster:
+    """
+    A roscore of its own for one experiment process, on a free port.
+
+    Starting it points ROS_MASTER_URI of this process at it before rospy.init_node, so the
+    simulation, its services (/start_environment, /get_target_positions, ...), the topics
+    (/observation, /robot_i/velocity) and the parameters are only visible to the robot
+    processes it spawns, which inherit the variable. Several experiments then run side by
+    side with the same topic names and no cross-talk. The roscore runs in its own process
+    group and stop() tears down only that group, instead of `killall roscore`.
+
+    Usage:
+        with IsolatedRosMaster():
+            runner = runner_class(...)
+            runner.run()
+    """
+
+    def __init__(self, port: int = None, startup_timeout: float = 15.0):
+        self.port = port
+        self.startup_timeout = startup_timeout
+        self.process = None
+        self._previous_uri = None
+
+    @property
+    def uri(self) -> str:
+        return f"http://localhost:{self.port}/"
+
+    def _listening(self) -> bool:
+        try:
+            with socket.create_connection(("localhost", self.port), timeout=0.5):
+                return True
+        except OSError:
+            return False
+
+    def start(self) -> str:
+        """
+        Start the roscore and wait until it accepts connections.
+
+        Returns:
+            str: The ROS_MASTER_URI of the new master.
+        """
+        if self.port is None:
+            self.port = free_port()
+        self._previous_uri = os.environ.get("ROS_MASTER_URI")
+        env = {**os.environ, "ROS_MASTER_URI": self.uri}
+        self.process = subprocess.Popen(
+            ["roscore", "-p", str(self.port)],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            env=env,
+            start_new_session=True,
+        )
+        deadline = time.time() + self.startup_timeout
+        while not self._listening():
+            if self.process.poll() is not None or time.time() > deadline:
+                self.stop()
+                raise RuntimeError(f"roscore did not start on port {self.port}")
+            time.sleep(0.1)
+        os.environ["ROS_MASTER_URI"] = self.uri
+        print(f"Started roscore at {self.uri}")
+        return self.uri
+
+    def stop(self, timeout: float = 5.0):
+        if self.process is None:
+            return
+        # SIGINT lets roslaunch shut down rosmaster and rosout itself
+        kill_process_group(self.process.pid, signal.SIGINT)
+        try:
+            self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            pass
+        kill_process_group(self.process.pid)
+        self.process.wait()
+        self.process = None
+        if self._previous_uri is None:
+            os.environ.pop("ROS_MASTER_URI", None)
+        else:
+            os.environ["ROS_MASTER_URI"] = self._previous_uri
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -0,0 +1,348 @@
+"""
+Copyright (c) 2024 WindyLab of Westlake University, China
+All rights reserved.
+
+This software is provided "as is" without warranty of any kind, either
+express or implied, including but not limited to the warranties of
+merchantability, fitness for a particular purpose, or non-infringement.
+In no event shall the authors or copyright holders be liable for any
+claim, damages, or other liability, whether in an action of contract,
+tort, or otherwise, arising from, out of, or in connection with the
+software or the use or other dealings in the software.
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import time
+from contextlib import closing
+
+QUEUE_FILE = "work_queue.db"
+# pending: waiting, possibly until available_at after a failure; leased: running until
+# lease_expires; done and failed are final
+STATES = ["pending", "leased", "done", "failed"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sweep TEXT NOT NULL,
+    key TEXT NOT NULL,
+    job_group TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    last_error TEXT,
+    duration REAL,
+    created_at REAL NOT NULL,
+    finished_at REAL,
+    UNIQUE (sweep, key)
+);
+CREATE INDEX IF NOT EXISTS jobs_by_state ON jobs (sweep, state, job_group, priority);
+"""
+
+
+def lease_owner(name: str = "") -> str:
+    """
+    A lease owner name unique to this process, e.g. "host:1234:worker3".
+    """
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    return f"{owner}:{name}" if name else owner
+
+
+class WorkQueue:
+    """
+    Durable SQLite queue of the jobs of experiment sweeps, so that a sweep that crashed or was
+    stopped resumes exactly where it stopped.
+
+    Jobs are identified by (sweep, key) and enqueued once: enqueueing the same sweep again only
+    adds the jobs it did not have, whatever the state of the others. lease() hands out the
+    pending job of highest priority, in enqueue order, and marks it leased until lease_expires;
+    a job whose lease expired (its process died) is handed out again. A failed attempt goes back
+    to pending after an exponential backoff until max_attempts, then stays failed.
+    """
+
+    def __init__(
+        self,
+        db_path=None,
+        max_attempts: int = 3,
+        backoff: float = 30.0,
+        max_backoff: float = 600.0,
+    ):
+        """
+        Args:
+            db_path: The database file, workspace/work_queue.db by default.
+            max_attempts (int): Attempts of a job before it stays failed, for newly enqueued jobs.
+            backoff (float): Seconds before the second attempt, doubled for each further attempt.
+            max_backoff (float): Upper bound of the backoff, in seconds.
+        """
+        if db_path is None:
+            from modules.utils import root_manager
+
+            db_path = root_manager.project_root / "workspace" / QUEUE_FILE
+        self.db_path = str(db_path)
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # several sweeps and processes use the same queue
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _job(row: sqlite3.Row) -> dict:
+        return {**dict(row), "payload": json.loads(row["payload"])}
+
+    def enqueue(
+        self, sweep: str, jobs: list[tuple[str, str, dict]], priority: int = 0
+    ) -> int:
+        """
+        Add the jobs a sweep does not have yet.
+
+        Args:
+            sweep (str): The name of the sweep.
+            jobs (list[tuple[str, str, dict]]): The key, the group and the JSON payload of each
+                job. Jobs of a group are meant to be run by the same worker, see lease().
+            priority (int): Jobs of higher priority are leased first.
+
+        Returns:
+            int: The number of jobs added.
+        """
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                before = conn.total_changes
+                conn.executemany(
+                    "INSERT OR IGNORE INTO jobs (sweep, key, job_group, payload, priority, "
+                    "max_attempts, available_at, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (
+                            sweep,
+                            key,
+                            group,
+                            json.dumps(payload),
+                            priority,
+                            self.max_attempts,
+                            now,
+                            now,
+                        )
+                        for key, group, payload in jobs
+                    ],
+                )
+                added = conn.total_changes - before
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return added
+
+    def lease(
+        self, sweep: str, owner: str, lease_time: float, group: str = None
+    ) -> dict | None:
+        """
+        Take the next job of the sweep, of one group if given, and count the attempt.
+
+        Returns:
+            dict | None: The job row with its payload, None if no job is available now.
+        """
+        now = time.time()
+        condition = (
+            "sweep = ? AND ((state = 'pending' AND available_at <= ?) "
+            "OR (state = 'leased' AND lease_expires < ?))"
+        )
+        values = [sweep, now, now]
+        if group is not None:
+            condition += " AND job_group = ?"
+            values.append(group)
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._fail_expired(conn, sweep, now)
+                row = conn.execute(
+                    f"SELECT * FROM jobs WHERE {condition} ORDER BY priority DESC, id LIMIT 1",
+                    values,
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET state = 'leased', lease_owner = ?, lease_expires = ?, "
+                        "attempts = attempts + 1 WHERE id = ?",
+                        (owner, now + lease_time, row["id"]),
+                    )
+                    row = conn.execute(
+                        "SELECT * FROM jobs WHERE id = ?", (row["id"],)
+                    ).fetchone()
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return self._job(row) if row is not None else None
+
+    @staticmethod
+    def _fail_expired(conn: sqlite3.Connection, sweep: str, now: float):
+        # the process of an expired lease died during its last attempt
+        conn.execute(
+            "UPDATE jobs SET state = 'failed', finished_at = ?, lease_owner = NULL, "
+            "last_error = COALESCE(last_error, 'Lease expired') "
+            "WHERE sweep = ? AND state = 'leased' AND lease_expires < ? AND attempts >= max_attempts",
+            (now, sweep, now),
+        )
+
+    def _finish(self, job_id: int, owner: str, sql: str, values: tuple) -> bool:
+        with closing(self._connect()) as conn, conn:
+            cursor = conn.execute(
+                f"UPDATE jobs SET {sql} WHERE id = ? AND state = 'leased' AND lease_owner = ?",
+                (*values, job_id, owner),
+            )
+        return cursor.rowcount == 1
+
+    def heartbeat(self, job_id: int, owner: str, lease_time: float) -> bool:
+        """
+        Extend the lease of a running job.
+
+        Returns:
+            bool: False if the job is no longer leased by owner, e.g. after its lease expired.
+        """
+        return self._finish(
+            job_id, owner, "lease_expires = ?", (time.time() + lease_time,)
+        )
+
+    def complete(self, job_id: int, owner: str, duration: float = None) -> bool:
+        return self._finish(
+            job_id,
+            owner,
+            "state = 'done', lease_owner = NULL, lease_expires = NULL, duration = ?, finished_at = ?",
+            (duration, time.time()),
+        )
+
+    def fail(
+        self,
+        job_id: int,
+        owner: str,
+        error: str,
+        duration: float = None,
+        exhausted_state: str = "failed",
+    ) -> bool:
+        """
+        Record a failed attempt: the job is retried after the backoff, or ends in exhausted_state
+        once it had max_attempts attempts.
+        """
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT attempts, max_attempts FROM jobs "
+                    "WHERE id = ? AND state = 'leased' AND lease_owner = ?",
+                    (job_id, owner),
+                ).fetchone()
+                if row is not None:
+                    now = time.time()
+                    if row["attempts"] < row["max_attempts"]:
+                        delay = min(
+                            self.backoff * 2 ** (row["attempts"] - 1), self.max_backoff
+                        )
+                        state, available_at, finished_at = "pending", now + delay, None
+                    else:
+                        state, available_at, finished_at = exhausted_state, now, now
+                    conn.execute(
+                        "UPDATE jobs SET state = ?, available_at = ?, finished_at = ?, "
+                        "lease_owner = NULL, lease_expires = NULL, last_error = ?, duration = ? "
+                        "WHERE id = ?",
+                        (state, available_at, finished_at, error, duration, job_id),
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return row is not None
+
+    def release(self, job_id: int, owner: str) -> bool:
+        """
+        Put a leased job back without counting the attempt, e.g. when the sweep is interrupted.
+        """
+        return self._finish(
+            job_id,
+            owner,
+            "state = 'pending', lease_owner = NULL, lease_expires = NULL, attempts = attempts - 1",
+            (),
+        )
+
+    def counts(self, sweep: str) -> dict[str, int]:
+        """
+        The number of jobs of the sweep in each state.
+        """
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT state, COUNT(*) AS count FROM jobs WHERE sweep = ? GROUP BY state",
+                (sweep,),
+            ).fetchall()
+        return {state: 0 for state in STATES} | {
+            row["state"]: row["count"] for row in rows
+        }
+
+    def groups(self, sweep: str) -> list[str]:
+        """
+        The groups of the sweep with jobs left to run, by their highest priority and first job.
+        """
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT job_group FROM jobs WHERE sweep = ? AND state IN ('pending', 'leased') "
+                "GROUP BY job_group ORDER BY MAX(priority) DESC, MIN(id)",
+                (sweep,),
+            ).fetchall()
+        return [row["job_group"] for row in rows]
+
+    def next_available(self, sweep: str) -> float | None:
+        """
+        When the next pending or leased job of the sweep can be leased, None if there is none.
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT MIN(CASE state WHEN 'pending' THEN available_at ELSE lease_expires END) "
+                "AS at FROM jobs WHERE sweep = ? AND state IN ('pending', 'leased')",
+                (sweep,),
+            ).fetchone()
+        return row["at"]
+
+    def jobs(self, sweep: str, state: str = None) -> list[dict]:
+        sql, values = "SELECT * FROM jobs WHERE sweep = ?", [sweep]
+        if state is not None:
+            sql += " AND state = ?"
+            values.append(state)
+        with closing(self._connect()) as conn:
+            rows = conn.execute(sql + " ORDER BY id", values).fetchall()
+        return [self._job(row) for row in rows]
+
+    def retry_failed(self, sweep: str) -> int:
+        """
+        Give the failed jobs of the sweep a new set of attempts.
+
+        Returns:
+            int: The number of jobs put back.
+        """
+        with closing(self._connect()) as conn, conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET state = 'pending', attempts = 0, available_at = ?, finished_at = NULL "
+                "WHERE sweep = ? AND state = 'failed'",
+                (time.time(), sweep),
+            )
+        return cursor.rowcount
+
+    def reset(self, sweep: str) -> int:
+        """
+        Forget the jobs of a sweep, so that enqueueing it again starts it over.
+        """
+        with closing(self._connect()) as conn, conn:
+            cursor = conn.execute("DELETE FROM jobs WHERE sweep = ?", (sweep,))
+        return cursor.rowcount
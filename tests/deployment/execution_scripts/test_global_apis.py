@@ -0,0 +1,62 @@
+import importlib.util
+import os
+import sys
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from modules.utils import get_project_root
+
+GLOBAL_APIS = os.path.join(
+    get_project_root(), "modules/deployment/execution_scripts/global_apis.py"
+)
+
+
+def load_global_apis():
+    # global_apis imports rospy, the code_llm messages and apis at the top
+    modules = {
+        name: mock.MagicMock()
+        for name in ("rospy", "code_llm", "code_llm.msg", "code_llm.srv", "apis")
+    }
+    with mock.patch.dict(sys.modules, modules):
+        spec = importlib.util.spec_from_file_location("robot_global_apis", GLOBAL_APIS)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    return module
+
+
+def observation(entity_id, kind, x, y, color="blue"):
+    return mock.Mock(id=entity_id, type=kind, color=color, position=mock.Mock(x=x, y=y))
+
+
+class TestResetInitialObservations(unittest.TestCase):
+    def test_next_trial_waits_for_its_own_observations(self):
+        global_apis = load_global_apis()
+        positions = global_apis.initial_robot_positions
+        global_apis.init = True
+        global_apis.process_initial_observations(
+            mock.Mock(
+                observations=[
+                    observation(1, "Robot", 1.0, 2.0),
+                    observation(5, "Prey", 3.0, 4.0),
+                    observation(9, "Landmark", 0.0, 1.0, color="gray"),
+                ]
+            )
+        )
+        global_apis.initial_observations_ready.set()
+        np.testing.assert_allclose(global_apis.initial_prey_position, [3.0, 4.0])
+
+        global_apis.reset_initial_observations()
+        self.assertFalse(global_apis.init)
+        self.assertFalse(global_apis.initial_observations_ready.is_set())
+        # cleared in place, for the skills that kept a reference
+        self.assertIs(global_apis.initial_robot_positions, positions)
+        self.assertEqual(positions, {})
+        self.assertEqual(global_apis.all_robots_id, [])
+        self.assertEqual(global_apis.initial_unexplored_areas, [])
+        self.assertEqual(global_apis.initial_prey_position, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
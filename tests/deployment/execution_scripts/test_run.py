@@ -0,0 +1,178 @@
+import ast
+import importlib.util
+import os
+import sys
+import tempfile
+import textwrap
+import unittest
+from unittest import mock
+
+from modules.utils import get_project_root
+
+RUN_SCRIPT = os.path.join(
+    get_project_root(), "modules/deployment/execution_scripts/run.py"
+)
+
+
+def load_run_script():
+    # run.py imports rospy and the code_llm services at the top, the rewrite needs neither
+    ros_modules = {
+        "rospy": mock.MagicMock(),
+        "code_llm": mock.MagicMock(),
+        "code_llm.srv": mock.MagicMock(),
+    }
+    with mock.patch.dict(sys.modules, ros_modules):
+        spec = importlib.util.spec_from_file_location("robot_run_script", RUN_SCRIPT)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    return module
+
+
+run_script = load_run_script()
+
+
+def sleep_calls(source: str) -> list[bool]:
+    tree = ast.parse(textwrap.dedent(source))
+    return [
+        run_script._is_sleep_call(node)
+        for node in ast.walk(tree)
+        if isinstance(node, ast.Call)
+    ]
+
+
+class TestIsSleepCall(unittest.TestCase):
+    def test_sleep_calls(self):
+        self.assertEqual(sleep_calls("time.sleep(0.1)"), [True])
+        self.assertEqual(sleep_calls("rospy.sleep(0.1)"), [True])
+        self.assertEqual(sleep_calls("sleep(0.1)"), [True])
+
+    def test_other_calls(self):
+        self.assertEqual(sleep_calls("np.sleep(0.1)"), [False])
+        self.assertEqual(sleep_calls("robot.time.sleep(0.1)"), [False])
+        self.assertEqual(sleep_calls("set_self_velocity(v)"), [False])
+
+
+class TestResetTrialState(unittest.TestCase):
+    def test_resets_apis_and_global_apis(self):
+        apis, global_apis = mock.MagicMock(), mock.MagicMock()
+        with mock.patch.dict(sys.modules, {"apis": apis, "global_apis": global_apis}):
+            run_script.reset_trial_state()
+        apis.reset_trial.assert_called_once_with()
+        global_apis.reset_initial_observations.assert_called_once_with()
+
+    def test_global_apis_not_imported(self):
+        apis = mock.MagicMock()
+        with mock.patch.dict(sys.modules, {"apis": apis}):
+            sys.modules.pop("global_apis", None)
+            run_script.reset_trial_state()
+        apis.reset_trial.assert_called_once_with()
+
+
+class TestTickController(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def skill_module(self, source: str):
+        path = os.path.join(self.directory.name, "local_skill.py")
+        with open(path, "w") as f:
+            f.write(textwrap.dedent(source))
+        spec = importlib.util.spec_from_file_location("local_skill", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+    def test_time_sleep(self):
+        module = self.skill_module(
+            """
+            import time
+
+            LOADS = []
+            LOADS.append(1)
+            STEPS = []
+
+            def step():
+                STEPS.append(len(STEPS))
+
+            def run_loop():
+                while True:
+                    step()
+                    time.sleep(0.05)
+            """
+        )
+        controller = run_script.tick_controller_of(module)
+        generator = controller()
+        self.assertEqual([next(generator) for _ in range(3)], [0.05] * 3)
+        # compiled against the module: its state is shared and it did not run again
+        self.assertEqual(module.STEPS, [0, 1, 2])
+        self.assertEqual(module.LOADS, [1])
+        self.assertIsNot(controller, module.run_loop)
+
+    def test_from_time_import_sleep(self):
+        module = self.skill_module(
+            """
+            from time import sleep
+
+            def run_loop():
+                for _ in range(2):
+                    sleep(0.1)
+            """
+        )
+        self.assertEqual(list(run_script.tick_controller_of(module)()), [0.1, 0.1])
+
+    def test_sleep_nested_in_loops(self):
+        module = self.skill_module(
+            """
+            import time
+
+            def run_loop():
+                for i in range(2):
+                    while True:
+                        if i == 0:
+                            time.sleep(0.1)
+                        else:
+                            time.sleep()
+                        break
+            """
+        )
+        self.assertEqual(list(run_script.tick_controller_of(module)()), [0.1, None])
+
+    def test_sleep_in_helper_falls_back(self):
+        module = self.skill_module(
+            """
+            import time
+
+            def wait():
+                time.sleep(0.1)
+
+            def run_loop():
+                while True:
+                    wait()
+                    time.sleep(0.1)
+            """
+        )
+        self.assertIsNone(run_script.tick_controller_of(module))
+
+    def test_no_sleep_falls_back(self):
+        module = self.skill_module(
+            """
+            def run_loop():
+                return None
+            """
+        )
+        self.assertIsNone(run_script.tick_controller_of(module))
+
+    def test_generator_run_loop(self):
+        module = self.skill_module(
+            """
+            def run_loop():
+                yield 0.2
+            """
+        )
+        self.assertIs(run_script.tick_controller_of(module), module.run_loop)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+
+from modules.utils import get_project_root
+
+SMOKE_TEST = os.path.join(
+    get_project_root(), "modules/deployment/execution_scripts/run_smoke.py"
+)
+
+WORLD = {
+    "entities": [
+        {
+            "id": i,
+            "type": "Robot",
+            "position": [0.3 * i, 0.0],
+            "size": 0.15,
+            "color": "blue",
+            "target_position": None,
+        }
+        for i in range(5)
+    ]
+    + [
+        {
+            "id": 5,
+            "type": "Obstacle",
+            "position": [1.0, 1.0],
+            "size": 0.3,
+            "color": "gray",
+            "target_position": None,
+        }
+    ],
+    "dt": 0.01,
+    "max_speed": 0.2,
+}
+
+LOCAL_SKILL = """
+import time
+import numpy as np
+from apis import get_self_position, get_surrounding_robots_info, get_assigned_task, set_self_velocity
+
+def run_loop():
+    while True:
+        position = get_self_position()
+        velocity = -position
+        for robot in get_surrounding_robots_info():
+            velocity += position - robot["position"]
+        set_self_velocity(velocity + get_assigned_task())
+        time.sleep(0.01)
+"""
+
+GLOBAL_SKILL = """
+from global_apis import get_all_robots_id
+
+def allocate_run():
+    return {robot_id: [0.0, 0.1] for robot_id in get_all_robots_id()}
+"""
+
+
+class TestSmokeTest(unittest.TestCase):
+    def run_smoke_test(
+        self, local_skill=LOCAL_SKILL, global_skill=GLOBAL_SKILL, timeout=30
+    ):
+        with tempfile.TemporaryDirectory() as directory:
+            for name, source in [
+                ("local_skill.py", local_skill),
+                ("global_skill.py", global_skill),
+            ]:
+                with open(os.path.join(directory, name), "w") as f:
+                    f.write(textwrap.dedent(source))
+            with open(os.path.join(directory, "world.json"), "w") as f:
+                json.dump(WORLD, f)
+            process = subprocess.run(
+                [
+                    sys.executable,
+                    SMOKE_TEST,
+                    "world.json",
+                    "--ticks",
+                    "200",
+                    "--wall_timeout",
+                    "2",
+                    "--global",
+                ],
+                cwd=directory,
+                capture_output=True,
+                text=True,
+                timeout=timeout,
+            )
+            with open(os.path.join(directory, "smoke_test.json")) as f:
+                return process, json.load(f)
+
+    def test_passes(self):
+        process, report = self.run_smoke_test()
+        self.assertEqual(process.returncode, 0, process.stderr)
+        self.assertEqual(report["status"], "passed")
+        self.assertEqual(report["ticks"], 200)
+        self.assertLess(report["wall_time"], 2)
+
+    def test_local_exception(self):
+        local_skill = LOCAL_SKILL.replace(
+            "time.sleep(0.01)", "time.sleep(0.5)\n        [][0]"
+        )
+        process, report = self.run_smoke_test(local_skill=local_skill)
+        self.assertEqual(process.returncode, 1)
+        self.assertEqual(report["status"], "failed")
+        self.assertEqual(report["scope"], "local")
+        self.assertIn("IndexError", report["error"])
+        self.assertIn("local_skill.py", report["error"])
+        # the robots slept through 50 ticks before the first one failed
+        self.assertEqual(report["ticks"], 50)
+
+    def test_global_exception(self):
+        global_skill = GLOBAL_SKILL.replace("[0.0, 0.1]", "undefined_name")
+        process, report = self.run_smoke_test(global_skill=global_skill)
+        self.assertEqual(report["status"], "failed")
+        self.assertEqual(report["scope"], "global")
+        self.assertIn("NameError", report["error"])
+        self.assertEqual(report["ticks"], 0)
+
+    def test_loop_without_sleep_times_out(self):
+        local_skill = LOCAL_SKILL.replace("time.sleep(0.01)", "pass")
+        process, report = self.run_smoke_test(local_skill=local_skill)
+        self.assertEqual(process.returncode, 0)
+        self.assertEqual(report["status"], "timeout")
+        self.assertIsNone(report["error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
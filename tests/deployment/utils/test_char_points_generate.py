@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from modules.deployment.utils.char_points_generate import (
+    ContourCache,
+    _default_font_path,
+    sample_contour_points,
+    validate_contour_points,
+)
+
+
+def reference_sample_contour_points(contours, num_points):
+    # the original loop-based resampling
+    all_points = []
+    total_length = 0
+    for contour in contours:
+        contour = contour[:, 0, :]
+        distances = np.sqrt(np.sum(np.diff(contour, axis=0) ** 2, axis=1))
+        total_length += np.sum(distances)
+        all_points.append((contour, distances))
+    sample_distance = total_length / num_points
+    sampled_points = []
+    accumulated_distance = 0
+    for contour, distances in all_points:
+        for i in range(1, len(contour)):
+            segment_distance = distances[i - 1]
+            accumulated_distance += segment_distance
+            while accumulated_distance >= sample_distance:
+                ratio = (accumulated_distance - sample_distance) / segment_distance
+                sampled_points.append(
+                    tuple(contour[i] - ratio * (contour[i] - contour[i - 1]))
+                )
+                accumulated_distance -= sample_distance
+    return sampled_points
+
+
+class TestSampleContourPoints(unittest.TestCase):
+    def test_matches_loop_implementation(self):
+        square = np.array([[0, 0], [10, 0], [10, 10], [0, 10], [0, 0]])[:, None, :]
+        line = np.array([[20, 0], [20, 0], [20, 7]])[:, None, :]
+        contours = [square, line]
+        expected = np.array(reference_sample_contour_points(contours, 13))
+        sampled = np.array(sample_contour_points(contours, 13))
+        self.assertEqual(len(sampled), 13)
+        np.testing.assert_allclose(sampled[: len(expected)], expected)
+
+    def test_empty(self):
+        self.assertEqual(sample_contour_points([], 10), [])
+        point = np.array([[1, 1]])[:, None, :]
+        self.assertEqual(sample_contour_points([point], 10), [])
+
+
+class TestContourCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_memory_and_disk_cache(self):
+        cache = ContourCache(cache_dir=self.directory.name, max_size=1)
+        points = cache.get("R", 50)
+        np.testing.assert_allclose(points, validate_contour_points("R", 50))
+        self.assertIs(cache.get("R", 50), points)
+        self.assertFalse(points.flags.writeable)
+
+        # a new cache reads the file written by the first one
+        other = ContourCache(cache_dir=self.directory.name)
+        with mock.patch(
+            "modules.deployment.utils.char_points_generate.validate_contour_points"
+        ) as mock_validate:
+            np.testing.assert_allclose(other.get("R", 50), points)
+            mock_validate.assert_not_called()
+
+    def test_font_path_is_rendered(self):
+        cache = ContourCache(cache_dir=self.directory.name)
+        font_path = os.path.join(self.directory.name, "font.ttf")
+        shutil.copy(_default_font_path(), font_path)
+        with mock.patch(
+            "modules.deployment.utils.char_points_generate.validate_contour_points",
+            return_value=np.zeros((20, 2)),
+        ) as mock_validate:
+            cache.get("R", 20, font_path=font_path)
+        mock_validate.assert_called_once_with("R", 20, False, font_path=font_path)
+
+    def test_lru_eviction(self):
+        cache = ContourCache(cache_dir=self.directory.name, max_size=1)
+        first = cache.get("A", 20)
+        cache.get("B", 20)
+        self.assertIsNot(cache.get("A", 20), first)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from modules.deployment.utils.command_telemetry import CommandTelemetry
+
+
+class TestCommandTelemetry(unittest.TestCase):
+    def setUp(self):
+        self.telemetry = CommandTelemetry(stale_after=0.05)
+        self.telemetry.start_time = 0.0
+
+    def test_latency_series(self):
+        self.telemetry.on_observation(1.00)
+        self.telemetry.on_command_info(
+            1, sent=1.01, observation_tick=0, observation_stamp=1.00, received=1.012
+        )
+        self.telemetry.on_velocity(1, 1.012)
+        self.telemetry.record_step(1.02, 1)
+        # no new command, the last one is applied again and ages
+        self.telemetry.record_step(1.10, 2)
+
+        series = self.telemetry.series()
+        np.testing.assert_allclose(series["obs_to_cmd"], [0.01, 0.01])
+        np.testing.assert_allclose(series["cmd_to_apply"], [0.008, 0.088])
+        np.testing.assert_array_equal(series["fresh"], [1, 0])
+        np.testing.assert_array_equal(series["stale"], [0, 1])
+
+    def test_superseded_commands(self):
+        for sent in (1.0, 1.001, 1.002):
+            self.telemetry.on_command_info(
+                2, sent=sent, observation_tick=0, observation_stamp=0.99, received=sent
+            )
+        self.telemetry.record_step(1.01, 1)
+        summary = self.telemetry.summary()
+        self.assertEqual(summary["robots"][2]["superseded"], 2)
+        self.assertEqual(summary["robots"][2]["commands_applied"], 1)
+
+    def test_save(self):
+        self.telemetry.on_observation(1.0)
+        self.telemetry.on_observation(1.01)
+        with tempfile.TemporaryDirectory() as directory:
+            prefix = os.path.join(directory, "debug")
+            self.telemetry.save(prefix)
+            with open(f"{prefix}_telemetry.json") as f:
+                summary = json.load(f)
+            self.assertEqual(summary["topics"]["/observation"]["messages"], 2)
+            self.assertIn("time", np.load(f"{prefix}_telemetry.npz"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import json
+import os
+import tempfile
+import unittest
+
+from modules.deployment.utils.step_profiler import StepProfiler
+
+
+class TestStepProfiler(unittest.TestCase):
+    def test_overruns_and_summary(self):
+        profiler = StepProfiler(budget=0.01, window=2)
+        for total in (0.005, 0.02, 0.008):
+            profiler.record("physics", total / 2)
+            profiler.end_step(total, lateness=0.0)
+        profiler.end_step(0.001, lateness=0.05)
+
+        summary = profiler.summary()
+        self.assertEqual(summary["steps"], 4)
+        self.assertEqual(summary["overruns"], 1)
+        self.assertEqual(summary["late_starts"], 1)
+        self.assertAlmostEqual(summary["phases"]["total"]["max_ms"], 20.0)
+        self.assertEqual(summary["phases"]["render"], {})
+        # rolling stats only cover the last two steps
+        self.assertAlmostEqual(
+            profiler.rolling_stats()["phases"]["total"]["max_ms"], 8.0
+        )
+
+    def test_current_step(self):
+        profiler = StepProfiler(budget=0.01)
+        profiler.record("observation", 0.001)
+        self.assertEqual(profiler.current, {"observation": 0.001})
+        profiler.end_step(0.002)
+        self.assertEqual(profiler.current, {})
+
+    def test_files(self):
+        profiler = StepProfiler(budget=0.01)
+        profiler.end_step(0.002)
+        with tempfile.TemporaryDirectory() as directory:
+            live_path = os.path.join(directory, "step_profile.json")
+            profiler.flush_rolling_stats(live_path, period=0.0)
+            with open(live_path) as f:
+                self.assertEqual(json.load(f)["steps"], 1)
+            profiler.save(os.path.join(directory, "debug_profile.json"))
+            self.assertTrue(
+                os.path.exists(os.path.join(directory, "debug_profile.json"))
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
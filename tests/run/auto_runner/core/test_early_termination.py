@@ -0,0 +1,178 @@
+import threading
+import unittest
+
+import numpy as np
+
+from run.auto_runner.core.early_termination import EarlyTerminationOracle
+from run.auto_runner.core.trajectory_recorder import TrajectoryRecorder
+
+DT = 0.1
+# checks every 10 steps, the stall window is 20 steps
+INTERVAL, STALL_WINDOW = 1.0, 2.0
+
+
+def record_run(
+    positions, steps: int, targets=None, moveable=None
+) -> TrajectoryRecorder:
+    """
+    Record `steps` steps of robots at positions(step), an (N, 2) array.
+    """
+    start = positions(0)
+    infos = {
+        i: {
+            "size": 0.15,
+            "target_position": None if targets is None else targets[i],
+            "type": "Robot",
+            "color": "blue",
+            "position": start[i],
+        }
+        for i in range(len(start))
+    }
+    recorder = TrajectoryRecorder(infos, dt=DT, chunk_size=16)
+    for step in range(1, steps + 1):
+        recorder.record(
+            {
+                i: {
+                    "moveable": moveable is None or moveable(i, step),
+                    "position": position,
+                    "state": None,
+                }
+                for i, position in enumerate(positions(step))
+            }
+        )
+    return recorder
+
+
+def spread(count: int) -> np.ndarray:
+    return np.array([[2.0 * i, 0.0] for i in range(count)])
+
+
+def still(step: int) -> np.ndarray:
+    return spread(4)
+
+
+def moving(step: int) -> np.ndarray:
+    return spread(4) + [0.0, 0.05 * step]
+
+
+class TestEarlyTerminationOracle(unittest.TestCase):
+    def setUp(self):
+        self.analyses = []
+        self.succeed = True
+
+    def analyze_result(self, experiment):
+        self.analyses.append(
+            (threading.current_thread(), experiment.robots.positions.shape[0])
+        )
+        return {"succeeded": self.succeed}
+
+    def oracle(self, **kwargs) -> EarlyTerminationOracle:
+        return EarlyTerminationOracle(
+            self.analyze_result,
+            lambda analysis: analysis["succeeded"],
+            dt=DT,
+            interval=INTERVAL,
+            stall_window=STALL_WINDOW,
+            **kwargs,
+        )
+
+    @staticmethod
+    def check(oracle, recorder) -> str | None:
+        reason = oracle.check(recorder.view())
+        # let the analysis submitted by this check finish before the next one
+        if oracle._pending_analysis is not None:
+            oracle._pending_analysis.result()
+        return reason
+
+    def test_due(self):
+        oracle = self.oracle()
+        self.assertEqual([step for step in range(31) if oracle.due(step)], [10, 20, 30])
+
+    def test_success_after_patience(self):
+        oracle = self.oracle(success_patience=3)
+        recorder = record_run(moving, 10, targets=moving(10))
+        self.assertEqual(
+            [self.check(oracle, recorder) for _ in range(4)],
+            [None, None, None, "success"],
+        )
+        # the analysis ran on a snapshot, off the thread stepping the simulation
+        self.assertTrue(self.analyses)
+        for thread, steps in self.analyses:
+            self.assertIsNot(thread, threading.current_thread())
+            self.assertEqual(steps, 11)
+
+    def test_failed_analysis_resets_patience(self):
+        oracle = self.oracle(success_patience=2)
+        recorder = record_run(moving, 10, targets=moving(10))
+        self.assertIsNone(self.check(oracle, recorder))
+        # each check counts the analysis submitted by the one before
+        self.succeed = False
+        self.assertIsNone(self.check(oracle, recorder))
+        self.succeed = True
+        self.assertEqual(
+            [self.check(oracle, recorder) for _ in range(3)], [None, None, "success"]
+        )
+
+    def test_no_analysis_away_from_targets(self):
+        oracle = self.oracle(success_patience=1)
+        recorder = record_run(moving, 10, targets=moving(10) + [0.0, 1.0])
+        for _ in range(3):
+            self.assertIsNone(self.check(oracle, recorder))
+        self.assertEqual(self.analyses, [])
+
+    def test_stall(self):
+        self.succeed = False
+        oracle = self.oracle()
+        oracle.start(0)
+        self.assertIsNone(self.check(oracle, record_run(still, 19)))
+        self.assertEqual(self.check(oracle, record_run(still, 20)), "stall")
+
+    def test_moving_robots_do_not_stall(self):
+        self.succeed = False
+        oracle = self.oracle()
+        oracle.start(0)
+        self.assertIsNone(self.check(oracle, record_run(moving, 50)))
+
+    def test_stall_waits_for_the_first_commands(self):
+        self.succeed = False
+        oracle = self.oracle()
+        # cold start: the robots have not sent a command yet
+        self.assertIsNone(self.check(oracle, record_run(still, 40)))
+        oracle.start(30)
+        self.assertIsNone(self.check(oracle, record_run(still, 40)))
+        self.assertIsNone(self.check(oracle, record_run(still, 49)))
+        self.assertEqual(self.check(oracle, record_run(still, 50)), "stall")
+        # the clock starts again with the next run
+        oracle.reset()
+        self.assertIsNone(oracle.start_step)
+        self.assertIsNone(self.check(oracle, record_run(still, 50)))
+
+    def test_robots_no_longer_moveable_stall(self):
+        self.succeed = False
+        oracle = self.oracle()
+        oracle.start(0)
+        # three robots stop being recorded while they move, then stay where they stopped
+        recorder = record_run(
+            lambda step: moving(step) if step <= 5 else moving(5),
+            30,
+            moveable=lambda i, step: i == 3 or step <= 5,
+        )
+        self.assertEqual(self.check(oracle, recorder), "stall")
+
+    def test_collision(self):
+        self.succeed = False
+
+        def jammed(step: int) -> np.ndarray:
+            positions = moving(step)
+            # the first two robots overlap and do not move
+            positions[:2] = [[0.0, 0.0], [0.1, 0.0]]
+            return positions
+
+        for jam_ratio, reason in [(0.5, "collision"), (0.75, None)]:
+            oracle = self.oracle(jam_ratio=jam_ratio)
+            oracle.start(0)
+            self.assertEqual(self.check(oracle, record_run(jammed, 20)), reason)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import operator
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from run.auto_runner.core.result_analyzer import ExperimentAnalyzer
+from run.auto_runner.core.trajectory_recorder import TrajectoryRecorder
+from run.utils.result_store import load_analysis, save_experiment_result
+
+NAME = "wo_vlm"
+EXPERIMENTS = ["exp_0", "exp_1", "exp_2"]
+
+
+class Runner:
+    """
+    Stands in for an AutoRunnerBase subclass, the analysis workers build it with for_analysis.
+    """
+
+    @classmethod
+    def for_analysis(cls, env_config_path, tolerance):
+        runner = cls()
+        runner.tolerance = tolerance
+        return runner
+
+    def analyze_result(self, run_result) -> dict:
+        return {
+            "steps": run_result.robots.positions.shape[0],
+            "tolerance": self.tolerance,
+            "pid": os.getpid(),
+        }
+
+
+def save_run(experiment_dir: str, steps: int):
+    infos = {
+        i: {
+            "size": 0.15,
+            "target_position": None,
+            "type": "Robot",
+            "color": "blue",
+            "position": np.array([float(i), 0.0]),
+        }
+        for i in range(2)
+    }
+    recorder = TrajectoryRecorder(infos, dt=0.1, chunk_size=8)
+    for step in range(1, steps):
+        recorder.record(
+            {
+                i: {
+                    "moveable": True,
+                    "position": np.array([float(i), 0.1 * step]),
+                    "state": None,
+                }
+                for i in range(2)
+            }
+        )
+    os.makedirs(experiment_dir)
+    recorder.save(os.path.join(experiment_dir, NAME))
+    save_experiment_result(experiment_dir, NAME, None, {"run_result": "Timeout"})
+
+
+class TestUpdateAnalyses(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        for steps, experiment in enumerate(EXPERIMENTS, start=5):
+            save_run(os.path.join(self.directory.name, experiment), steps)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def analyzer(self, max_workers) -> ExperimentAnalyzer:
+        return ExperimentAnalyzer(
+            self.directory.name,
+            [("steps", operator.gt, 5)],
+            analyze_result=Runner.for_analysis("env.json", 0.2).analyze_result,
+            max_workers=max_workers,
+            analysis_runner=(Runner, "env.json", 0.2),
+        )
+
+    def check(self, updated: dict):
+        self.assertEqual(sorted(updated), EXPERIMENTS)
+        for steps, experiment in enumerate(EXPERIMENTS, start=5):
+            analysis = load_analysis(
+                os.path.join(self.directory.name, experiment), NAME
+            )
+            self.assertEqual(analysis, updated[experiment])
+            self.assertEqual((analysis["steps"], analysis["tolerance"]), (steps, 0.2))
+            self.assertEqual(analysis["success"], steps > 5)
+            # kept from the analysis of the run
+            self.assertEqual(analysis["run_result"], "Timeout")
+
+    def test_spawned_workers(self):
+        updated = self.analyzer(max_workers=2).update_analyses(EXPERIMENTS, NAME)
+        self.check(updated)
+        # analyzed by the runners of spawned workers, not by the one of this process
+        self.assertNotIn(
+            os.getpid(), [analysis["pid"] for analysis in updated.values()]
+        )
+        self.assertEqual(
+            self.analyzer(max_workers=2).update_analyses(EXPERIMENTS, NAME), {}
+        )
+
+    def test_single_worker_runs_in_process(self):
+        updated = self.analyzer(max_workers=1).update_analyses(EXPERIMENTS, NAME)
+        self.check(updated)
+        self.assertEqual(
+            {analysis["pid"] for analysis in updated.values()}, {os.getpid()}
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,175 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+import numpy as np
+
+from run.auto_runner.core.trajectory_recorder import (
+    TrajectoryRecorder,
+    TrajectoryRecording,
+    load_trajectory_recording,
+    recording_arrays,
+    save_trajectory_result,
+)
+
+
+def initial_infos():
+    return {
+        1: {
+            "size": 0.15,
+            "target_position": np.array([1.0, 1.0]),
+            "type": "Robot",
+            "color": "blue",
+            "position": np.array([0.0, 0.0]),
+            "velocity": np.array([0.0, 0.0]),
+        },
+        2: {
+            "size": 0.15,
+            "target_position": None,
+            "type": "Robot",
+            "color": [255, 0, 0],
+            "position": np.array([1.0, 0.0]),
+        },
+        7: {
+            "size": 0.5,
+            "target_position": None,
+            "type": "Obstacle",
+            "color": "gray",
+            "position": np.array([3.0, 3.0]),
+        },
+    }
+
+
+def step_infos(step: int):
+    return {
+        1: {
+            "moveable": True,
+            "position": (0.1 * step, 0.0),
+            "velocity": (0.1, 0.0),
+            "state": "moving" if step % 2 else "waiting",
+        },
+        # stops moving after two steps
+        2: {
+            "moveable": step <= 2,
+            "position": (1.0, 0.1 * step),
+            "state": None,
+        },
+        7: {"moveable": False, "position": (3.0, 3.0), "state": None},
+        # entities that were not there at the start are ignored
+        9: {"moveable": True, "position": (0.0, 0.0), "state": "moving"},
+    }
+
+
+def record(steps: int, chunk_size: int = 2) -> TrajectoryRecorder:
+    recorder = TrajectoryRecorder(initial_infos(), dt=0.05, chunk_size=chunk_size)
+    for step in range(1, steps + 1):
+        recorder.record(step_infos(step))
+    return recorder
+
+
+class TestTrajectoryRecorder(unittest.TestCase):
+    def test_buffers_grow(self):
+        recorder = record(5, chunk_size=2)
+        self.assertGreaterEqual(len(recorder.positions), 6)
+        self.assertEqual(recorder.arrays()["positions"].shape, (6, 3, 2))
+        np.testing.assert_allclose(
+            recorder.view()[1]["trajectory"],
+            [[0.1 * step, 0.0] for step in range(6)],
+        )
+
+    def test_lengths_per_entity(self):
+        recording = record(5).view()
+        self.assertEqual(len(recording[1]["trajectory"]), 6)
+        self.assertEqual(len(recording[2]["trajectory"]), 3)
+        self.assertEqual(len(recording[7]["trajectory"]), 1)
+        np.testing.assert_allclose(recording[2]["trajectory"][-1], [1.0, 0.2])
+        self.assertEqual(list(recording), [1, 2, 7])
+
+    def test_state_codes(self):
+        recorder = record(4)
+        self.assertEqual(recorder.state_vocabulary, ["moving", "waiting"])
+        self.assertEqual(list(recorder.state_lengths), [4, 0, 0])
+        recording = recorder.view()
+        self.assertEqual(
+            recording[1]["states"], ["moving", "waiting", "moving", "waiting"]
+        )
+        self.assertEqual(recording[2]["states"], [])
+
+    def test_entity_format(self):
+        entity = record(1).view()[1]
+        self.assertEqual(entity["size"], 0.15)
+        np.testing.assert_allclose(entity["target"], [1.0, 1.0])
+        self.assertEqual(entity["type"], "Robot")
+        self.assertEqual(entity["dt"], 0.05)
+        self.assertIsNone(record(1).view()[2]["target"])
+
+
+class TestTrajectoryFiles(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "wo_vlm")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def assert_same_result(self, loaded, expected):
+        self.assertEqual(list(loaded), list(expected))
+        for entity_id in expected:
+            np.testing.assert_allclose(
+                np.asarray(loaded[entity_id]["trajectory"]).reshape(-1, 2),
+                np.asarray(expected[entity_id]["trajectory"]).reshape(-1, 2),
+            )
+            self.assertEqual(loaded[entity_id]["states"], expected[entity_id]["states"])
+            self.assertEqual(loaded[entity_id]["type"], expected[entity_id]["type"])
+            self.assertEqual(loaded[entity_id]["size"], expected[entity_id]["size"])
+            self.assertEqual(loaded[entity_id]["dt"], expected[entity_id]["dt"])
+
+    def test_npz_round_trip(self):
+        recorder = record(5)
+        recorder.save(f"{self.path}.npz")
+        loaded = load_trajectory_recording(self.path)
+        self.assertIsInstance(loaded, TrajectoryRecording)
+        self.assert_same_result(loaded, recorder.view())
+        self.assertEqual(loaded.meta["colors"], ["blue", [255, 0, 0], "gray"])
+        np.testing.assert_allclose(loaded.velocities[1:, 0], [[0.1, 0.0]] * 5)
+
+    def test_legacy_pickle(self):
+        legacy = {
+            entity_id: {
+                "size": entity["size"],
+                "target": entity["trajectory"][0] if entity_id == 1 else None,
+                "trajectory": [np.array(point) for point in entity["trajectory"]],
+                "type": entity["type"],
+                "states": list(entity["states"]),
+                "dt": entity["dt"],
+            }
+            for entity_id, entity in record(5).view().items()
+        }
+        legacy[2]["color"] = "red"
+        with open(f"{self.path}.pkl", "wb") as f:
+            pickle.dump(legacy, f)
+
+        loaded = load_trajectory_recording(self.path)
+        self.assertIsInstance(loaded, dict)
+        self.assert_same_result(loaded, legacy)
+
+        arrays = recording_arrays(loaded)
+        recording = TrajectoryRecording(arrays)
+        self.assert_same_result(recording, legacy)
+        self.assertEqual(recording.meta["colors"], [None, "red", None])
+
+        # converted to .npz, which is then preferred to the .pkl file
+        save_trajectory_result(self.path, loaded)
+        converted = load_trajectory_recording(self.path)
+        self.assertIsInstance(converted, TrajectoryRecording)
+        self.assert_same_result(converted, legacy)
+        np.testing.assert_allclose(converted[1]["target"], legacy[1]["target"])
+        self.assertEqual(converted.meta["colors"], [None, "red", None])
+
+    def test_missing_result(self):
+        self.assertIsNone(load_trajectory_recording(self.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import math
+import unittest
+from itertools import combinations
+
+import numpy as np
+
+from run.utils.dtw import batch_band_dtw, pairwise_dtw
+
+
+def reference_dtw(a: np.ndarray, b: np.ndarray, window: int = None) -> float:
+    """
+    DTW over the full cost matrix, with the cells outside the band of batch_band_dtw
+    left out if window is given.
+    """
+    n, m = len(a), len(b)
+    banded = window is not None and n > 1 and m > 1
+    if banded:
+        ratio = (n - 1) / (m - 1)
+        window = max(window, math.ceil(ratio), math.ceil(1 / ratio))
+    cost = np.full((n + 1, m + 1), np.inf)
+    cost[0, 0] = 0.0
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            if banded and abs((i - 1) - (j - 1) * ratio) > window + 1e-9:
+                continue
+            cost[i, j] = np.linalg.norm(a[i - 1] - b[j - 1]) + min(
+                cost[i - 1, j], cost[i, j - 1], cost[i - 1, j - 1]
+            )
+    return cost[n, m]
+
+
+def trajectory(rng, length: int) -> np.ndarray:
+    return np.cumsum(rng.normal(0, 0.1, (length, 2)), axis=0)
+
+
+class TestBatchBandDtw(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+    def test_full_band_is_exact_dtw(self):
+        for n, m in [(20, 20), (15, 25), (25, 9), (1, 7), (6, 1)]:
+            a = np.stack([trajectory(self.rng, n) for _ in range(3)])
+            b = np.stack([trajectory(self.rng, m) for _ in range(3)])
+            distances = batch_band_dtw(a, b, window=max(n, m))
+            for pair in range(3):
+                self.assertAlmostEqual(
+                    distances[pair], reference_dtw(a[pair], b[pair]), msg=(n, m)
+                )
+
+    def test_band(self):
+        for n, m, window in [(30, 30, 3), (20, 31, 2), (31, 12, 4)]:
+            a = np.stack([trajectory(self.rng, n) for _ in range(4)])
+            b = np.stack([trajectory(self.rng, m) for _ in range(4)])
+            distances = batch_band_dtw(a, b, window)
+            for pair in range(4):
+                expected = reference_dtw(a[pair], b[pair], window)
+                self.assertAlmostEqual(distances[pair], expected, msg=(n, m, window))
+                # a narrower band can only lengthen the warping path
+                self.assertGreaterEqual(
+                    distances[pair] + 1e-9, reference_dtw(a[pair], b[pair])
+                )
+
+    def test_identical_trajectories(self):
+        a = trajectory(self.rng, 40)[None]
+        self.assertAlmostEqual(batch_band_dtw(a, a.copy(), 2)[0], 0.0)
+
+
+class TestPairwiseDtw(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self.trajectories = [trajectory(rng, length) for length in (40, 40, 40, 28, 52)]
+
+    def expected(self, window: float) -> list[float]:
+        distances = []
+        for i, j in combinations(range(len(self.trajectories)), 2):
+            a, b = self.trajectories[i], self.trajectories[j]
+            half_width = window * max(len(a), len(b)) if window < 1 else window
+            distances.append(reference_dtw(a, b, math.ceil(half_width)))
+        return distances
+
+    def test_matches_reference_in_pair_order(self):
+        for window in (0.1, 0.5, 3):
+            np.testing.assert_allclose(
+                pairwise_dtw(self.trajectories, window=window, batch_size=2),
+                self.expected(window),
+            )
+
+    def test_process_pool(self):
+        np.testing.assert_allclose(
+            pairwise_dtw(self.trajectories, window=0.2, max_workers=2, batch_size=2),
+            self.expected(0.2),
+        )
+
+    def test_cache_returns_copies(self):
+        first = pairwise_dtw(self.trajectories, window=0.3)
+        first[:] = -1
+        np.testing.assert_allclose(
+            pairwise_dtw(self.trajectories, window=0.3), self.expected(0.3)
+        )
+
+    def test_downsample(self):
+        distances = pairwise_dtw(self.trajectories, window=20, max_points=20)
+        downsampled = [
+            trajectory[:: math.ceil(len(trajectory) / 20)]
+            for trajectory in self.trajectories
+        ]
+        expected = [
+            reference_dtw(downsampled[i], downsampled[j])
+            for i, j in combinations(range(len(downsampled)), 2)
+        ]
+        np.testing.assert_allclose(distances, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
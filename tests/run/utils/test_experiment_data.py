@@ -0,0 +1,225 @@
+import unittest
+
+import numpy as np
+
+from run.utils.experiment_data import ExperimentData, as_experiment_data
+from run.utils.metric import (
+    check_robots_no_movement_in_first_third,
+    evaluate_min_distances_to_others,
+    evaluate_robot_final_positions,
+    evaluate_robot_quadrant_positions,
+    evaluate_target_achievement,
+)
+
+
+def random_result(seed: int, steps: int = 60, robots: int = 8) -> dict:
+    rng = np.random.default_rng(seed)
+    data = {}
+    for i in range(robots):
+        start = rng.uniform(-2, 2, 2)
+        target = rng.uniform(-2, 2, 2)
+        # robots move towards their target and stop there, the first one never moves
+        fractions = np.minimum(np.arange(steps) / rng.uniform(20, 90), 1.0)[:, None]
+        trajectory = (
+            start + fractions * (target - start) if i else np.tile(start, (steps, 1))
+        )
+        data[i] = {
+            "type": "Robot",
+            "size": 0.15,
+            "target": target,
+            "trajectory": [np.array(position) for position in trajectory],
+        }
+    data[100] = {
+        "type": "Obstacle",
+        "size": 0.5,
+        "target": None,
+        "trajectory": [np.array([3.0, 3.0])],
+    }
+    data[200] = {
+        "type": "Prey",
+        "size": 0.1,
+        "target": None,
+        "trajectory": list(rng.uniform(-1, 1, (steps, 2))),
+    }
+    return data
+
+
+def robot_infos(data: dict) -> list[dict]:
+    return [info for info in data.values() if info["type"] == "Robot"]
+
+
+# the per-entity loops the metrics replaced
+
+
+def reference_target_achievement(data, tolerance=0.1) -> dict:
+    ratios, achieved, num_targets = [], 0, 0
+    for info in data.values():
+        target = info.get("target")
+        if target is None:
+            continue
+        num_targets += 1
+        initial_distance = np.linalg.norm(target - info["trajectory"][0])
+        final_distance = initial_distance
+        for position in info["trajectory"]:
+            if np.linalg.norm(target - position) <= tolerance:
+                final_distance = np.linalg.norm(target - position)
+                break
+        if np.linalg.norm(target - info["trajectory"][-1]) <= tolerance:
+            achieved += 1
+        ratios.append(final_distance / initial_distance if initial_distance > 0 else 1)
+    return {
+        "all_targets_achieved": achieved == num_targets,
+        "target_achievement_ratio": achieved / num_targets,
+        "average_distance_ratio": sum(ratios) / num_targets,
+    }
+
+
+def reference_nearest_neighbor_distances(data) -> list[float]:
+    final = np.array([info["trajectory"][-1] for info in robot_infos(data)])
+    distances = []
+    for i, position in enumerate(final):
+        to_others = np.linalg.norm(final - position, axis=1)
+        to_others[i] = np.inf
+        distances.append(np.min(to_others))
+    return distances
+
+
+def reference_max_min_distance(data) -> float:
+    robots = robot_infos(data)
+    radius = robots[-1]["size"]
+    final = [np.array(info["trajectory"][-1]) for info in robots]
+    return max(
+        min(
+            np.linalg.norm(final[i] - final[j]) - 2 * radius
+            for j in range(len(final))
+            if i != j
+        )
+        for i in range(len(final))
+    )
+
+
+def reference_quadrant_achievement(data, target_regions, tolerance=0.1) -> dict:
+    achieved = {1: 0, 2: 0, 3: 0, 4: 0}
+    for info in robot_infos(data):
+        x, y = info["trajectory"][0]
+        if x >= 0 and y >= 0:
+            quadrant = 1
+        elif x < 0 and y >= 0:
+            quadrant = 2
+        elif x < 0 and y < 0:
+            quadrant = 3
+        else:
+            quadrant = 4
+        region = target_regions.get(quadrant)
+        if region is None:
+            continue
+        x_min, x_max, y_min, y_max = region
+        final_x, final_y = info["trajectory"][-1]
+        if (
+            x_min - tolerance <= final_x <= x_max + tolerance
+            and y_min - tolerance <= final_y <= y_max + tolerance
+        ):
+            achieved[quadrant] += 1
+    return achieved
+
+
+def reference_no_movement(data) -> int:
+    count = 0
+    for info in robot_infos(data):
+        trajectory = np.array(info["trajectory"])
+        initial_position = trajectory[10]
+        if all(
+            np.allclose(initial_position, trajectory[t])
+            for t in range(1, len(trajectory) // 3)
+        ):
+            count += 1
+    return count
+
+
+class TestExperimentData(unittest.TestCase):
+    def setUp(self):
+        self.data = random_result(0)
+        self.experiment = ExperimentData(self.data)
+
+    def test_groups(self):
+        robots = self.experiment.robots
+        self.assertEqual(robots.ids, list(range(8)))
+        self.assertEqual(self.experiment.obstacles.ids, [100])
+        self.assertEqual(
+            self.experiment.group("Robot", "Prey").ids, list(range(8)) + [200]
+        )
+        self.assertIs(self.experiment.robots, robots)
+        self.assertEqual(robots.positions.shape, (60, 8, 2))
+        np.testing.assert_allclose(robots.positions[:, 3], self.data[3]["trajectory"])
+        np.testing.assert_allclose(robots.initial[2], self.data[2]["trajectory"][0])
+        np.testing.assert_allclose(robots.final[5], self.data[5]["trajectory"][-1])
+        self.assertEqual(list(self.experiment.entities.lengths), [60] * 8 + [1, 60])
+        self.assertEqual(self.experiment.num_timesteps, 60)
+
+    def test_mapping(self):
+        self.assertEqual(list(self.experiment), list(self.data))
+        self.assertIs(self.experiment[100], self.data[100])
+        self.assertIs(as_experiment_data(self.experiment), self.experiment)
+        self.assertIsInstance(as_experiment_data(self.data), ExperimentData)
+
+    def test_nearest_neighbor_distances(self):
+        np.testing.assert_allclose(
+            self.experiment.robots.final_nearest_neighbor_distances,
+            reference_nearest_neighbor_distances(self.data),
+        )
+
+
+class TestMetricsMatchLoops(unittest.TestCase):
+    def test_target_achievement(self):
+        for seed in range(3):
+            data = random_result(seed)
+            for tolerance in (0.1, 1.0):
+                result = evaluate_target_achievement(data, tolerance)
+                expected = reference_target_achievement(data, tolerance)
+                self.assertEqual(
+                    result["all_targets_achieved"], expected["all_targets_achieved"]
+                )
+                for key in ("target_achievement_ratio", "average_distance_ratio"):
+                    self.assertAlmostEqual(result[key], expected[key])
+
+    def test_final_positions(self):
+        data = random_result(1)
+        nearest = reference_nearest_neighbor_distances(data)
+        for source in (data, ExperimentData(data)):
+            result = evaluate_robot_final_positions(source)
+            self.assertAlmostEqual(
+                result["mean_nearest_neighbor_distance"], np.mean(nearest)
+            )
+            self.assertAlmostEqual(
+                result["variance_nearest_neighbor_distance"], np.var(nearest)
+            )
+
+    def test_min_distances_to_others(self):
+        data = random_result(2)
+        self.assertAlmostEqual(
+            evaluate_min_distances_to_others(data)["max_min_distance"],
+            reference_max_min_distance(data),
+        )
+
+    def test_quadrant_positions(self):
+        data = random_result(3)
+        regions = {1: (0, 2, 0, 2), 2: (-2, 0, 0, 2), 3: (-2, 0, -2, 0)}
+        result = evaluate_robot_quadrant_positions(data, regions, tolerance=0.1)
+        expected = reference_quadrant_achievement(data, regions)
+        self.assertEqual(result["achieved_robots_by_quadrant"], expected)
+        self.assertEqual(result["total_achieved"], sum(expected.values()))
+        self.assertAlmostEqual(result["achievement_ratio"], sum(expected.values()) / 8)
+
+    def test_no_movement(self):
+        for seed in range(3):
+            data = random_result(seed)
+            expected = reference_no_movement(data)
+            self.assertGreaterEqual(expected, 1)
+            self.assertEqual(
+                check_robots_no_movement_in_first_third(ExperimentData(data)),
+                {"no_move_num": expected},
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
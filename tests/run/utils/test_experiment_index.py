@@ -0,0 +1,136 @@
+import os
+import tempfile
+import time
+import unittest
+
+from run.utils.experiment_index import ExperimentIndex, workspace_key
+from run.utils.experiment_selector import ExperimentSelector
+from run.utils.result_store import save_experiment_result
+
+WORKSPACE = "gpt-4o/full/flocking"
+# no global or local run ended with an error of the generated code
+TIMEOUT = {"global": {"result": "Timeout"}, "local": {"result": ["Timeout"]}}
+
+
+def analysis(success: bool) -> dict:
+    return {"success": success, "run_result": TIMEOUT, "collision_count": 0}
+
+
+class TestReconcile(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.workspace_dir = os.path.join(self.directory.name, "flocking")
+        self.index = ExperimentIndex(
+            os.path.join(self.directory.name, "experiments.db")
+        )
+        self.key = workspace_key(WORKSPACE)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def save(self, experiment: str, success: bool, record: bool):
+        save_experiment_result(
+            os.path.join(self.workspace_dir, experiment),
+            "wo_vlm",
+            None,
+            analysis(success),
+        )
+        if record:
+            self.index.record(self.key, "wo_vlm", experiment, analysis(success))
+
+    def results(self) -> dict[str, bool]:
+        return {
+            experiment: row["success"]
+            for experiment, row in self.index.results(self.key, "wo_vlm").items()
+        }
+
+    def test_partial_index(self):
+        self.save("exp_0", True, record=True)
+        self.save("exp_1", False, record=False)
+        os.makedirs(os.path.join(self.workspace_dir, "exp_2"))
+        self.assertEqual(self.index.reconcile(self.workspace_dir, self.key), 1)
+        self.assertEqual(self.results(), {"exp_0": True, "exp_1": False})
+        # nothing left to do
+        self.assertEqual(self.index.reconcile(self.workspace_dir, self.key), 0)
+
+    def test_deleted_result(self):
+        self.save("exp_0", True, record=True)
+        self.save("exp_1", True, record=True)
+        os.remove(os.path.join(self.workspace_dir, "exp_1", "wo_vlm.json"))
+        self.assertEqual(self.index.reconcile(self.workspace_dir, self.key), 1)
+        self.assertEqual(self.results(), {"exp_0": True})
+
+    def test_result_written_after_its_row(self):
+        self.save("exp_0", False, record=True)
+        self.save("exp_0", True, record=False)
+        result_file = os.path.join(self.workspace_dir, "exp_0", "wo_vlm.json")
+        later = time.time() + 60
+        os.utime(result_file, (later, later))
+        self.assertEqual(self.index.reconcile(self.workspace_dir, self.key), 1)
+        self.assertEqual(self.results(), {"exp_0": True})
+
+    def test_other_workspaces_are_kept(self):
+        other = workspace_key("gpt-4o/full/cross")
+        self.index.record(other, "wo_vlm", "exp_0", analysis(True))
+        # same task, model and prompt type in the comparative workspace
+        comparative = workspace_key(f"comparative/cap/{WORKSPACE}")
+        self.index.record(comparative, "cap", "exp_0", analysis(True))
+        self.index.reconcile(self.workspace_dir, self.key)
+        self.assertEqual(list(self.index.results(other, "wo_vlm")), ["exp_0"])
+        self.assertEqual(list(self.index.results(comparative, "cap")), ["exp_0"])
+
+    def test_rows_of_other_results_are_kept(self):
+        self.save("exp_0", True, record=True)
+        self.index.record(self.key, "full_version", "exp_0", analysis(True))
+        self.assertEqual(self.index.reconcile(self.workspace_dir, self.key), 0)
+        self.assertEqual(list(self.index.results(self.key, "full_version")), ["exp_0"])
+
+
+class TestSelectorWithPartialIndex(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.workspace_dir = os.path.join(self.directory.name, "flocking")
+        self.index = ExperimentIndex(
+            os.path.join(self.directory.name, "experiments.db")
+        )
+        key = workspace_key(WORKSPACE)
+        runs = {
+            # experiment: (success, in the index, result file on disk)
+            "exp_0": (True, True, True),
+            "exp_1": (False, False, True),
+            "exp_2": (True, True, False),
+            "exp_3": (None, False, False),
+            "exp_4": (False, True, True),
+        }
+        for experiment, (success, indexed, on_disk) in runs.items():
+            experiment_dir = os.path.join(self.workspace_dir, experiment)
+            os.makedirs(experiment_dir)
+            if on_disk:
+                save_experiment_result(
+                    experiment_dir, "wo_vlm", None, analysis(success)
+                )
+            if indexed:
+                self.index.record(key, "wo_vlm", experiment, analysis(success))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def select(self, run_mode: str) -> list[str]:
+        selector = ExperimentSelector(
+            WORKSPACE,
+            run_mode=run_mode,
+            test_mode="wo_vlm",
+            experiment_index=self.index,
+        )
+        selector.experiment_path = self.workspace_dir
+        return selector.select_experiments()
+
+    def test_continue(self):
+        self.assertEqual(self.select("continue"), ["exp_2", "exp_3"])
+
+    def test_fail_rerun(self):
+        self.assertEqual(self.select("fail_rerun"), ["exp_1", "exp_4"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+from itertools import combinations
+from unittest import mock
+
+import numpy as np
+
+from run.utils import metric
+from run.utils.metric import check_collisions, collision_metrics
+from run.utils.utils import calculate_overlap_ratio
+
+
+def reference_collisions(
+    robot_positions, robot_sizes, obstacle_positions, obstacle_sizes, tolerance
+):
+    # the per-step, per-pair loop collision_metrics replaces
+    count, severity = 0, 0.0
+    for positions in robot_positions:
+        for i, position in enumerate(positions):
+            for obstacle, obstacle_size in zip(obstacle_positions, obstacle_sizes):
+                ratio = calculate_overlap_ratio(
+                    position, obstacle, robot_sizes[i], obstacle_size, tolerance
+                )
+                if ratio is not None:
+                    count += 1
+                    severity += ratio
+        for i, j in combinations(range(len(positions)), 2):
+            ratio = calculate_overlap_ratio(
+                positions[i], positions[j], robot_sizes[i], robot_sizes[j], tolerance
+            )
+            if ratio is not None:
+                count += 1
+                severity += ratio
+    return count, severity
+
+
+def random_run(seed: int, steps: int = 30, robots: int = 12, obstacles: int = 4):
+    rng = np.random.default_rng(seed)
+    # random walks in a small arena, so that robots collide now and then
+    robot_positions = np.cumsum(rng.normal(0, 0.05, (steps, robots, 2)), axis=0)
+    robot_positions += rng.uniform(-1.5, 1.5, (1, robots, 2))
+    robot_sizes = rng.uniform(0.1, 0.2, robots)
+    obstacle_positions = rng.uniform(-1.5, 1.5, (obstacles, 2))
+    obstacle_sizes = rng.uniform(0.2, 0.4, obstacles)
+    return robot_positions, robot_sizes, obstacle_positions, obstacle_sizes
+
+
+class TestCollisionMetrics(unittest.TestCase):
+    def assert_matches_reference(self, *run, tolerance=0.05):
+        count, severity = collision_metrics(*run, tolerance=tolerance)
+        expected_count, expected_severity = reference_collisions(*run, tolerance)
+        self.assertEqual(count, expected_count)
+        self.assertAlmostEqual(severity, expected_severity)
+        return count
+
+    def test_matches_reference(self):
+        for seed in range(3):
+            self.assertGreater(self.assert_matches_reference(*random_run(seed)), 0)
+
+    def test_chunks(self):
+        with mock.patch.object(metric, "COLLISION_CHUNK_PAIRS", 50):
+            self.assert_matches_reference(*random_run(3))
+
+    def test_kd_tree(self):
+        with mock.patch.object(metric, "KD_TREE_MIN_ROBOTS", 1):
+            for seed in range(3):
+                self.assertGreater(self.assert_matches_reference(*random_run(seed)), 0)
+
+    def test_no_collision(self):
+        robot_positions = np.tile(
+            np.array([[0.0, 0.0], [1.0, 0.0], [0.0, 1.0]]), (10, 1, 1)
+        )
+        run = (
+            robot_positions,
+            np.full(3, 0.1),
+            np.array([[2.0, 2.0]]),
+            np.array([0.3]),
+        )
+        self.assertEqual(collision_metrics(*run), (0, 0.0))
+        with mock.patch.object(metric, "KD_TREE_MIN_ROBOTS", 1):
+            self.assertEqual(collision_metrics(*run), (0, 0.0))
+
+    def test_without_obstacles_or_robots(self):
+        robot_positions, robot_sizes, _, _ = random_run(4)
+        self.assert_matches_reference(
+            robot_positions, robot_sizes, np.zeros((0, 2)), np.zeros(0)
+        )
+        self.assert_matches_reference(
+            robot_positions[:, :1], robot_sizes[:1], *random_run(4)[2:]
+        )
+
+    def test_check_collisions(self):
+        robot_positions, robot_sizes, obstacle_positions, obstacle_sizes = random_run(5)
+        data = {
+            i: {
+                "type": "Robot",
+                "size": size,
+                "trajectory": list(robot_positions[:, i]),
+            }
+            for i, size in enumerate(robot_sizes)
+        }
+        for j, (position, size) in enumerate(zip(obstacle_positions, obstacle_sizes)):
+            data[100 + j] = {"type": "Obstacle", "size": size, "trajectory": [position]}
+        result = check_collisions(data, tolerance=0.05)
+        count, severity = reference_collisions(
+            robot_positions, robot_sizes, obstacle_positions, obstacle_sizes, 0.05
+        )
+        self.assertEqual(result["collision_count"], count)
+        self.assertAlmostEqual(result["collision_severity_sum"], severity)
+        self.assertEqual(result["collision"], count > 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,168 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from run.utils import work_queue
+from run.utils.work_queue import WorkQueue
+
+SWEEP = "sweep"
+
+
+class Clock:
+    """
+    Stands in for the time module of work_queue, so that leases and backoffs expire at once.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+def jobs(*keys: str, group: str = "task") -> list[tuple[str, str, dict]]:
+    return [(key, group, {"experiment": key}) for key in keys]
+
+
+class TestWorkQueue(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.clock = Clock()
+        patcher = mock.patch.object(work_queue, "time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.queue = self.work_queue()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def work_queue(self, **kwargs) -> WorkQueue:
+        kwargs = {"max_attempts": 3, "backoff": 30.0, "max_backoff": 600.0} | kwargs
+        return WorkQueue(os.path.join(self.directory.name, "queue.db"), **kwargs)
+
+    def state(self, job_id: int) -> dict:
+        return next(job for job in self.queue.jobs(SWEEP) if job["id"] == job_id)
+
+    def test_enqueue_deduplicates(self):
+        self.assertEqual(self.queue.enqueue(SWEEP, jobs("exp_0", "exp_1")), 2)
+        job = self.queue.lease(SWEEP, "a", lease_time=60)
+        self.assertTrue(self.queue.complete(job["id"], "a"))
+        self.assertEqual(self.queue.enqueue(SWEEP, jobs("exp_0", "exp_1", "exp_2")), 1)
+        self.assertEqual(self.queue.enqueue("other", jobs("exp_0")), 1)
+        self.assertEqual(
+            [(job["key"], job["state"]) for job in self.queue.jobs(SWEEP)],
+            [("exp_0", "done"), ("exp_1", "pending"), ("exp_2", "pending")],
+        )
+        self.assertEqual(self.state(job["id"])["payload"], {"experiment": "exp_0"})
+
+    def test_lease_order(self):
+        self.queue.enqueue(SWEEP, jobs("exp_0", "exp_1", group="a"))
+        self.queue.enqueue(SWEEP, jobs("exp_2", group="b"), priority=1)
+        self.assertEqual(self.queue.groups(SWEEP), ["b", "a"])
+        self.assertEqual(self.queue.lease(SWEEP, "w", 60)["key"], "exp_2")
+        self.assertEqual(self.queue.lease(SWEEP, "w", 60, group="a")["key"], "exp_0")
+        self.assertIsNone(self.queue.lease(SWEEP, "w", 60, group="b"))
+
+    def test_expired_lease_is_leased_again(self):
+        self.queue.enqueue(SWEEP, jobs("exp_0"))
+        job = self.queue.lease(SWEEP, "a", lease_time=10)
+        self.assertEqual(job["attempts"], 1)
+        self.clock.advance(5)
+        self.assertIsNone(self.queue.lease(SWEEP, "b", lease_time=10))
+        self.assertTrue(self.queue.heartbeat(job["id"], "a", lease_time=10))
+        self.clock.advance(11)
+        again = self.queue.lease(SWEEP, "b", lease_time=10)
+        self.assertEqual(again["id"], job["id"])
+        self.assertEqual(again["attempts"], 2)
+        self.assertEqual(again["lease_owner"], "b")
+
+    def test_stale_owner_is_rejected(self):
+        self.queue.enqueue(SWEEP, jobs("exp_0"))
+        job = self.queue.lease(SWEEP, "a", lease_time=10)
+        self.clock.advance(11)
+        self.queue.lease(SWEEP, "b", lease_time=10)
+        # the first worker comes back after its lease was handed to the second one
+        self.assertFalse(self.queue.heartbeat(job["id"], "a", lease_time=10))
+        self.assertFalse(self.queue.complete(job["id"], "a"))
+        self.assertFalse(self.queue.fail(job["id"], "a", "error"))
+        self.assertFalse(self.queue.release(job["id"], "a"))
+        leased = self.state(job["id"])
+        self.assertEqual((leased["state"], leased["lease_owner"]), ("leased", "b"))
+        self.assertEqual(leased["attempts"], 2)
+        self.assertTrue(self.queue.complete(job["id"], "b", duration=3.0))
+        done = self.state(job["id"])
+        self.assertEqual((done["state"], done["duration"]), ("done", 3.0))
+
+    def test_failure_backoff(self):
+        self.queue = self.work_queue(max_attempts=5, backoff=30.0, max_backoff=100.0)
+        self.queue.enqueue(SWEEP, jobs("exp_0"))
+        for delay in (30.0, 60.0, 100.0):
+            job = self.queue.lease(SWEEP, "a", lease_time=10)
+            self.assertTrue(self.queue.fail(job["id"], "a", "error"))
+            self.assertEqual(self.state(job["id"])["state"], "pending")
+            self.assertEqual(self.queue.next_available(SWEEP), self.clock.now + delay)
+            self.clock.advance(delay - 1)
+            self.assertIsNone(self.queue.lease(SWEEP, "a", lease_time=10))
+            self.clock.advance(1)
+        self.assertEqual(self.queue.lease(SWEEP, "a", lease_time=10)["attempts"], 4)
+
+    def test_exhausted_attempts_fail(self):
+        self.queue = self.work_queue(max_attempts=2, backoff=1.0)
+        self.queue.enqueue(SWEEP, jobs("exp_0"))
+        job = self.queue.lease(SWEEP, "a", lease_time=10)
+        self.queue.fail(job["id"], "a", "first")
+        self.clock.advance(1)
+        job = self.queue.lease(SWEEP, "a", lease_time=10)
+        self.queue.fail(job["id"], "a", "second")
+        failed = self.state(job["id"])
+        self.assertEqual(failed["state"], "failed")
+        self.assertEqual((failed["attempts"], failed["last_error"]), (2, "second"))
+        self.clock.advance(100)
+        self.assertIsNone(self.queue.lease(SWEEP, "a", lease_time=10))
+        self.assertIsNone(self.queue.next_available(SWEEP))
+        self.assertEqual(self.queue.counts(SWEEP)["failed"], 1)
+
+    def test_expired_last_attempt_fails(self):
+        self.queue = self.work_queue(max_attempts=1)
+        self.queue.enqueue(SWEEP, jobs("exp_0"))
+        job = self.queue.lease(SWEEP, "a", lease_time=10)
+        self.clock.advance(11)
+        self.assertIsNone(self.queue.lease(SWEEP, "b", lease_time=10))
+        failed = self.state(job["id"])
+        self.assertEqual(
+            (failed["state"], failed["last_error"]), ("failed", "Lease expired")
+        )
+
+    def test_retry_failed(self):
+        self.queue = self.work_queue(max_attempts=1)
+        self.queue.enqueue(SWEEP, jobs("exp_0", "exp_1"))
+        job = self.queue.lease(SWEEP, "a", lease_time=10)
+        self.queue.fail(job["id"], "a", "error")
+        self.assertEqual(self.queue.retry_failed(SWEEP), 1)
+        self.assertEqual(self.queue.retry_failed(SWEEP), 0)
+        self.assertEqual(
+            self.queue.counts(SWEEP),
+            {"pending": 2, "leased": 0, "done": 0, "failed": 0},
+        )
+        again = self.queue.lease(SWEEP, "a", lease_time=10)
+        self.assertEqual((again["key"], again["attempts"]), ("exp_0", 1))
+
+    def test_release_does_not_count_the_attempt(self):
+        self.queue.enqueue(SWEEP, jobs("exp_0"))
+        job = self.queue.lease(SWEEP, "a", lease_time=10)
+        self.assertTrue(self.queue.release(job["id"], "a"))
+        released = self.state(job["id"])
+        self.assertEqual((released["state"], released["attempts"]), ("pending", 0))
+
+    def test_reset(self):
+        self.queue.enqueue(SWEEP, jobs("exp_0", "exp_1"))
+        self.assertEqual(self.queue.reset(SWEEP), 2)
+        self.assertEqual(self.queue.enqueue(SWEEP, jobs("exp_0")), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import itertools
+import unittest
+
+import numpy as np
+from scipy.spatial import procrustes
+
+from modules.utils.assignment import (
+    batch_assignment,
+    batch_procrustes_disparity,
+    optimal_assignment,
+)
+
+
+class TestOptimalAssignment(unittest.TestCase):
+    def test_matches_brute_force(self):
+        rng = np.random.default_rng(0)
+        for _ in range(20):
+            positions = rng.normal(size=(5, 2))
+            targets = rng.normal(size=(5, 2))
+            best = min(
+                itertools.permutations(range(5)),
+                key=lambda perm: np.linalg.norm(
+                    positions - targets[list(perm)], axis=1
+                ).sum(),
+            )
+            assignment = optimal_assignment(positions, targets)
+            self.assertAlmostEqual(
+                np.linalg.norm(positions - targets[assignment], axis=1).sum(),
+                np.linalg.norm(positions - targets[list(best)], axis=1).sum(),
+            )
+
+    def test_greedy_counterexample(self):
+        # matching the first target to its closest position leaves the second one far away
+        positions = np.array([[0.0, 0.0], [2.0, 0.0]])
+        targets = np.array([[1.0, 0.0], [-1.0, 0.0]])
+        self.assertEqual(optimal_assignment(positions, targets).tolist(), [1, 0])
+
+    def test_more_targets_than_positions(self):
+        positions = np.array([[0.0, 0.0], [5.0, 5.0]])
+        targets = np.array([[5.0, 5.1], [9.0, 9.0], [0.1, 0.0]])
+        self.assertEqual(optimal_assignment(positions, targets).tolist(), [2, 0])
+
+
+class TestBatchAssignment(unittest.TestCase):
+    def test_equals_per_step_assignment(self):
+        rng = np.random.default_rng(1)
+        positions = rng.normal(size=(10, 6, 2))
+        targets = rng.normal(size=(6, 2))
+        assignments = batch_assignment(positions, targets)
+        self.assertEqual(assignments.shape, (10, 6))
+        for step in range(10):
+            np.testing.assert_array_equal(
+                assignments[step], optimal_assignment(positions[step], targets)
+            )
+
+    def test_procrustes_disparity(self):
+        rng = np.random.default_rng(2)
+        target = rng.normal(size=(5, 2))
+        shapes = rng.normal(size=(8, 5, 2))
+        expected = [procrustes(target, shape)[2] for shape in shapes]
+        np.testing.assert_allclose(
+            batch_procrustes_disparity(shapes, target), expected, atol=1e-12
+        )
+
+    def test_procrustes_disparity_of_similar_shape(self):
+        target = np.array([[1.0, -1.0], [1.0, 1.0], [0.0, 0.0], [1.0, 0.0], [2.0, 0.0]])
+        rotation = np.array([[0.0, -1.0], [1.0, 0.0]])
+        shape = 2 * target @ rotation.T + 3
+        self.assertAlmostEqual(batch_procrustes_disparity(shape[None], target)[0], 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,10 +5,12 @@ import os
 import cv2
 from io import BytesIO
 import base64
+import tempfile
 from modules.utils.media import (
     generate_video_from_frames,
     process_video,
     create_video_from_frames,
+    VideoStreamWriter,
 )  # Adjust the import as necessary
 
 
@@ -77,6 +79,30 @@ class TestVideoProcessing(unittest.TestCase):
             "Extracted 2 frames from 0s to 2s", level="info"
         )
 
+    def test_video_stream_writer(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "stream.mp4")
+            writer = VideoStreamWriter(
+                path, fps=30, frame_interval=3, scale=0.5, queue_size=2
+            )
+            for i in range(10):
+                if writer.wants_frame():
+                    writer.write(np.full((64, 80, 3), i * 20, dtype=np.uint8))
+                else:
+                    writer.skip()
+            # frames 0, 3, 6 and 9 are kept
+            self.assertEqual(writer.close(), 4)
+
+            capture = cv2.VideoCapture(path)
+            self.assertEqual(int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)), 40)
+            self.assertEqual(int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)), 32)
+            self.assertAlmostEqual(capture.get(cv2.CAP_PROP_FPS), 10, places=3)
+            frames = 0
+            while capture.read()[0]:
+                frames += 1
+            capture.release()
+            self.assertEqual(frames, 4)
+
     # @mock.patch('cv2.VideoWriter')
     # @mock.patch('cv2.imdecode')
     # @mock.patch('cv2.imencode')
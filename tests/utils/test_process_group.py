@@ -0,0 +1,141 @@
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+from modules.utils.process_group import ProcessSupervisor, kill_process_group
+from modules.utils.run_scripts import run_script
+
+
+def pid_alive(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # a zombie waits for its parent and no longer runs
+            return f.read().split(")")[-1].split()[0] != "Z"
+    except OSError:
+        return False
+
+
+def wait_dead(pid: int, timeout: float = 5.0) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if not pid_alive(pid):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+class TestKillProcessGroup(unittest.TestCase):
+    def test_kills_children_of_the_group_only(self):
+        outside = subprocess.Popen(["sleep", "30"], start_new_session=True)
+        process = subprocess.Popen(
+            ["sh", "-c", "sleep 30 & echo $!; wait"],
+            stdout=subprocess.PIPE,
+            text=True,
+            start_new_session=True,
+        )
+        try:
+            child = int(process.stdout.readline())
+            self.assertTrue(kill_process_group(process.pid))
+            process.wait()
+            self.assertTrue(wait_dead(child))
+            self.assertTrue(pid_alive(outside.pid))
+        finally:
+            outside.kill()
+            outside.wait()
+            process.stdout.close()
+
+
+class TestProcessSupervisor(unittest.TestCase):
+    def test_counts_the_whole_group(self):
+        process = subprocess.Popen(
+            ["sh", "-c", "sleep 30 & sleep 30 & wait"], start_new_session=True
+        )
+        try:
+            supervisor = ProcessSupervisor(process.pid)
+            time.sleep(0.2)
+            self.assertIsNone(supervisor.sample())
+            self.assertEqual(len(supervisor._cpu_times), 3)
+            self.assertGreater(supervisor.max_rss_mb, 0)
+        finally:
+            supervisor.kill()
+            process.wait()
+
+
+class TestRunScript(unittest.TestCase):
+    def test_timeout_kills_background_children(self):
+        with tempfile.TemporaryDirectory() as directory:
+            pid_file = os.path.join(directory, "child.pid")
+            result = asyncio.run(
+                run_script(
+                    directory,
+                    ["sh", "-c", f"sleep 30 & echo $! > {pid_file}; wait"],
+                    print_output=False,
+                    timeout=0.5,
+                )
+            )
+            self.assertEqual(result, "Timeout")
+            with open(pid_file) as f:
+                self.assertTrue(wait_dead(int(f.read())))
+
+    def test_cpu_time_limit(self):
+        stats = {}
+        with tempfile.TemporaryDirectory() as directory:
+            result = asyncio.run(
+                run_script(
+                    directory,
+                    [sys.executable, "-c", "while True: pass"],
+                    print_output=False,
+                    timeout=20,
+                    process_stats=stats,
+                    cpu_time_limit=0.5,
+                )
+            )
+        self.assertTrue(result.startswith("CPU time limit exceeded"), result)
+        self.assertEqual(stats["limit_exceeded"], result)
+        self.assertLess(stats["wall_time"], 10)
+        self.assertLess(stats["returncode"], 0)
+
+    def test_memory_limit(self):
+        stats = {}
+        with tempfile.TemporaryDirectory() as directory:
+            result = asyncio.run(
+                run_script(
+                    directory,
+                    [
+                        sys.executable,
+                        "-c",
+                        "import time; data = bytearray(300 * 2 ** 20); time.sleep(30)",
+                    ],
+                    print_output=False,
+                    timeout=20,
+                    process_stats=stats,
+                    rss_limit_mb=100,
+                )
+            )
+        self.assertTrue(result.startswith("Memory limit exceeded"), result)
+        self.assertGreater(stats["max_rss_mb"], 100)
+
+    def test_stats_of_a_normal_exit(self):
+        stats = {}
+        with tempfile.TemporaryDirectory() as directory:
+            result = asyncio.run(
+                run_script(
+                    directory,
+                    [sys.executable, "-c", "import sys; sys.exit(3)"],
+                    print_output=False,
+                    process_stats=stats,
+                    cpu_time_limit=10,
+                    rss_limit_mb=1000,
+                )
+            )
+        self.assertEqual(result, "NONE")
+        self.assertEqual(stats["returncode"], 3)
+        self.assertIsNone(stats["limit_exceeded"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from modules.utils.runner_pool import RunnerPool
+
+# speaks the protocol of `run.py start end --serve`: trials of robot 1 fail, robot 4 ignores
+# stop, others run until stopped
+FAKE_RUNNER = """
+import json
+import sys
+
+def report(message):
+    print("__runner__ " + json.dumps(message), flush=True)
+
+robot = int(sys.argv[1])
+print("starting", flush=True)
+report({"status": "ready"})
+for line in sys.stdin:
+    command = line.strip()
+    if command == "exit":
+        break
+    if command == "run" and robot == 1:
+        report({"status": "finished", "stderr": "Traceback: boom\\n"})
+    elif command == "stop" and robot != 4:
+        report({"status": "stopped", "stderr": ""})
+"""
+
+
+class TestRunnerPool(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        with open(os.path.join(self.directory.name, "fake_run.py"), "w") as f:
+            f.write(FAKE_RUNNER)
+        self.pool = RunnerPool(script="fake_run.py")
+
+    def tearDown(self):
+        self.pool.close()
+        self.directory.cleanup()
+
+    def run_trials(self, timeout):
+        async def run():
+            return await asyncio.gather(
+                *(worker.run_trial(timeout) for worker in self.pool.workers)
+            )
+
+        return asyncio.run(run())
+
+    def test_workers_are_reused_between_trials(self):
+        self.pool.start(self.directory.name, [[1], [2, 3]])
+        pids = [worker.process.pid for worker in self.pool.workers]
+        self.assertEqual(self.run_trials(0.5), ["Traceback: boom\n", "Timeout"])
+
+        self.pool.start(self.directory.name, [[1], [2, 3]])
+        self.assertEqual([worker.process.pid for worker in self.pool.workers], pids)
+        self.assertEqual(self.run_trials(0.5), ["Traceback: boom\n", "Timeout"])
+        self.assertIsNotNone(self.pool.workers[1].process_stats["wall_time"])
+
+    def test_worker_ignoring_stop_is_killed(self):
+        self.pool.start(self.directory.name, [[2], [4]])
+        for worker in self.pool.workers:
+            worker.stop_timeout = 0.5
+        hanging = self.pool.workers[1]
+        self.assertEqual(self.run_trials(0.3), ["Timeout", "Timeout"])
+        hanging.process.wait(timeout=5)
+        self.assertFalse(hanging.alive)
+        # the next trial starts a new worker for its robots
+        self.pool.start(self.directory.name, [[2], [4]])
+        self.assertIsNot(self.pool.workers[1], hanging)
+        self.assertTrue(self.pool.workers[1].alive)
+
+    def test_restart_on_new_allocation(self):
+        self.pool.start(self.directory.name, [[1], [2, 3]])
+        old_workers = self.pool.workers
+        self.pool.start(self.directory.name, [[1, 2, 3]])
+        self.assertEqual([worker.robots for worker in self.pool.workers], [[1, 2, 3]])
+        self.assertTrue(all(not worker.alive for worker in old_workers))
+
+
+if __name__ == "__main__":
+    unittest.main()
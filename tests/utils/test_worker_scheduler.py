@@ -0,0 +1,63 @@
+import unittest
+
+from modules.utils.worker_scheduler import (
+    WorkerScheduler,
+    split_evenly,
+    task_scheduler,
+)
+
+
+class TestSplitEvenly(unittest.TestCase):
+    def test_sizes_differ_by_at_most_one(self):
+        chunks = split_evenly(list(range(23)), 10)
+        self.assertEqual(len(chunks), 10)
+        self.assertEqual(sum(chunks, []), list(range(23)))
+        self.assertLessEqual(max(map(len, chunks)) - min(map(len, chunks)), 1)
+
+    def test_more_chunks_than_items(self):
+        self.assertEqual(split_evenly([1, 2, 3], 10), [[1], [2], [3]])
+
+    def test_empty(self):
+        self.assertEqual(split_evenly([], 4), [])
+
+
+class TestWorkerScheduler(unittest.TestCase):
+    def test_unmeasured_is_conservative(self):
+        scheduler = WorkerScheduler(max_workers=64, unmeasured_workers=4)
+        self.assertEqual(scheduler.num_workers(20), 4)
+        self.assertEqual(scheduler.num_workers(2), 2)
+        self.assertEqual(scheduler.num_workers(0), 0)
+        self.assertEqual(WorkerScheduler(max_workers=2).num_workers(20), 2)
+
+    def test_record_updates_cost(self):
+        scheduler = WorkerScheduler(max_workers=8, target_utilization=0.5)
+        report = scheduler.record(
+            [
+                {"robots": [1, 2], "pid": 1, "cpu_time": 1.0, "wall_time": 10.0},
+                {"robots": [3, 4], "pid": 2, "cpu_time": 1.0, "wall_time": 10.0},
+            ]
+        )
+        self.assertAlmostEqual(report[0]["utilization"], 0.1)
+        self.assertAlmostEqual(scheduler.cpu_per_robot, 0.05)
+        # 20 robots * 0.05 / 0.5 = 2 workers
+        self.assertEqual(scheduler.num_workers(20), 2)
+        self.assertEqual(len(scheduler.allocate(list(range(20)))), 2)
+
+    def test_record_without_measurement(self):
+        scheduler = WorkerScheduler(max_workers=4)
+        report = scheduler.record([{"robots": [1], "cpu_time": None, "wall_time": 0}])
+        self.assertIsNone(report[0]["utilization"])
+        self.assertIsNone(scheduler.cpu_per_robot)
+
+    def test_task_scheduler_keeps_the_measurement(self):
+        scheduler = task_scheduler("workspace/gpt-4o/full/flocking")
+        scheduler.record([{"robots": [1, 2], "cpu_time": 1.0, "wall_time": 10.0}])
+        self.assertIs(task_scheduler("workspace/gpt-4o/full/flocking"), scheduler)
+        self.assertAlmostEqual(
+            task_scheduler("workspace/gpt-4o/full/flocking").cpu_per_robot, 0.05
+        )
+        self.assertIsNone(task_scheduler("workspace/gpt-4o/full/cross").cpu_per_robot)
+
+
+if __name__ == "__main__":
+    unittest.main()